@@ -1,5 +1,6 @@
 import logging
 import gevent
+import gevent.event
 from gevent.queue import Queue
 from warnings import warn
 from HardwareRepository.CommandContainer import CommandObject, ChannelObject
@@ -82,6 +83,8 @@ class Exporter(ExporterClient.ExporterClient):
         self.callbacks = {}
         self.events_queue = Queue()
         self.events_processing_task = None
+        self.pending_reads = {}
+        self.pending_reads_task = None
 
     def start(self):
         pass
@@ -103,6 +106,39 @@ class Exporter(ExporterClient.ExporterClient):
         ret = ExporterClient.ExporterClient.readProperty(self, *args, **kwargs)
         return self._to_python_value(ret)
 
+    def readProperties(self, *args, **kwargs):
+        ret = ExporterClient.ExporterClient.readProperties(self, *args, **kwargs)
+        return [self._to_python_value(value) for value in ret]
+
+    def read_property_batched(self, property_name):
+        """Read a property together with the other reads requested meanwhile
+
+        All properties requested before the reading greenlet runs are read
+        with one readProperties exchange.
+        """
+        result = self.pending_reads.get(property_name)
+        if result is None:
+            result = gevent.event.AsyncResult()
+            self.pending_reads[property_name] = result
+            if self.pending_reads_task is None:
+                self.pending_reads_task = gevent.spawn(self._read_pending_properties)
+        return result.get()
+
+    def _read_pending_properties(self):
+        pending_reads = self.pending_reads
+        self.pending_reads = {}
+        self.pending_reads_task = None
+
+        property_names = list(pending_reads.keys())
+        try:
+            values = self.readProperties(property_names)
+        except BaseException as ex:
+            for result in pending_reads.values():
+                result.set_exception(ex)
+        else:
+            for property_name, value in zip(property_names, values):
+                pending_reads[property_name].set(value)
+
     def reconnect(self):
         return
         if self.started:
@@ -199,7 +235,8 @@ class ExporterChannel(ChannelObject):
         self.update()
 
     def update(self, value=None):
-        value = value or self.get_value()
+        if value is None:
+            value = self.get_value()
         if isinstance(value, tuple):
             value = list(value)
 
@@ -207,7 +244,7 @@ class ExporterChannel(ChannelObject):
         self.emit("update", value)
 
     def get_value(self):
-        value = self.__exporter.readProperty(self.attributeName)
+        value = self.__exporter.read_property_batched(self.attributeName)
         return value
 
     def set_value(self, value):
@@ -19,6 +19,165 @@ except ImportError:
     logging.getLogger("HWR").warning("Tango support is not available.")
 
 
+# Process-wide caches, keyed by (lower case) device name
+_device_proxies = {}
+_raw_device_proxies = {}
+_attribute_names = {}
+_device_timeouts = {}
+# Batch pollers, keyed by (device name, polling period, read_as_str)
+_attribute_pollers = {}
+
+
+def get_device_proxy(device_name):
+    """Return the shared (gevent) DeviceProxy of a Tango device"""
+    key = device_name.lower()
+    try:
+        return _device_proxies[key]
+    except KeyError:
+        device = DeviceProxy(device_name)
+        _device_proxies[key] = device
+        return device
+
+
+def get_raw_device_proxy(device_name):
+    """Return the shared (non gevent) DeviceProxy of a Tango device"""
+    key = device_name.lower()
+    try:
+        return _raw_device_proxies[key]
+    except KeyError:
+        device = RawDeviceProxy(device_name)
+        _raw_device_proxies[key] = device
+        return device
+
+
+def get_attribute_names(device):
+    """Return the (lower case) attribute names of a Tango device
+
+    The attribute list of each device is queried only once.
+    """
+    key = device.dev_name().lower()
+    try:
+        return _attribute_names[key]
+    except KeyError:
+        names = set(attr.name.lower() for attr in device.attribute_list_query())
+        _attribute_names[key] = names
+        return names
+
+
+def set_device_timeout(device, timeout):
+    """Set the timeout of a shared device, keeping the longest requested one"""
+    key = device.dev_name().lower()
+    if timeout > _device_timeouts.get(key, 0):
+        _device_timeouts[key] = timeout
+        device.set_timeout_millis(timeout)
+
+
+class TangoAttributesPoller:
+    """Polls all the attributes of a device with one read_attributes call
+
+    Channels polling the same device with the same polling period register
+    their attribute here; values are dispatched to each channel when they
+    change. An attribute that cannot be read is reported to its channels
+    only, like the poller reports errors: once, until it is read again.
+    """
+
+    def __init__(self, device_name, polling_period, read_as_str=False):
+        self.device_name = device_name
+        self.polling_period = polling_period
+        self.read_as_str = read_as_str
+        self.attribute_names = []
+        self.channels = {}
+        self.values = {}
+        self.failed_attributes = set()
+        self.poller = None
+
+    def add_channel(self, channel):
+        attribute_name = channel.attributeName
+        if attribute_name not in self.channels:
+            self.attribute_names.append(attribute_name)
+            self.channels[attribute_name] = []
+        self.channels[attribute_name].append(weakref.ref(channel))
+
+        if self.poller is None:
+            self.poller = Poller.poll(
+                self.poll,
+                polling_period=self.polling_period,
+                value_changed_callback=self.values_changed,
+                error_callback=self.poll_failed,
+                compare=False,
+            )
+        elif attribute_name in self.values:
+            # new channel on an attribute already read
+            gevent.spawn(channel.update, self.values[attribute_name])
+
+    def poll(self):
+        device = get_raw_device_proxy(self.device_name)
+        attribute_names = list(self.attribute_names)
+        if self.read_as_str:
+            attrs = device.read_attributes(
+                attribute_names, PyTango.DeviceAttribute.ExtractAs.String
+            )
+        else:
+            attrs = device.read_attributes(attribute_names)
+        values = []
+        for attribute_name, attr in zip(attribute_names, attrs):
+            if attr.has_failed:
+                error = PyTango.DevFailed(*attr.get_err_stack())
+                values.append((attribute_name, error))
+            else:
+                values.append((attribute_name, attr.value))
+        return values
+
+    def values_changed(self, values):
+        for attribute_name, value in values:
+            if isinstance(value, PyTango.DevFailed):
+                self.attribute_failed(attribute_name, value)
+                continue
+            self.failed_attributes.discard(attribute_name)
+
+            if attribute_name in self.values and self._is_equal(
+                value, self.values[attribute_name]
+            ):
+                continue
+            self.values[attribute_name] = value
+
+            for channel_ref in self.channels.get(attribute_name, []):
+                channel = channel_ref()
+                if channel is not None:
+                    channel.update(value)
+
+    def attribute_failed(self, attribute_name, e):
+        # the value is sent again once the attribute can be read
+        self.values.pop(attribute_name, None)
+        if attribute_name in self.failed_attributes:
+            return
+        self.failed_attributes.add(attribute_name)
+
+        for channel_ref in self.channels.get(attribute_name, []):
+            channel = channel_ref()
+            if channel is not None:
+                channel.pollFailed(e, self.poller.get_id())
+
+    def poll_failed(self, e, poller_id):
+        self.values = {}
+        self.failed_attributes = set()
+        for channel_refs in self.channels.values():
+            for channel_ref in channel_refs:
+                channel = channel_ref()
+                if channel is not None:
+                    channel.pollFailed(e, poller_id)
+
+    @staticmethod
+    def _is_equal(value, old_value):
+        comparison = value == old_value
+        if isinstance(comparison, bool):
+            return comparison
+        try:
+            return all(comparison)
+        except (TypeError, ValueError):
+            return False
+
+
 class TangoCommand(CommandObject):
     def __init__(self, name, command, tangoname=None, username=None, **kwargs):
         CommandObject.__init__(self, name, username, **kwargs)
@@ -29,7 +188,7 @@ class TangoCommand(CommandObject):
 
     def init_device(self):
         try:
-            self.device = DeviceProxy(self.deviceName)
+            self.device = get_device_proxy(self.deviceName)
         except PyTango.DevFailed as traceback:
             last_error = traceback[-1]
             logging.getLogger("HWR").error(
@@ -168,13 +327,25 @@ class TangoChannel(ChannelObject):
         # self.init_poller.stop()
 
         if isinstance(self.polling, types.IntType):
-            self.raw_device = RawDeviceProxy(self.deviceName)
-            Poller.poll(
-                self.poll,
-                polling_period=self.polling,
-                value_changed_callback=self.update,
-                error_callback=self.pollFailed,
-            )
+            if self.device is None:
+                # a missing attribute would make the reads of the other
+                # channels of the device fail
+                logging.getLogger("HWR").error(
+                    "%s: not polling %s/%s",
+                    str(self.name()),
+                    self.deviceName,
+                    self.attributeName,
+                )
+                self._device_initialized.set()
+                return
+            key = (self.deviceName.lower(), self.polling, self.read_as_str)
+            attributes_poller = _attribute_pollers.get(key)
+            if attributes_poller is None:
+                attributes_poller = TangoAttributesPoller(
+                    self.deviceName, self.polling, self.read_as_str
+                )
+                _attribute_pollers[key] = attributes_poller
+            attributes_poller.add_channel(self)
         else:
             if self.polling == "events":
                 # try to register event
@@ -196,7 +367,7 @@ class TangoChannel(ChannelObject):
 
     def init_device(self):
         try:
-            self.device = DeviceProxy(self.deviceName)
+            self.device = get_device_proxy(self.deviceName)
         except PyTango.DevFailed as traceback:
             self.imported = False
             last_error = traceback[-1]
@@ -211,12 +382,10 @@ class TangoChannel(ChannelObject):
                 self.device = None
                 raise ConnectionError
             else:
-                self.device.set_timeout_millis(self.timeout)
+                set_device_timeout(self.device, self.timeout)
 
                 # check that the attribute exists (to avoid Abort in PyTango grrr)
-                if not self.attributeName.lower() in [
-                    attr.name.lower() for attr in self.device.attribute_list_query()
-                ]:
+                if self.attributeName.lower() not in get_attribute_names(self.device):
                     logging.getLogger("HWR").error(
                         "no attribute %s in Tango device %s",
                         self.attributeName,
@@ -241,17 +410,6 @@ class TangoChannel(ChannelObject):
         TangoChannel._tangoEventsQueue.put(ev)
         TangoChannel._tangoEventsProcessingTimer.send()
 
-    def poll(self):
-        if self.read_as_str:
-            value = self.raw_device.read_attribute(
-                self.attributeName, PyTango.DeviceAttribute.ExtractAs.String
-            ).value
-            # value = self.device.read_attribute_as_str(self.attributeName).value
-        else:
-            value = self.raw_device.read_attribute(self.attributeName).value
-
-        return value
-
     def pollFailed(self, e, poller_id):
         self.emit("update", None)
         """
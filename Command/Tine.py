@@ -1,10 +1,12 @@
+import sys
 import time
 import logging
-import Queue
 import weakref
 import gevent
+import gevent.monkey
 
 from HardwareRepository.CommandContainer import CommandObject, ChannelObject
+from HardwareRepository.TaskUtils import new_async_watcher
 import atexit
 
 import tine
@@ -63,38 +65,38 @@ class TineCommand(CommandObject):
         return True
 
 
-def emitTineChannelUpdates():
-    while not TineChannel.updates.empty():
-        try:
-            channel_obj_ref, value = TineChannel.updates.get()
-        except Queue.Empty:
-            break
-        else:
-            channel_object = channel_obj_ref()
-            if channel_object is not None:
-                try:
-                    channel_object.emit("update", (value,))
-                except BaseException:
-                    logging.getLogger("HWR").exception(
-                        "Exception while emitting new value for channel %s",
-                        channel_object.name(),
-                    )
+# TINE callbacks are called from TINE threads: the lock has to be a real one
+_allocate_lock = gevent.monkey.get_original(
+    "_thread" if sys.version_info[0] > 2 else "thread", ["allocate_lock"]
+)[0]
 
 
-def do_tine_channel_update(sleep_time):
-    while True:
-        emitTineChannelUpdates()
-        time.sleep(sleep_time)
+def emitTineChannelUpdates():
+    with TineChannel.updates_lock:
+        updates = TineChannel.updates
+        TineChannel.updates = {}
+
+    for channel_obj_ref, value in updates.values():
+        channel_object = channel_obj_ref()
+        if channel_object is not None:
+            try:
+                channel_object.emit("update", (value,))
+            except BaseException:
+                logging.getLogger("HWR").exception(
+                    "Exception while emitting new value for channel %s",
+                    channel_object.name(),
+                )
 
 
 class TineChannel(ChannelObject):
     attach = {"timer": tine.attach, "event": tine.notify, "datachange": tine.update}
 
-    updates = Queue.Queue()
-    # updates_emitter = QtCore.QTimer()
-    # QtCore.QObject.connect(updates_emitter, QtCore.SIGNAL('timeout()'), emitTineChannelUpdates)
-    # updates_emitter.start(20)
-    updates_emitter = gevent.spawn(do_tine_channel_update, 0.1)
+    # latest value of each channel, waiting to be emitted in the gevent loop
+    updates = {}
+    updates_lock = _allocate_lock()
+    # one async watcher, woken up by any channel update
+    updates_emitter = new_async_watcher()
+    updates_emitter.start(emitTineChannelUpdates)
 
     def __init__(
         self, name, attribute_name, tinename=None, username=None, timeout=1000, **kwargs
@@ -139,6 +141,7 @@ class TineChannel(ChannelObject):
 
         # TODO Remove this sleep. Tine lib bug when after attach directly get is called
         # time.sleep(0.02)
+        self.attach_time = time.time()
 
         atexit.register(self.__del__)
 
@@ -184,7 +187,10 @@ class TineChannel(ChannelObject):
         self.value = value
 
         if value != self.oldvalue:
-            TineChannel.updates.put((weakref.ref(self), value))
+            with TineChannel.updates_lock:
+                # only the latest value is emitted if updates come in bursts
+                TineChannel.updates[id(self)] = (weakref.ref(self), value)
+            TineChannel.updates_emitter.send()
             self.oldvalue = value
 
     def getValue(self, force=False):
@@ -195,8 +201,11 @@ class TineChannel(ChannelObject):
         if self.value is None or force:
             try:
                 # TODO remove this
+                # (tine lib bug: get should not be called directly after attach)
                 if not force:
-                    time.sleep(0.02)
+                    wait_time = 0.02 - (time.time() - self.attach_time)
+                    if wait_time > 0:
+                        time.sleep(wait_time)
                 self.value = tine.get(self.tineName, self.attributeName, self.timeout)
             except IOError as strerror:
                 logging.getLogger("HWR").error("%s" % strerror)
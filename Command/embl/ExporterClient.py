@@ -8,6 +8,7 @@
 """
 
 import logging
+import time
 
 from StandardClient import *
 
@@ -28,11 +29,24 @@ ARRAY_SEPARATOR = ""  # 0x001F
 
 
 class ExporterClient(StandardClient):
+    # time (in s) during which a value received with an event is used
+    # instead of reading the property (0 disables the cache)
+    EVENT_CACHE_VALIDITY = 1.0
+    # properties always read from the server, as well as all the properties
+    # ending in "State" (HardwareState, per motor states): waiting for a
+    # command relies on them and an event received before it is out of date
+    UNCACHED_PROPERTIES = ("Status",)
+
+    def __init__(self, *args, **kwargs):
+        StandardClient.__init__(self, *args, **kwargs)
+        self._event_values = {}
+
     def onMessageReceived(self, msg):
         if msg[:4] == "EVT:":
             try:
                 evtstr = msg[4:]
                 tokens = evtstr.split(PARAMETER_SEPARATOR)
+                self._event_values[tokens[0]] = (tokens[1], time.time())
                 self.onEvent(tokens[0], tokens[1], long(tokens[2]))
             except BaseException:
                 # print "Error processing event: " + str(sys.exc_info()[1])
@@ -40,6 +54,11 @@ class ExporterClient(StandardClient):
         else:
             StandardClient.onMessageReceived(self, msg)
 
+    def onMessageError(self, error):
+        # an event too long to be parsed is not the reply to a request
+        if getattr(error, "head", None) != EVENT:
+            StandardClient.onMessageError(self, error)
+
     def getMethodList(self):
         cmd = CMD_METHOD_LIST
         ret = self.sendReceive(cmd)
@@ -76,6 +95,8 @@ class ExporterClient(StandardClient):
                 if isinstance(par, list) or isinstance(par, tuple):
                     par = self.createArrayParameter(par)
                 cmd += str(par) + PARAMETER_SEPARATOR
+        # the command changes the properties, cached values are out of date
+        self._event_values.clear()
         ret = self.sendReceive(cmd, timeout)
         return self.__processReturn(ret)
 
@@ -97,16 +118,42 @@ class ExporterClient(StandardClient):
         if pars is not None:
             for par in pars:
                 cmd += str(par) + PARAMETER_SEPARATOR
-        return self.send(cmd)
+        self._event_values.clear()
+        # the server replies when the call is started
+        return self.sendAsync(cmd)
 
     def writeProperty(self, property, value, timeout=-1):
         if isinstance(value, list) or isinstance(value, tuple):
             value = self.createArrayParameter(value)
+        # writing a property can change others (positions, states)
+        self._event_values.clear()
         cmd = CMD_PROPERTY_WRITE + " " + property + " " + str(value)
         ret = self.sendReceive(cmd, timeout)
         return self.__processReturn(ret)
 
+    def getEventValue(self, property):
+        """Return the value of a property last received with an event
+
+        Returns:
+            tuple: (True, value) if the event is more recent than
+                EVENT_CACHE_VALIDITY, (False, None) otherwise or for
+                UNCACHED_PROPERTIES and properties ending in "State"
+        """
+        if property in self.UNCACHED_PROPERTIES or property.endswith("State"):
+            return False, None
+        try:
+            value, timestamp = self._event_values[property]
+        except KeyError:
+            return False, None
+        if time.time() - timestamp > self.EVENT_CACHE_VALIDITY:
+            return False, None
+        return True, value
+
     def readProperty(self, property, timeout=-1):
+        cached, value = self.getEventValue(property)
+        if cached:
+            return value
+
         cmd = CMD_PROPERTY_READ + " " + property
         ret = self.sendReceive(cmd, timeout)
         process_return = None
@@ -116,6 +163,37 @@ class ExporterClient(StandardClient):
             pass
         return process_return
 
+    def readProperties(self, properties, timeout=-1):
+        """Read several properties in one exchange
+
+        Values received with recent events are used without reading them.
+
+        Args:
+            properties (list): property names
+            timeout (float): timeout for the whole exchange
+
+        Returns:
+            list: property values (None for properties that cannot be read)
+        """
+        values = {}
+        to_read = []
+        for property in properties:
+            cached, value = self.getEventValue(property)
+            if cached:
+                values[property] = value
+            elif property not in to_read:
+                to_read.append(property)
+
+        if to_read:
+            cmds = [CMD_PROPERTY_READ + " " + property for property in to_read]
+            for property, ret in zip(to_read, self.sendReceiveMany(cmds, timeout)):
+                try:
+                    values[property] = self.__processReturn(ret)
+                except BaseException:
+                    values[property] = None
+
+        return [values[property] for property in properties]
+
     def readPropertyAsString(self, property):
         return self.readProperty(property)
 
@@ -6,7 +6,9 @@
 
   Copyright 2009 by European Molecular Biology Laboratory - Grenoble
 """
+import collections
 import gevent
+import gevent.event
 import gevent.lock
 import time
 import socket
@@ -25,9 +27,21 @@ class SocketError(Exception):
     pass
 
 
+class MessageTooLongError(ProtocolError):
+    """A stream message discarded for being longer than the parser limit"""
+
+    def __init__(self, head, max_size):
+        ProtocolError.__init__(
+            self, "Protocol error: message longer than %d bytes" % max_size
+        )
+        # first bytes of the message, to tell replies from events
+        self.head = head
+
+
 STX = chr(2)
 ETX = chr(3)
-MAX_SIZE_STREAM_MSG = 500000
+MAX_SIZE_STREAM_MSG = 64 * 1024 * 1024
+RECV_BUFFER_SIZE = 65536
 
 
 class PROTOCOL:
@@ -35,6 +49,102 @@ class PROTOCOL:
     STREAM = 2
 
 
+class FrameParser:
+    """Splits a byte stream into STX ... ETX delimited messages
+
+    Received data is appended to a bytearray and delimiters are searched with
+    find(). The payload of a message is copied only once, when the complete
+    message is extracted. Data outside delimiters is ignored and an STX
+    inside a message restarts it. A message longer than max_size is
+    discarded up to its end and a MessageTooLongError is returned in its
+    place, so that the request waiting for it can fail.
+    """
+
+    STX = bytearray(STX.encode("latin-1"))
+    ETX = bytearray(ETX.encode("latin-1"))
+
+    def __init__(self, max_size=MAX_SIZE_STREAM_MSG):
+        self.max_size = max_size
+        self.buffer = bytearray()
+        # start of the current message in the buffer (None: waiting for STX)
+        self.start = None
+        # position from which to look for the end of the current message
+        self.scan = 0
+        # error for the message being discarded (None: not discarding)
+        self.too_long = None
+
+    def reset(self):
+        del self.buffer[:]
+        self.start = None
+        self.scan = 0
+        self.too_long = None
+
+    def feed(self, data):
+        """Add received data
+
+        Returns:
+            list: completed messages, or MessageTooLongError for the messages
+                that were discarded
+        """
+        buf = self.buffer
+        buf.extend(data)
+        messages = []
+        pos = self.scan
+
+        while True:
+            if self.too_long is not None:
+                end = buf.find(self.ETX, pos)
+                restart = buf.find(self.STX, pos, len(buf) if end < 0 else end)
+                if end < 0 and restart < 0:
+                    break
+                messages.append(self.too_long)
+                self.too_long = None
+                pos = end + 1 if restart < 0 else restart
+
+            if self.start is None:
+                i = buf.find(self.STX, pos)
+                if i < 0:
+                    break
+                self.start = pos = i + 1
+
+            end = buf.find(self.ETX, pos)
+            restart = buf.find(self.STX, pos, len(buf) if end < 0 else end)
+            if restart >= 0:
+                self.start = pos = restart + 1
+                continue
+            if end < 0:
+                break
+
+            view = memoryview(buf)
+            messages.append(_to_str(view[self.start : end].tobytes()))
+            del view
+            self.start = None
+            pos = end + 1
+
+        if self.start is None:
+            # nothing worth keeping
+            del buf[:]
+            self.scan = 0
+        elif len(buf) - self.start > self.max_size:
+            head = _to_str(bytes(buf[self.start : self.start + 4]))
+            self.reset()
+            self.too_long = MessageTooLongError(head, self.max_size)
+        else:
+            # keep only the current message, this happens once per message
+            if self.start > 0:
+                del buf[: self.start]
+                self.start = 0
+            self.scan = len(buf)
+
+        return messages
+
+
+def _to_str(data):
+    if isinstance(data, str):
+        return data
+    return data.decode("utf-8", "replace")
+
+
 class StandardClient:
     def __init__(self, server_ip, server_port, protocol, timeout, retries):
         self.server_ip = server_ip
@@ -46,6 +156,9 @@ class StandardClient:
         self.error = None
         self.msg_received_event = gevent.event.Event()
         self._lock = gevent.lock.Semaphore()
+        self._send_lock = gevent.lock.Semaphore()
+        # requests waiting for a reply on the stream, in the order they were sent
+        self._pending_requests = collections.deque()
         self.__msg_index__ = -1
         self.__sock__ = None
         self.__CONSTANT_LOCAL_PORT__ = True
@@ -68,6 +181,22 @@ class StandardClient:
         self._isConnected = False
         self.__sock__ = None
         self.received_msg = None
+        self.__abortPendingRequests__()
+
+    def __resetStream__(self, error):
+        """Abort all pending requests and close the connection
+
+        Replies are matched to requests by their order only: once a reply
+        is missing, the following ones would be handed to the wrong
+        requests. The next request opens a new connection.
+        """
+        self.error = error
+        self.disconnect()
+
+    def __abortPendingRequests__(self):
+        error = SocketError("Socket error:" + str(self.error or "Disconnected"))
+        while self._pending_requests:
+            self._pending_requests.popleft().set_exception(error)
 
     def connect(self):
         if self.protocol == PROTOCOL.DATAGRAM:
@@ -164,79 +293,125 @@ class StandardClient:
             self.disconnect()
 
     def onMessageReceived(self, msg):
+        """Reply to the oldest pending request
+
+        Stream servers answer the requests of a connection in order, so
+        replies are matched to the waiting requests first in, first out.
+        """
+        if self._pending_requests:
+            self._pending_requests.popleft().set(msg)
         self.received_msg = msg
         self.msg_received_event.set()
 
+    def onMessageError(self, error):
+        """Fail the oldest pending request with a message error"""
+        if self._pending_requests:
+            self._pending_requests.popleft().set_exception(error)
+
     def recv_thread(self):
         try:
             self.onConnected()
         except BaseException:
             pass
-        buffer = ""
-        mReceivedSTX = False
+        parser = FrameParser(MAX_SIZE_STREAM_MSG)
         while True:
-            ret = self.__sock__.recv(4096)
+            ret = self.__sock__.recv(RECV_BUFFER_SIZE)
             if not ret:
                 # connection reset by peer
                 self.error = "Disconnected"
                 self.__closeSocket__()
                 break
-            for b in ret:
-                if b == STX:
-                    buffer = ""
-                    mReceivedSTX = True
-                elif b == ETX:
-                    if mReceivedSTX is True:
-                        self.onMessageReceived(buffer)
-                        mReceivedSTX = False
-                        buffer = ""
+            for msg in parser.feed(ret):
+                if isinstance(msg, MessageTooLongError):
+                    self.onMessageError(msg)
                 else:
-                    if mReceivedSTX is True:
-                        buffer = buffer + b
-
-            if len(buffer) > MAX_SIZE_STREAM_MSG:
-                mReceivedSTX = False
-                buffer = ""
+                    self.onMessageReceived(msg)
         try:
             self.onDisconnected()
         except BaseException:
             pass
 
-    def __sendStream__(self, cmd):
-        if not self.isConnected():
-            self.connect()
+    def __sendStream__(self, cmd, reply=None):
+        with self._send_lock:
+            if not self.isConnected():
+                self.connect()
+
+            if reply is not None:
+                # registered before sending: the reply may arrive at once
+                self._pending_requests.append(reply)
+            try:
+                pack = STX + cmd + ETX
+                self.__sock__.sendall(pack)
+            except (SocketError, socket.error):
+                # pending requests are aborted with a SocketError
+                self.disconnect()
+                # raise SocketError,"Socket error:" + str(sys.exc_info()[1])
+
+    def __sendReceiveStream__(self, cmd, timeout):
+        """Send a request and wait for its reply
+
+        Several requests can be in flight on the same connection and each
+        one waits for its own reply. The server answers in order, so a
+        request sent after a slow EXEC gets its reply after the EXEC's.
+        On timeout the connection is reset and all pending requests fail.
+        """
+        self.error = None
+        reply = self.sendAsync(cmd)
 
         try:
-            pack = STX + cmd + ETX
-            self.__sock__.send(pack)
-        except SocketError:
-            self.disconnect()
-            # raise SocketError,"Socket error:" + str(sys.exc_info()[1])
+            return reply.get(timeout=timeout)
+        except gevent.Timeout:
+            self.__resetStream__("Timeout waiting for reply to %s" % cmd)
+            raise TimeoutError("Timeout error: no reply to %s" % cmd)
+
+    def sendReceiveMany(self, cmds, timeout=-1):
+        """Send several requests in one exchange and return their replies
 
-    def __sendReceiveStream__(self, cmd):
+        On stream connections all requests are sent at once and the replies
+        are awaited together, so the whole exchange costs one round trip.
+
+        Args:
+            cmds (list): requests to send
+            timeout (float): timeout for all the replies (-1: client timeout)
+
+        Returns:
+            list: replies, in the order of the requests
+        """
+        if self.protocol == PROTOCOL.DATAGRAM:
+            return [self.sendReceive(cmd, timeout) for cmd in cmds]
+
+        if (timeout is not None) and (timeout < 0):
+            timeout = self.timeout
         self.error = None
-        self.received_msg = None
-        self.msg_received_event.clear()  # = gevent.event.Event()
-        if not self.isConnected():
-            self.connect()
-        self.__sendStream__(cmd)
-
-        with gevent.Timeout(self.timeout, TimeoutError):
-            while self.received_msg is None:
-                if self.error is not None:
-                    raise SocketError("Socket error:" + str(self.error))
-                self.msg_received_event.wait()
-            return self.received_msg
+        replies = [gevent.event.AsyncResult() for cmd in cmds]
+
+        with self._send_lock:
+            if not self.isConnected():
+                self.connect()
+            self._pending_requests.extend(replies)
+            try:
+                self.__sock__.sendall("".join([STX + cmd + ETX for cmd in cmds]))
+            except (SocketError, socket.error):
+                self.disconnect()
+
+        try:
+            with gevent.Timeout(timeout):
+                return [reply.get() for reply in replies]
+        except gevent.Timeout:
+            self.__resetStream__("Timeout waiting for reply to %s" % ", ".join(cmds))
+            raise TimeoutError("Timeout error: no reply to %s" % ", ".join(cmds))
 
     def sendReceive(self, cmd, timeout=-1):
+        if self.protocol != PROTOCOL.DATAGRAM:
+            if (timeout is not None) and (timeout < 0):
+                timeout = self.timeout
+            return self.__sendReceiveStream__(cmd, timeout)
+
         self._lock.acquire()
         try:
             if (timeout is None) or (timeout >= 0):
                 self.setTimeout(timeout)
-            if self.protocol == PROTOCOL.DATAGRAM:
-                return self.__sendReceiveDatagram__(cmd)
-            else:
-                return self.__sendReceiveStream__(cmd)
+            return self.__sendReceiveDatagram__(cmd)
         finally:
             try:
                 if (timeout is None) or (timeout >= 0):
@@ -252,6 +427,23 @@ class StandardClient:
         else:
             return self.__sendStream__(cmd)
 
+    def sendAsync(self, cmd):
+        """Send a request without waiting for its reply
+
+        The request is queued with the others waiting for a reply, so that
+        its reply is not handed to another request.
+
+        Returns:
+            gevent.event.AsyncResult: set with the reply
+        """
+        if self.protocol == PROTOCOL.DATAGRAM:
+            raise ProtocolError(
+                "Protocol error: send command not support in datagram clients"
+            )
+        reply = gevent.event.AsyncResult()
+        self.__sendStream__(cmd, reply)
+        return reply
+
     def onConnected(self):
         pass
 
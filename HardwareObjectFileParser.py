@@ -1,4 +1,7 @@
+import hashlib
 import logging
+import os
+import pickle
 import xml.sax
 from xml.sax.handler import ContentHandler
 
@@ -6,6 +9,12 @@ from HardwareRepository import BaseHardwareObjects
 
 currentXML = None
 
+# Parsed XML files are cached as lists of SAX events, keyed by the hash of
+# the XML content. The same cache is used for class templates
+_xmlEventsCache = {}
+_xmlStructuresCache = {}
+_cacheDirectory = None
+
 try:
     newObjectsClasses = {
         "equipment": BaseHardwareObjects.Equipment,
@@ -16,9 +25,140 @@ except AttributeError:
     pass
 
 
-def parse(filename, name):
-    curHandler = HardwareObjectHandler(name)
+def setCacheDirectory(cache_directory):
+    """Set the directory where parsed XML files are stored between sessions
+
+    Args:
+        cache_directory (str): path of the cache directory. If None, parsed
+            XML files are only cached in memory
+    """
+    global _cacheDirectory
+
+    if cache_directory is not None and not os.path.isdir(cache_directory):
+        try:
+            os.makedirs(cache_directory)
+        except OSError:
+            logging.getLogger("HWR").exception(
+                "Cannot create XML cache directory %s", cache_directory
+            )
+            return
+    _cacheDirectory = cache_directory
+
+
+def clearCache():
+    """Clear the in-memory cache of parsed XML files"""
+    _xmlEventsCache.clear()
+    _xmlStructuresCache.clear()
+
+
+def _xmlKey(XMLString):
+    if not isinstance(XMLString, bytes):
+        XMLString = str.encode(XMLString)
+    return hashlib.sha1(XMLString).hexdigest()
+
+
+class XMLEventsRecorder(ContentHandler):
+    """Records the SAX events of a document, so it can be replayed later"""
+
+    def __init__(self):
+        ContentHandler.__init__(self)
+
+        self.events = []
+
+    def getEvents(self):
+        return self.events
+
+    def startElement(self, name, attrs):
+        self.events.append(("startElement", str(name), dict(attrs.items())))
+
+    def characters(self, content):
+        if self.events and self.events[-1][0] == "characters":
+            self.events[-1] = ("characters", self.events[-1][1] + content)
+        else:
+            self.events.append(("characters", content))
+
+    def endElement(self, name):
+        self.events.append(("endElement", str(name)))
+
+
+def _loadCachedEvents(key):
+    if _cacheDirectory is None:
+        return
+    try:
+        with open(os.path.join(_cacheDirectory, key + ".pickle"), "rb") as f:
+            return pickle.load(f)
+    except (IOError, OSError):
+        return
+    except BaseException:
+        logging.getLogger("HWR").debug("Cannot read cached XML %s", key)
+
+
+def _storeCachedEvents(key, events):
+    if _cacheDirectory is None:
+        return
+    file_path = os.path.join(_cacheDirectory, key + ".pickle")
+    tmp_file_path = "%s.%d.tmp" % (file_path, os.getpid())
+    try:
+        with open(tmp_file_path, "wb") as f:
+            pickle.dump(events, f, pickle.HIGHEST_PROTOCOL)
+        os.rename(tmp_file_path, file_path)
+    except BaseException:
+        logging.getLogger("HWR").debug("Cannot write cached XML %s", key)
 
+
+def getXMLEvents(XMLString):
+    """Return the SAX events of an XML string
+
+    Events are parsed only once for a given content: they are kept in memory
+    and, if a cache directory is set, on disk.
+
+    Args:
+        XMLString (str): the XML document
+
+    Returns:
+        list: tuples (handler method name, arguments...)
+    """
+    key = _xmlKey(XMLString)
+
+    try:
+        return _xmlEventsCache[key]
+    except KeyError:
+        pass
+
+    events = _loadCachedEvents(key)
+    if events is None:
+        recorder = XMLEventsRecorder()
+        if not isinstance(XMLString, bytes):
+            XMLString = str.encode(XMLString)
+        xml.sax.parseString(XMLString, recorder)
+        events = recorder.getEvents()
+        _storeCachedEvents(key, events)
+
+    _xmlEventsCache[key] = events
+    return events
+
+
+def replayXMLEvents(events, handler):
+    """Feed recorded SAX events to a content handler"""
+    for event in events:
+        getattr(handler, event[0])(*event[1:])
+
+
+def getXMLStructure(XMLString):
+    """Return the (cached) XMLStructure of an XML string"""
+    key = _xmlKey(XMLString)
+
+    try:
+        return _xmlStructuresCache[key]
+    except KeyError:
+        xmlStructureRetriever = XMLStructureRetriever()
+        replayXMLEvents(getXMLEvents(XMLString), xmlStructureRetriever)
+        structure = xmlStructureRetriever.getStructure()
+        _xmlStructuresCache[key] = structure
+        return structure
+
+
+def parse(filename, name):
     global currentXML
     try:
         f = open(filename)
@@ -26,20 +166,19 @@ def parse(filename, name):
     except BaseException:
         currentXML = None
 
-    xml.sax.parse(filename, curHandler)
+    if currentXML is None:
+        curHandler = HardwareObjectHandler(name)
+        xml.sax.parse(filename, curHandler)
+        return curHandler.getHardwareObject()
 
-    return curHandler.getHardwareObject()
+    return parseString(currentXML, name)
 
 
 def parseString(XMLHardwareObject, name):
     global currentXML
     currentXML = XMLHardwareObject
     curHandler = HardwareObjectHandler(name)
-    # LNLS
-    # python2.7
-    # xml.sax.parseString(XMLHardwareObject, curHandler)
-    # python3.4
-    xml.sax.parseString(str.encode(XMLHardwareObject), curHandler)
+    replayXMLEvents(getXMLEvents(XMLHardwareObject), curHandler)
     return curHandler.getHardwareObject()
 
 
@@ -66,12 +205,8 @@ def instanciateClass(moduleName, className, objectName):
                 if i >= 0:
                     XMLTemplate = module.__doc__[i + 10 :]
 
-                    xmlStructureRetriever = XMLStructureRetriever()
-                    xml.sax.parseString(currentXML, xmlStructureRetriever)
-                    currentStructure = xmlStructureRetriever.getStructure()
-                    xmlStructureRetriever = XMLStructureRetriever()
-                    xml.sax.parseString(XMLTemplate, xmlStructureRetriever)
-                    templateStructure = xmlStructureRetriever.getStructure()
+                    currentStructure = getXMLStructure(currentXML)
+                    templateStructure = getXMLStructure(XMLTemplate)
 
                     if not templateStructure == currentStructure:
                         logging.getLogger("HWR").error(
@@ -379,3 +514,45 @@ class XMLStructureRetriever(ContentHandler):
 
         self.previousPath = self.path
         self.path = self.path[: self.path.rfind("/")]
+
+
+class XMLReferencesRetriever(ContentHandler):
+    """Collects the names of the Hardware Objects referenced by an XML file
+
+    References are the 'href' and 'hwrid' attributes of any element,
+    including 'hwr_import'. Relative references are resolved against the
+    name of the Hardware Object in the same way as HardwareObjectHandler does.
+    """
+
+    def __init__(self, name):
+        ContentHandler.__init__(self)
+
+        self.name = name
+        self.references = []
+
+    def getReferences(self):
+        return self.references
+
+    def startElement(self, name, attrs):
+        ref = attrs.get("hwrid") or attrs.get("href")
+
+        if ref:
+            reference = str(ref)
+
+            if reference.startswith("../"):
+                reference = "/".join(self.name.split("/")[:-1] + [reference[3:]])
+            elif reference.startswith("./"):
+                reference = "/".join(self.name.split("/")[:-1] + [reference[2:]])
+
+            if not reference.startswith("/"):
+                reference = "/" + reference
+
+            if reference not in self.references:
+                self.references.append(reference)
+
+
+def getReferences(XMLHardwareObject, name):
+    """Return the list of Hardware Object names referenced by an XML string"""
+    referencesRetriever = XMLReferencesRetriever(name)
+    replayXMLEvents(getXMLEvents(XMLHardwareObject), referencesRetriever)
+    return referencesRetriever.getReferences()
@@ -1009,15 +1009,17 @@ class Cats90(SampleChanger):
                 "Basket presence changed. Updating contents"
             )
             self.basket_presence = presence
-            self._updateCatsContents()
-            self._updateLoadedSample()
+            with self._bulkUpdate():
+                self._updateCatsContents()
+                self._updateLoadedSample()
 
     def cats_baskets_changed(self, value):
         logging.getLogger("HWR").warning("Baskets changed. %s" % value)
         for idx, val in enumerate(value):
             self.basket_presence[idx] = val
-        self._updateCatsContents()
-        self._updateLoadedSample()
+        with self._bulkUpdate():
+            self._updateCatsContents()
+            self._updateLoadedSample()
 
     def cats_loaded_lid_changed(self, value):
         cats_loaded_lid = value
@@ -1431,7 +1433,8 @@ class Cats90(SampleChanger):
             is_present = channel.getValue()
             self.basket_presence[basket_index] = is_present
 
-        self._updateCatsContents()
+        with self._bulkUpdate():
+            self._updateCatsContents()
 
     def _updateCatsContents(self):
 
@@ -1,7 +1,7 @@
 import os
 import logging
 import gevent.event
-import subprocess
+import gevent.subprocess
 from HardwareRepository.HardwareObjects.abstract import AbstractDataAnalysis
 
 from HardwareRepository.HardwareObjects import queue_model_enumerables as qme
@@ -33,11 +33,14 @@ class DataAnalysis(AbstractDataAnalysis.AbstractDataAnalysis, HardwareObject):
     def __init__(self, name):
         HardwareObject.__init__(self, name)
         self.collect_obj = None
+        self.job_runner_hwobj = None
         self.result = None
         self.processing_done_event = gevent.event.Event()
+        self.processing_done_event.set()
 
     def init(self):
         self.collect_obj = self.getObjectByRole("collect")
+        self.job_runner_hwobj = self.getObjectByRole("job_runner")
         self.start_edna_command = self.getProperty("edna_command")
         self.edna_default_file = self.getProperty("edna_default_file")
         fp = getHardwareRepository().findInRepository(self.edna_default_file)
@@ -244,7 +247,18 @@ class DataAnalysis(AbstractDataAnalysis.AbstractDataAnalysis, HardwareObject):
         logging.getLogger("queue_exec").info(msg)
 
         args = (self.start_edna_command, input_file, results_file, process_directory)
-        subprocess.call("%s %s %s %s" % args, shell=True)
+        command = "%s %s %s %s" % args
+
+        self.processing_done_event.clear()
+        try:
+            if self.job_runner_hwobj is not None:
+                self.job_runner_hwobj.run(
+                    command, name="EDNA characterisation", lane="characterisation"
+                )
+            else:
+                gevent.subprocess.call(command, shell=True)
+        finally:
+            self.processing_done_event.set()
 
         self.result = None
         if os.path.exists(results_file):
@@ -17,6 +17,7 @@
 #  You should have received a copy of the GNU Lesser General Public License
 #  along with MXCuBE.  If not, see <http://www.gnu.org/licenses/>.
 
+import numpy
 
 from HardwareRepository.HardwareObjects.GenericParallelProcessing import (
     GenericParallelProcessing
@@ -70,12 +71,18 @@ class DozorParallelProcessing(GenericParallelProcessing):
         """
 
         if self.started:
-            for image in batch:
-                self.results_raw["spots_num"][image[0] - 1] = image[1]
-                self.results_raw["spots_resolution"][image[0] - 1] = image[3]
-                self.results_raw["score"][image[0] - 1] = image[4]
+            batch = numpy.array(batch, dtype=float, ndmin=2)
+            image_index = batch[:, 0].astype(int) - 1
+            self.set_batch_results(
+                image_index,
+                {
+                    "spots_num": batch[:, 1],
+                    "spots_resolution": batch[:, 3],
+                    "score": batch[:, 4],
+                },
+            )
 
-            self.align_processing_results(batch[0][0] - 1, batch[-1][0] - 1)
+            self.align_processing_results(image_index.min(), image_index.max())
             self.emit(
                 "paralleProcessingResults",
                 (self.results_aligned, self.params_dict, False),
@@ -20,12 +20,12 @@
 import os
 import time
 import logging
-import gevent
 import subprocess
 
 from HardwareRepository.BaseHardwareObjects import HardwareObject
 from HardwareRepository.HardwareObjects.XSDataCommon import XSDataDouble, XSDataFile, XSDataInteger, XSDataString
 from HardwareRepository.HardwareObjects.XSDataAutoprocv1_0 import XSDataAutoprocInput
+from HardwareRepository.HardwareObjects.file_watcher import get_file_watcher
 
 
 __credits__ = ["EMBL Hamburg"]
@@ -40,8 +40,10 @@ class EMBLAutoProcessing(HardwareObject):
         HardwareObject.__init__(self, name)
         self.result = None
         self.autoproc_programs = None
+        self.job_runner_hwobj = None
 
     def init(self):
+        self.job_runner_hwobj = self.getObjectByRole("job_runner")
         try:
             self.autoproc_programs = self["programs"]
         except KeyError:
@@ -118,7 +120,13 @@ class EMBLAutoProcessing(HardwareObject):
                         params_dict["fileinfo"]["directory"],
                         filename,
                     )
-                if will_execute:
+                if will_execute and self.job_runner_hwobj is not None:
+                    self.job_runner_hwobj.submit(
+                        str(executable + end_of_line_to_execute),
+                        name="%s %s" % (os.path.basename(executable), process_event),
+                        lane="autoprocessing",
+                    )
+                elif will_execute:
                     subprocess.Popen(
                         str(executable + end_of_line_to_execute),
                         shell=True,
@@ -137,7 +145,6 @@ class EMBLAutoProcessing(HardwareObject):
         :type params: dict
         """
         xds_input_file_wait_timeout = 20
-        xds_input_file_wait_resolution = 1
 
         file_name_timestamp = time.strftime("%Y%m%d_%H%M%S")
 
@@ -174,30 +181,20 @@ class EMBLAutoProcessing(HardwareObject):
 
         # Maybe we have to check if directory is there.
         # Maybe create dir with mxcube
-        xds_appeared = False
-        wait_xds_start = time.time()
         logging.debug(
             "EMBLAutoprocessing: Waiting for XDS.INP "
             + "file: %s" % autoproc_xds_filename
         )
-        while (
-            not xds_appeared
-            and time.time() - wait_xds_start < xds_input_file_wait_timeout
-        ):
-            if (
-                os.path.exists(autoproc_xds_filename)
-                and os.stat(autoproc_xds_filename).st_size > 0
-            ):
-                xds_appeared = True
-                logging.debug(
-                    "EMBLAutoprocessing: XDS.INP file is there, size={0}".format(
-                        os.stat(autoproc_xds_filename).st_size
-                    )
+        xds_appeared = get_file_watcher().wait_for_file(
+            autoproc_xds_filename, timeout=xds_input_file_wait_timeout, closed=True
+        )
+        if xds_appeared:
+            logging.debug(
+                "EMBLAutoprocessing: XDS.INP file is there, size={0}".format(
+                    os.stat(autoproc_xds_filename).st_size
                 )
-            else:
-                os.system("ls %s> /dev/null" % (os.path.dirname(autoproc_path)))
-                gevent.sleep(xds_input_file_wait_resolution)
-        if not xds_appeared:
+            )
+        else:
             logging.error(
                 "EMBLAutoprocessing: XDS.INP file %s failed " % autoproc_xds_filename
                 + "to appear after %d seconds" % xds_input_file_wait_timeout
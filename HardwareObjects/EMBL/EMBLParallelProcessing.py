@@ -175,25 +175,26 @@ class EMBLParallelProcessing(GenericParallelProcessing):
         """
         # logging.getLogger("user_level_log").info("Batch arrived %s" % str(self.started))
         if self.started and (type(batch) in (tuple, list)):
-            if type(batch[0]) not in (tuple, list):
-                batch = [batch]
-
-            for image in batch:
-                frame_num = int(image[0])
-                self.results_raw["spots_num"][frame_num] = image[1]
-                self.results_raw["spots_resolution"][frame_num] = 1 / image[3]
-                self.results_raw["score"][frame_num] = image[2]
+            batch = numpy.array(batch, dtype=float, ndmin=2)
+            image_index = batch[:, 0].astype(int)
+            with numpy.errstate(divide="ignore"):
+                spots_resolution = 1 / batch[:, 3]
+            self.set_batch_results(
+                image_index,
+                {
+                    "spots_num": batch[:, 1],
+                    "spots_resolution": spots_resolution,
+                    "score": batch[:, 2],
+                },
+            )
 
+            if self.params_dict["lines_num"] > 1:
+                self.align_mesh_results(image_index)
+            else:
                 for score_key in self.results_raw.keys():
-                    if self.params_dict["lines_num"] > 1:
-                        col, row = self.grid.get_col_row_from_image(frame_num)
-                        self.results_aligned[score_key][col][row] = self.results_raw[
-                            score_key
-                        ][frame_num]
-                    else:
-                        self.results_aligned[score_key][frame_num] = self.results_raw[
-                            score_key
-                        ][frame_num]
+                    self.results_aligned[score_key][image_index] = self.results_raw[
+                        score_key
+                    ][image_index]
             # if self.params_dict["lines_num"] <= 1:
             #   self.smooth()
 
@@ -26,7 +26,7 @@ import Image
 import gevent
 import logging
 import threading
-from queue import Queue
+from queue import Queue, Empty, Full
 
 import cv2 as cv
 import numpy as np
@@ -43,13 +43,22 @@ from HardwareRepository.TaskUtils import task
 from HardwareRepository.HardwareObjects.abstract.AbstractCollect import AbstractCollect
 from HardwareRepository.HardwareObjects.QtGraphicsManager import QtGraphicsManager
 from HardwareRepository.HardwareObjects import queue_model_objects as qmo
+from HardwareRepository.HardwareObjects.EMBL.flat_field import (
+    apply_flat_field,
+    flat_field_worker,
+    new_flat_field_pool,
+    prepare_ff_image,
+)
 
 __credits__ = ["EMBL Hamburg"]
 __license__ = "LGPLv3+"
 __category__ = "Task"
 
 
-image_processing_queue = Queue()
+# number of raw images read ahead of the flat field correction
+PREFETCH_IMAGE_COUNT = 16
+# interval between two listings of the image directory, in seconds
+FILE_POLLING_INTERVAL = 0.1
 
 
 class EMBLXrayImaging(QtGraphicsManager, AbstractCollect):
@@ -68,6 +77,7 @@ class EMBLXrayImaging(QtGraphicsManager, AbstractCollect):
         self.image_count = 0
         self.image_reading_thread = None
         self.image_processing_thread = None
+        self.flat_field_pool = None
         self.ff_corrected_list = []
         self.config_dict = {}
         self.collect_omega_start = 0
@@ -247,6 +257,9 @@ class EMBLXrayImaging(QtGraphicsManager, AbstractCollect):
         self.beam_focusing_hwobj = self.getObjectByRole("beam_focusing")
         self.session_hwobj = self.getObjectByRole("session")
 
+        # created now: forking later, from the processing thread, is unsafe
+        self.flat_field_pool = new_flat_field_pool()
+
     def frame_changed(self, data):
         """
         Displays frame comming from camera
@@ -720,11 +733,16 @@ class EMBLXrayImaging(QtGraphicsManager, AbstractCollect):
         if self.ff_apply and self.image_processing_thread:
             if self.ff_corrected_list[index] is None:
                 im_min, im_max = self.image_processing_thread.get_im_min_max()
-                im = self.image_reading_thread.get_raw_image(index).astype(float)
-                ff_image = self.image_reading_thread.get_ff_image(index).astype(float)
-                ff_corrected_image = np.divide(
-                    im, ff_image, out=np.ones_like(im), where=ff_image != 0
-                )
+                ff_corrected_image = self.image_processing_thread.get_ff_applied(index)
+                if ff_corrected_image is None:
+                    dark_image = self.image_reading_thread.dark_image
+                    ff_corrected_image = apply_flat_field(
+                        im,
+                        prepare_ff_image(
+                            self.image_reading_thread.get_ff_image(index), dark_image
+                        ),
+                        dark_image,
+                    )
                 im = 255.0 * (ff_corrected_image - im_min) / (im_max - im_min)
                 self.ff_corrected_list[index] = im.astype(np.uint16)
             else:
@@ -745,6 +763,15 @@ class EMBLXrayImaging(QtGraphicsManager, AbstractCollect):
             self.graphics_camera_frame.setPixmap(self.qpixmap.fromImage(self.qimage))
             self.emit("imageLoaded", index)
 
+    def image_processed(self, index):
+        """
+        Called by the image processing thread when the flat field correction
+        of an image is done. Images are processed in order
+        :param index: int
+        :return:
+        """
+        self.emit("imageProcessed", index)
+
     def display_image_relative(self, relative_index):
         """
         Displays relative image
@@ -799,10 +826,15 @@ class EMBLXrayImaging(QtGraphicsManager, AbstractCollect):
         self.config_dict = {}
         self.omega_start = self.diffractometer_hwobj.get_omega_position()
 
+        if self.image_reading_thread is not None:
+            self.image_reading_thread.set_stop()
+        if self.image_processing_thread is not None:
+            self.image_processing_thread.set_stop()
         self.image_reading_thread = None
         self.image_processing_thread = None
 
         ff_filename_list = []
+        dark_filename_list = []
         raw_filename_list = []
 
         if not data_model:
@@ -841,13 +873,17 @@ class EMBLXrayImaging(QtGraphicsManager, AbstractCollect):
 
             base_name_list = os.path.splitext(os.path.basename(data_path))
             os.chdir(os.path.dirname(flat_field_path))
-            ff_filename_list = sorted(
-                [
-                    os.path.join(os.path.dirname(flat_field_path), f)
-                    for f in os.listdir(os.path.dirname(flat_field_path))
-                    if f.startswith("ff_" + prefix)
-                ]
-            )
+            ff_directory_files = sorted(os.listdir(os.path.dirname(flat_field_path)))
+            ff_filename_list = [
+                os.path.join(os.path.dirname(flat_field_path), f)
+                for f in ff_directory_files
+                if f.startswith("ff_" + prefix)
+            ]
+            dark_filename_list = [
+                os.path.join(os.path.dirname(flat_field_path), f)
+                for f in ff_directory_files
+                if f.startswith("dark_" + prefix)
+            ]
 
         # Reading raw images -------------------------------------------------
         if data_model:
@@ -881,21 +917,17 @@ class EMBLXrayImaging(QtGraphicsManager, AbstractCollect):
                 )
 
         self.image_count = len(raw_filename_list)
-        if self.image_reading_thread is not None:
-            self.image_reading_thread.set_stop()
-        if self.image_processing_thread is not None:
-            image_processing_queue.queue.clear()
-            self.image_processing_thread.set_stop()
-
         self.ff_corrected_list = [None] * self.image_count
 
         self.image_reading_thread = ImageReadingThread(
-            raw_filename_list, ff_filename_list, ff_ssim
+            raw_filename_list, ff_filename_list, ff_ssim, dark_filename_list
         )
         self.image_reading_thread.start()
 
         if ff_filename_list:
-            self.image_processing_thread = ImageProcessingThread(self.image_count)
+            self.image_processing_thread = ImageProcessingThread(
+                self.image_reading_thread, self.flat_field_pool, self.image_processed
+            )
             self.image_processing_thread.start()
 
         self.current_image_index = 0
@@ -1111,19 +1143,33 @@ class GraphicsView(QtImport.QGraphicsView):
 
 class ImageProcessingThread(threading.Thread):
     """
-    Image processing thread applies flat field correction
+    Image processing thread applies flat field correction in a pool of
+    worker processes and delivers the corrected images in order. Only the
+    last corrected image is kept, display_image corrects the other ones
     """
-    def __init__(self, image_count):
+
+    def __init__(self, image_reading_thread, pool, frame_callback=None):
+        """
+        init
+        :param image_reading_thread: ImageReadingThread
+        :param pool: multiprocessing.Pool returned by new_flat_field_pool
+        :param frame_callback: called with the index of each corrected image
+        """
         threading.Thread.__init__(self)
 
         self.thread_done = None
         self.stopped = False
 
-        self.image_count = image_count
+        self.image_reading_thread = image_reading_thread
+        self.pool = pool
+        self.frame_callback = frame_callback
+
+        self.image_count = len(image_reading_thread.raw_filename_list)
         self.im_min = pow(2, 16)
         self.im_max = 0
 
-        self.ff_applied = None
+        # (image index, corrected image) of the last corrected image
+        self.last_ff_applied = (None, None)
 
     def start(self):
         """
@@ -1149,55 +1195,89 @@ class ImageProcessingThread(threading.Thread):
         """
         return self.im_min, self.im_max
 
+    def get_ff_applied(self, index):
+        """
+        Returns flat field corrected image based on index
+        :param index: int
+        :return: float32 numpy array or None if not the last processed
+        """
+        last_index, ff_applied = self.last_ff_applied
+        if last_index == index:
+            return ff_applied
+        return None
+
+    def iter_tasks(self):
+        """
+        Yields the flat field correction tasks of the images read by the
+        image reading thread
+        :return:
+        """
+        image_queue = self.image_reading_thread.image_queue
+        ff_image_list = self.image_reading_thread.ff_image_list
+        dark_image = self.image_reading_thread.dark_image
+        while not self.stopped:
+            try:
+                task = image_queue.get(timeout=0.5)
+            except Empty:
+                continue
+            if task is None:
+                return
+            raw_image, ff_index, index = task
+            yield raw_image, ff_image_list[ff_index], dark_image, index
+
     def run(self):
         """
         Processing task
         :return:
         """
+        while not self.image_reading_thread.ff_images_read.wait(0.5):
+            if self.stopped:
+                return
+
         logging.getLogger("GUI").info("Image processing started...")
         progress_step = 20
 
-        while not self.stopped:
-            (raw_image, ff_image, index) = image_processing_queue.get()
-
-            self.ff_applied = np.divide(
-                raw_image.astype(float),
-                ff_image.astype(float),
-                out=np.ones_like(raw_image.astype(float)),
-                where=ff_image.astype(float) != 0,
-            )
-            self.ff_applied[ff_image == (pow(2, 16) - 1)] = 1
-
-            if (
-                self.ff_applied[8:].min() < self.im_min
-                and self.ff_applied[8:].max() > self.im_max
-            ):
-                self.im_min = self.ff_applied[8:].min()
-                self.im_max = self.ff_applied[8:].max()
+        for index, ff_applied, im_min, im_max in self.pool.imap(
+            flat_field_worker, self.iter_tasks()
+        ):
+            if self.stopped:
+                return
 
-            image_processing_queue.task_done()
+            self.last_ff_applied = (index, ff_applied)
+            self.im_min = min(self.im_min, im_min)
+            self.im_max = max(self.im_max, im_max)
+            if self.frame_callback is not None:
+                self.frame_callback(index)
 
             done_per = int(float(index) / self.image_count * 100)
             if not index % (self.image_count / (100 / progress_step)) and done_per > 0:
                 logging.getLogger("GUI").info(
                     "Image processing %d%% completed" % done_per
                 )
-            if index == self.image_count - 1:
-                logging.getLogger("GUI").info("Image processing finished")
-                break
+        logging.getLogger("GUI").info("Image processing finished")
 
 
 class ImageReadingThread(threading.Thread):
     """
-    Image reading thread reads image and adds it to queue for image processing thread
+    Image reading thread reads images as they appear on the disk and adds them
+    to a bounded queue for image processing thread
     """
 
-    def __init__(self, raw_filename_list, ff_filename_list=[], ff_ssim=[]):
+    def __init__(
+        self,
+        raw_filename_list,
+        ff_filename_list=[],
+        ff_ssim=[],
+        dark_filename_list=[],
+        prefetch_count=PREFETCH_IMAGE_COUNT,
+    ):
         """
         init
         :param raw_filename_list:
         :param ff_filename_list:
         :param ff_ssim:
+        :param dark_filename_list:
+        :param prefetch_count: max number of images waiting to be processed
         """
         threading.Thread.__init__(self)
 
@@ -1206,12 +1286,18 @@ class ImageReadingThread(threading.Thread):
         self.failed_to_read_count = 10
         self.raw_filename_list = raw_filename_list
         self.ff_filename_list = ff_filename_list
+        self.dark_filename_list = dark_filename_list
 
         self.raw_image_list = [None] * len(self.raw_filename_list)
         self.ff_image_list = [None] * len(self.ff_filename_list)
+        self.dark_image = None
 
         self.ff_ssim = None
 
+        self.image_queue = Queue(prefetch_count)
+        self.ff_images_read = threading.Event()
+        self.directory_files = {}
+
     def start(self):
         """
         Starts the thread
@@ -1237,6 +1323,21 @@ class ImageReadingThread(threading.Thread):
         """
         self.ff_ssim = ff_ssim
 
+    def file_exists(self, filename):
+        """
+        Checks if the file exists. The directory is listed once for all
+        the files it contains and listed again only if the file is missing
+        :param filename:
+        :return: boolean
+        """
+        directory, name = os.path.split(filename)
+        if name not in self.directory_files.get(directory, ()):
+            try:
+                self.directory_files[directory] = set(os.listdir(directory))
+            except OSError:
+                return False
+        return name in self.directory_files[directory]
+
     def read_image(self, filename, timeout=10):
         """
         Image reading method
@@ -1249,10 +1350,12 @@ class ImageReadingThread(threading.Thread):
                 with gevent.Timeout(
                     timeout, Exception("Timeout waiting for image %s" % filename)
                 ):
-                    while not os.path.isfile(filename):
-                        gevent.sleep(0.5)
+                    while not self.file_exists(filename):
+                        if self.stopped:
+                            return
+                        gevent.sleep(FILE_POLLING_INTERVAL)
                     return cv.imread(filename, cv.IMREAD_ANYDEPTH)
-            except gevent.Timeout:
+            except Exception:
                 # Skip the image or
                 self.failed_to_read_count -= 1
                 if self.failed_to_read_count == 0:
@@ -1260,26 +1363,62 @@ class ImageReadingThread(threading.Thread):
         else:
             return cv.imread(filename, cv.IMREAD_ANYDEPTH)
 
+    def queue_image(self, task):
+        """
+        Adds image to the processing queue, waits if the queue is full
+        :param task: tuple (raw image, flat field image index, image index)
+        :return:
+        """
+        while not self.stopped:
+            try:
+                self.image_queue.put(task, timeout=0.5)
+                return
+            except Full:
+                continue
+
     def run(self):
         """
         Main run method
         :return:
         """
-        # GB: 20190303: dumping to avoid endless waiting for image reading
-        return
-
         logging.getLogger("GUI").info("Image reading started...")
+        try:
+            self.read_ff_images()
+            self.read_raw_images()
+        finally:
+            self.ff_images_read.set()
+            self.queue_image(None)
+
+    def read_ff_images(self):
+        """
+        Reads flat field images and averages dark images
+        :return:
+        """
+        dark_image_list = []
+        for filename in self.dark_filename_list:
+            if self.stopped:
+                return
+            dark_image = self.read_image(filename)
+            if dark_image is not None:
+                dark_image_list.append(dark_image)
+        if dark_image_list:
+            self.dark_image = np.mean(dark_image_list, axis=0, dtype=np.float32)
+
         for index, filename in enumerate(self.ff_filename_list):
             if self.stopped:
-                # self.thread_watcher.send()
                 return
             self.ff_image_list[index] = self.read_image(filename)
+        self.ff_images_read.set()
 
+    def read_raw_images(self):
+        """
+        Reads raw images in order as they appear
+        :return:
+        """
         progress_step = 20
 
         for index, filename in enumerate(self.raw_filename_list):
             if self.stopped:
-                # self.thread_watcher.send()
                 return
             self.raw_image_list[index] = self.read_image(filename)
             done_per = int(float(index) / len(self.raw_filename_list) * 100)
@@ -1289,13 +1428,15 @@ class ImageReadingThread(threading.Thread):
             ):
                 logging.getLogger("GUI").info("Image reading %d%% completed" % done_per)
 
-            if self.ff_filename_list:
-                ff_index = 0
-                image_processing_queue.put(
-                    (self.raw_image_list[index], self.ff_image_list[ff_index], index)
+            if (
+                self.raw_image_list[index] is not None
+                and self.ff_filename_list
+                and self.get_ff_image(index) is not None
+            ):
+                self.queue_image(
+                    (self.raw_image_list[index], self.get_ff_index(index), index)
                 )
         logging.getLogger("GUI").info("Image reading finished")
-        # self.thread_watcher.send()
 
     def get_raw_image(self, index):
         """
@@ -1305,18 +1446,22 @@ class ImageReadingThread(threading.Thread):
         """
         return self.raw_image_list[index]
 
+    def get_ff_index(self, raw_image_index):
+        """
+        Returns index of the flat field image of a raw image
+        :param raw_image_index: int
+        :return: int
+        """
+        if self.ff_ssim:
+            return self.ff_ssim[raw_image_index][2] - 1
+        return int(
+            raw_image_index / float(len(self.raw_image_list)) * len(self.ff_image_list)
+        )
+
     def get_ff_image(self, raw_image_index):
         """
-        Returns flat field corrected image
+        Returns flat field image of a raw image
         :param raw_image_index: int
         :return:
         """
-        if self.ff_ssim:
-            ff_index = self.ff_ssim[raw_image_index][2] - 1
-        else:
-            ff_index = int(
-                raw_image_index
-                / float(len(self.raw_image_list))
-                * len(self.ff_image_list)
-            )
-        return self.ff_image_list[ff_index]
+        return self.ff_image_list[self.get_ff_index(raw_image_index)]
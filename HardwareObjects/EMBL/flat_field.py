@@ -0,0 +1,90 @@
+#
+#  Project: MXCuBE
+#  https://github.com/mxcube
+#
+#  This file is part of MXCuBE software.
+#
+#  MXCuBE is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU Lesser General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  MXCuBE is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU Lesser General Public License for more details.
+#
+#  You should have received a copy of the GNU Lesser General Public License
+#  along with MXCuBE.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Flat field correction of X-ray images, used by EMBLXrayImaging.
+
+The worker pool is created once, when the hardware object is initialised:
+it must not be forked later from the image processing thread. The frames
+needed by a correction are therefore sent with each task.
+"""
+
+import multiprocessing
+
+import numpy as np
+
+__credits__ = ["EMBL Hamburg"]
+__license__ = "LGPLv3+"
+
+
+SATURATED_VALUE = pow(2, 16) - 1
+
+
+def prepare_ff_image(ff_image, dark_image=None):
+    """
+    Converts flat field image to float32 and subtracts the dark image.
+    Saturated pixels are set to 0, so that they are not corrected
+    :param ff_image: numpy array
+    :param dark_image: float32 numpy array
+    :return: float32 numpy array
+    """
+    saturated = ff_image == SATURATED_VALUE
+    ff_image = ff_image.astype(np.float32)
+    if dark_image is not None:
+        ff_image -= dark_image
+    ff_image[saturated] = 0
+    return ff_image
+
+
+def apply_flat_field(raw_image, ff_image, dark_image=None):
+    """
+    Divides raw image by the prepared flat field image
+    :param raw_image: numpy array
+    :param ff_image: float32 numpy array returned by prepare_ff_image
+    :param dark_image: float32 numpy array
+    :return: float32 numpy array
+    """
+    raw_image = raw_image.astype(np.float32)
+    if dark_image is not None:
+        raw_image -= dark_image
+    return np.divide(
+        raw_image, ff_image, out=np.ones_like(raw_image), where=ff_image != 0
+    )
+
+
+def flat_field_worker(task):
+    """
+    Applies flat field correction in a worker process
+    :param task: tuple (raw image, flat field image, dark image, image index)
+    :return: tuple (image index, corrected image, min value, max value)
+    """
+    raw_image, ff_image, dark_image, index = task
+    ff_applied = apply_flat_field(
+        raw_image, prepare_ff_image(ff_image, dark_image), dark_image
+    )
+    return index, ff_applied, ff_applied[8:].min(), ff_applied[8:].max()
+
+
+def new_flat_field_pool(worker_count=None):
+    """
+    Creates the pool of worker processes applying flat field correction
+    :param worker_count: number of processes (default: one per cpu but one)
+    :return: multiprocessing.Pool
+    """
+    return multiprocessing.Pool(worker_count or max(1, multiprocessing.cpu_count() - 1))
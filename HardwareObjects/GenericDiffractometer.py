@@ -44,6 +44,11 @@ __version__ = "2.2."
 __status__ = "Draft"
 
 
+def _get_function(method):
+    # unbound methods of python 2 wrap the function
+    return getattr(method, "__func__", method)
+
+
 class DiffractometerState:
     """
     Enumeration of diffractometer states
@@ -153,6 +158,9 @@ class GenericDiffractometer(HardwareObject):
     PHASE_BEAM = "BeamLocation"
     PHASE_UNKNOWN = "Unknown"
 
+    # motors that startSimultaneousMoveMotors does not move
+    NOT_SIMULTANEOUS_MOTORS = ("kappa", "kappa_phi")
+
     def __init__(self, name):
         HardwareObject.__init__(self, name)
 
@@ -184,6 +192,10 @@ class GenericDiffractometer(HardwareObject):
         )  # time to delay for state polling for controllers
         # not updating state inmediately after cmd started
 
+        # largest difference between a motor position and its target after
+        # a simultaneous move
+        self.motor_position_tolerance = 0.001
+
         # Internal values -----------------------------------------------------
         self.ready_event = None
         self.head_type = GenericDiffractometer.HEAD_TYPE_MINIKAPPA
@@ -195,6 +207,7 @@ class GenericDiffractometer(HardwareObject):
         self.zoom_centre = None
         self.pixels_per_mm_x = None
         self.pixels_per_mm_y = None
+        self._screen_projection = None
         self.image_width = None
         self.image_height = None
 
@@ -381,6 +394,10 @@ class GenericDiffractometer(HardwareObject):
         except BaseException:
             pass
 
+        self.motor_position_tolerance = self.getProperty(
+            "motor_position_tolerance", self.motor_position_tolerance
+        )
+
         # Other parameters ---------------------------------------------------
         try:
             self.zoom_centre = eval(self.getProperty("zoom_centre"))
@@ -879,46 +896,105 @@ class GenericDiffractometer(HardwareObject):
     def motor_positions_to_screen(self, centred_positions_dict):
         """
         """
-        if self.use_sample_centring:
-            self.update_zoom_calibration()
-            if None in (self.pixels_per_mm_x, self.pixels_per_mm_y):
-                return 0, 0
-            phi_angle = math.radians(
-                self.centring_phi.direction * self.centring_phi.getPosition()
-            )
-            sampx = self.centring_sampx.direction * (
-                centred_positions_dict["sampx"] - self.centring_sampx.getPosition()
-            )
-            sampy = self.centring_sampy.direction * (
-                centred_positions_dict["sampy"] - self.centring_sampy.getPosition()
-            )
-            phiy = self.centring_phiy.direction * (
-                centred_positions_dict["phiy"] - self.centring_phiy.getPosition()
-            )
-            phiz = self.centring_phiz.direction * (
-                centred_positions_dict["phiz"] - self.centring_phiz.getPosition()
-            )
-            rot_matrix = numpy.matrix(
+        x, y = self.motor_positions_to_screen_batch([centred_positions_dict])[0]
+        return x, y
+
+    def motor_positions_to_screen_batch(self, centred_positions_list):
+        """
+        Projects centred positions to screen coordinates, all at once.
+
+        Subclasses which only override motor_positions_to_screen get it
+        called for each centred position, and a list of its results.
+
+        :param centred_positions_list: motor positions, by motor role
+        :type centred_positions_list: list of dict
+        :returns: (x, y) screen coordinates, one row per centred position
+        :rtype: numpy.ndarray
+        """
+        if _get_function(type(self).motor_positions_to_screen) is not _get_function(
+            GenericDiffractometer.motor_positions_to_screen
+        ):
+            return [
+                self.motor_positions_to_screen(centred_positions_dict)
+                for centred_positions_dict in centred_positions_list
+            ]
+
+        if not self.use_sample_centring:
+            raise NotImplementedError
+
+        projection = self.get_screen_projection()
+        if projection is None:
+            return numpy.zeros((len(centred_positions_list), 2))
+
+        motor_positions = numpy.array(
+            [
                 [
-                    math.cos(phi_angle),
-                    -math.sin(phi_angle),
-                    math.sin(phi_angle),
-                    math.cos(phi_angle),
+                    centred_positions_dict["sampx"],
+                    centred_positions_dict["sampy"],
+                    centred_positions_dict["phiy"],
+                    centred_positions_dict["phiz"],
                 ]
-            )
-            rot_matrix.shape = (2, 2)
-            inv_rot_matrix = numpy.array(rot_matrix.I)
-            dx, dy = (
-                numpy.dot(numpy.array([sampx, sampy]), inv_rot_matrix)
-                * self.pixels_per_mm_x
-            )
+                for centred_positions_dict in centred_positions_list
+            ],
+            dtype=float,
+        ).reshape(-1, 4)
 
-            x = (phiy * self.pixels_per_mm_x) + self.beam_position[0]
-            y = dy + (phiz * self.pixels_per_mm_y) + self.beam_position[1]
+        return numpy.dot(
+            motor_positions - projection["positions"], projection["matrix"]
+        ) + numpy.array(self.beam_position, dtype=float)
 
-            return x, y
-        else:
-            raise NotImplementedError
+    def get_screen_projection(self):
+        """
+        Returns the affine projection of motor positions to the screen,
+        computed from the current zoom calibration and motor positions.
+        It is computed again when they differ from the ones it was
+        computed with.
+
+        :returns: None if there is no zoom calibration, otherwise a dict
+                  with the current sampx, sampy, phiy and phiz positions
+                  and the (4, 2) matrix projecting position offsets to
+                  screen offsets
+        :rtype: dict
+        """
+        self.update_zoom_calibration()
+        if None in (self.pixels_per_mm_x, self.pixels_per_mm_y):
+            return None
+
+        centring_motors = (
+            self.centring_sampx,
+            self.centring_sampy,
+            self.centring_phiy,
+            self.centring_phiz,
+        )
+        phi_position = self.centring_phi.getPosition()
+        positions = tuple(motor.getPosition() for motor in centring_motors)
+        key = (self.pixels_per_mm_x, self.pixels_per_mm_y, phi_position, positions)
+
+        projection = self._screen_projection
+        if projection is not None and projection["key"] == key:
+            return projection
+
+        phi_angle = math.radians(self.centring_phi.direction * phi_position)
+        # dy = sampx * sin(phi) + sampy * cos(phi) is scaled with
+        # pixels_per_mm_x, as in the former single point projection
+        matrix = numpy.array(
+            [
+                [0, math.sin(phi_angle) * self.pixels_per_mm_x],
+                [0, math.cos(phi_angle) * self.pixels_per_mm_x],
+                [self.pixels_per_mm_x, 0],
+                [0, self.pixels_per_mm_y],
+            ]
+        )
+        matrix *= numpy.array(
+            [[motor.direction] for motor in centring_motors], dtype=float
+        )
+
+        self._screen_projection = {
+            "key": key,
+            "positions": numpy.array(positions, dtype=float),
+            "matrix": matrix,
+        }
+        return self._screen_projection
 
     def move_to_centred_position(self, centred_position):
         """
@@ -936,37 +1012,40 @@ class GenericDiffractometer(HardwareObject):
         if wait:
             self.wait_device_ready(10)
 
-    def move_motors(self, motor_positions, timeout=15):
+    def move_motors(self, motor_positions, timeout=15, rollback=False):
         """
         Moves diffractometer motors to the requested positions
 
+        All the motors are moved at the same time: with a single call if
+        the diffractometer has the startSimultaneousMoveMotors command,
+        otherwise with move_motors_group.
+
         :param motors_dict: dictionary with motor names or hwobj
                             and target values.
         :type motors_dict: dict
+        :param timeout: timeout for the whole move, in seconds
+        :type timeout: float
+        :param rollback: move the motors back to their start positions
+                         if one of them fails
+        :type rollback: bool
         """
         if not isinstance(motor_positions, dict):
             motor_positions = motor_positions.as_dict()
 
         self.wait_device_ready(timeout)
 
-        for motor in motor_positions.keys():
-            position = motor_positions[motor]
-            """
+        motor_hwobj_positions = {}
+        for motor, position in motor_positions.items():
             if isinstance(motor, (str, unicode)):
-                logging.getLogger("HWR").debug(" Moving %s to %s" % (motor, position))
-            else:
-                logging.getLogger("HWR").debug(
-                    " Moving %s to %s" % (str(motor.name()), position)
-                )
-            """
-            if isinstance(motor, (str, unicode)):
-                motor_role = motor
-                motor = self.motor_hwobj_dict.get(motor_role)
-                #del motor_positions[motor_role]
-                if None in (motor, position):
-                    continue
-                #motor_positions[motor] = position
-            motor.move(position)
+                motor = self.motor_hwobj_dict.get(motor)
+            if None in (motor, position):
+                continue
+            motor_hwobj_positions[motor] = position
+
+        if "startSimultaneousMoveMotors" in self.command_dict:
+            self.move_motors_simultaneous(motor_hwobj_positions, timeout, rollback)
+        else:
+            self.move_motors_group(motor_hwobj_positions, timeout, rollback)
         self.wait_device_ready(timeout)
 
         if self.delay_state_polling is not None and self.delay_state_polling > 0:
@@ -976,6 +1055,162 @@ class GenericDiffractometer(HardwareObject):
 
         self.wait_device_ready(timeout)
 
+    def move_motors_simultaneous(self, motor_positions, timeout=15, rollback=False):
+        """
+        Moves motors with one startSimultaneousMoveMotors command and
+        waits until the diffractometer is ready. Kappa and kappa_phi, that
+        the command does not move, are then moved with move_motors_group.
+
+        The move fails if it does not finish within timeout or if a motor
+        is not at its target position at the end. The motors are then
+        stopped and, with rollback, moved back to their start positions.
+
+        :param motor_positions: target positions, by motor hwobj
+        :type motor_positions: dict
+        :param timeout: timeout in seconds
+        :type timeout: float
+        :param rollback: move back to the start positions after an error
+        :type rollback: bool
+        """
+        motor_positions = dict(motor_positions)
+        other_positions = {}
+        for motor_role in self.NOT_SIMULTANEOUS_MOTORS:
+            motor = self.motor_hwobj_dict.get(motor_role)
+            if motor in motor_positions:
+                other_positions[motor] = motor_positions.pop(motor)
+
+        if motor_positions:
+            start_positions = {}
+            if rollback:
+                for motor in motor_positions:
+                    start_positions[motor] = motor.get_position()
+
+            argin = ""
+            for motor, position in motor_positions.items():
+                argin += "%s=%0.4f;" % (self.get_motor_exporter_name(motor), position)
+
+            try:
+                self.command_dict["startSimultaneousMoveMotors"](argin)
+                self.wait_device_ready(timeout)
+                self.check_motor_positions(motor_positions)
+            except BaseException:
+                self.stop_motors(motor_positions)
+                if start_positions:
+                    logging.getLogger("HWR").info(
+                        "Diffractometer: moving motors back to start positions"
+                    )
+                    try:
+                        self.move_motors_simultaneous(start_positions, timeout)
+                    except BaseException:
+                        logging.getLogger("HWR").exception(
+                            "Diffractometer: could not move motors back"
+                        )
+                raise
+
+        if other_positions:
+            self.move_motors_group(other_positions, timeout, rollback)
+
+    def check_motor_positions(self, motor_positions):
+        """
+        Raises an exception if a motor is not at its target position,
+        within motor_position_tolerance.
+
+        :param motor_positions: target positions, by motor hwobj
+        :type motor_positions: dict
+        """
+        for motor, position in motor_positions.items():
+            motor_position = motor.get_position()
+            if motor_position is None:
+                continue
+            if abs(motor_position - position) > self.motor_position_tolerance:
+                raise RuntimeError(
+                    "Motor %s stopped at %s instead of %s"
+                    % (self.get_motor_exporter_name(motor), motor_position, position)
+                )
+
+    def move_motors_group(self, motor_positions, timeout=15, rollback=False):
+        """
+        Starts all motors at once and waits until all of them are ready.
+
+        If one motor fails, or the group does not finish within timeout,
+        the other motors are stopped and, with rollback, moved back to
+        their start positions. The first error is raised.
+
+        :param motor_positions: target positions, by motor hwobj
+        :type motor_positions: dict
+        :param timeout: timeout for the whole group, in seconds
+        :type timeout: float
+        :param rollback: move back to the start positions after an error
+        :type rollback: bool
+        """
+        start_positions = {}
+        if rollback:
+            for motor in motor_positions:
+                start_positions[motor] = motor.get_position()
+
+        move_tasks = [
+            gevent.spawn(self.move_motor_and_wait, motor, position)
+            for motor, position in motor_positions.items()
+        ]
+        try:
+            with gevent.Timeout(timeout, Exception("Timeout waiting for motors")):
+                gevent.joinall(move_tasks, raise_error=True)
+        except BaseException:
+            gevent.killall(move_tasks)
+            self.stop_motors(motor_positions)
+            if start_positions:
+                logging.getLogger("HWR").info(
+                    "Diffractometer: moving motors back to start positions"
+                )
+                try:
+                    self.move_motors_group(start_positions, timeout)
+                except BaseException:
+                    logging.getLogger("HWR").exception(
+                        "Diffractometer: could not move motors back"
+                    )
+            raise
+
+    def move_motor_and_wait(self, motor, position):
+        """
+        Moves one motor and waits until it is ready, used by
+        move_motors_group.
+        """
+        motor.move(position)
+
+        if hasattr(motor, "waitEndOfMove"):
+            motor.waitEndOfMove()
+        elif hasattr(motor, "is_ready"):
+            while not motor.is_ready():
+                gevent.sleep(0.01)
+
+    def stop_motors(self, motors):
+        """
+        Stops motors, errors are logged.
+
+        :param motors: motor hwobjs
+        :type motors: list
+        """
+        for motor in motors:
+            try:
+                motor.stop()
+            except BaseException:
+                logging.getLogger("HWR").exception(
+                    "Diffractometer: could not stop motor %s" % motor.name()
+                )
+
+    def get_motor_exporter_name(self, motor):
+        """
+        :returns: Name of the motor for startSimultaneousMoveMotors: its
+                  motor_name, or its role.
+        :rtype: str
+        """
+        if getattr(motor, "motor_name", None):
+            return motor.motor_name
+        for motor_role, motor_hwobj in self.motor_hwobj_dict.items():
+            if motor_hwobj is motor:
+                return motor_role
+        return motor.name()
+
     def move_motors_done(self, move_motors_procedure):
         """
         Descript. :
@@ -80,6 +80,7 @@ class GenericParallelProcessing(HardwareObject):
         self.workflow_info = None
 
         self.plot_points_num = None
+        self.col_row_table = None
         self.current_grid_index = None
         self.grid_properties = []
 
@@ -174,6 +175,13 @@ class GenericParallelProcessing(HardwareObject):
             process_directory = self.workflow_info["process_root_directory"]
             archive_directory = self.workflow_info["archive_root_directory"]
         else:
+            # list the process directory once instead of testing each run
+            try:
+                existing_names = set(
+                    os.listdir(acquisition.path_template.process_directory)
+                )
+            except OSError:
+                existing_names = set()
             i = 1
             while True:
                 process_input_file_dirname = "%s_run%s_%d" % (prefix, run_number, i)
@@ -185,7 +193,7 @@ class GenericParallelProcessing(HardwareObject):
                     acquisition.path_template.get_archive_directory(),
                     process_input_file_dirname,
                 )
-                if not os.path.exists(process_directory):
+                if process_input_file_dirname not in existing_names:
                     break
                 i += 1
 
@@ -281,6 +289,7 @@ class GenericParallelProcessing(HardwareObject):
 
         self.results_raw = {}
         self.results_aligned = {}
+        self.col_row_table = None
 
         # Empty numpy arrays to store raw and aligned results
         self.plot_points_num = images_num
@@ -737,26 +746,70 @@ class GenericParallelProcessing(HardwareObject):
         """
         # ---------------------------------------------------------------------
 
+    def set_batch_results(self, image_index, batch_results):
+        """Stores the results of a batch of processed images
+
+        :param image_index: image indexes, 0 for the first image
+        :type image_index: numpy array of int
+        :param batch_results: result values in the order of image_index,
+                              by result name
+        :type batch_results: dict of numpy arrays
+        """
+        for result_name, values in batch_results.items():
+            self.results_raw[result_name][image_index] = values
+
+    def get_cell_col_row(self, image_index):
+        """Returns the grid cells of images, with a lookup table computed
+           once per processing. Images out of the grid are left out
+
+        :param image_index: image indexes, 0 for the first image
+        :type image_index: numpy array of int
+        :returns: image indexes, cols and rows of their cells
+        :rtype: tuple of numpy arrays
+        """
+        if self.col_row_table is None:
+            # table is indexed by image serial - first image of the grid
+            cols, rows = self.grid.get_col_row_table()
+            offset = (
+                self.params_dict["first_image_num"]
+                - self.grid.get_properties()["first_image_num"]
+            )
+            self.col_row_table = (cols, rows, offset)
+        cols, rows, offset = self.col_row_table
+
+        table_index = image_index + offset
+        in_table = (table_index >= 0) & (table_index < cols.size)
+        image_index = image_index[in_table]
+        cols = cols[table_index[in_table]]
+        rows = rows[table_index[in_table]]
+
+        num_cols, num_rows = self.results_aligned["score"].shape
+        in_grid = (cols >= 0) & (cols < num_cols) & (rows >= 0) & (rows < num_rows)
+        return image_index[in_grid], cols[in_grid], rows[in_grid]
+
+    def align_mesh_results(self, image_index):
+        """Copies the raw results of images to their grid cells in the
+           aligned results
+
+        :param image_index: image indexes, 0 for the first image
+        :type image_index: numpy array of int
+        """
+        image_index, cols, rows = self.get_cell_col_row(image_index)
+        for score_key in self.results_raw.keys():
+            self.results_aligned[score_key][cols, rows] = self.results_raw[score_key][
+                image_index
+            ]
+
     def align_processing_results(self, start_index, end_index):
         """Realigns all results. Each results (one dimensional numpy array)
            is converted to 2d numpy array according to diffractometer geometry.
            Function also extracts 10 (if they exist) best positions
         """
         # Each result array is realigned
-        for score_key in self.results_raw.keys():
-            if self.params_dict["lines_num"] > 1:
-                for cell_index in range(start_index, end_index + 1):
-                    col, row = self.grid.get_col_row_from_image_serial(
-                        cell_index + self.params_dict["first_image_num"]
-                    )
-                    if (
-                        col < self.results_aligned[score_key].shape[0]
-                        and row < self.results_aligned[score_key].shape[1]
-                    ):
-                        self.results_aligned[score_key][col][row] = self.results_raw[
-                            score_key
-                        ][cell_index]
-            else:
+        if self.params_dict["lines_num"] > 1:
+            self.align_mesh_results(np.arange(start_index, end_index + 1))
+        else:
+            for score_key in self.results_raw.keys():
                 self.results_aligned[score_key] = self.results_raw[score_key][
                     :: self.params_dict["images_num"] / self.plot_points_num
                 ]
@@ -5,20 +5,27 @@ from collections import namedtuple
 from datetime import datetime
 from HardwareRepository.BaseHardwareObjects import HardwareObject
 try:
-    from urlparse import urljoin
+    from urlparse import urljoin, urlparse
     from urllib2 import URLError
+    import httplib as http_client
 except:
     # Python3
-    from urllib.parse import urljoin
+    from urllib.parse import urljoin, urlparse
     from urllib.error import URLError
+    import http.client as http_client
 
 from suds.sudsobject import asdict
 from suds import WebFault
+from suds.cache import ObjectCache
 from suds.client import Client
+from suds.transport import Reply, TransportError
+from suds.transport.http import HttpAuthenticated
+import io
 import json
 import time
 import itertools
 import os
+import socket
 
 """
 A client for ISPyB Webservices.
@@ -44,6 +51,12 @@ _WS_AUTOPROC_URL = _WSDL_ROOT + "ToolsForAutoprocessingWebService?wsdl"
 _WS_USERNAME = None
 _WS_PASSWORD = None
 
+# Parsed WSDL documents are cached on disk, see ISPyBClient.get_wsdl_cache
+_WSDL_CACHE_DIRECTORY = os.path.join(
+    os.path.expanduser("~"), ".cache", "mxcube", "wsdl"
+)
+_WSDL_CACHE_DAYS = 1
+
 _CONNECTION_ERROR_MSG = (
     "Could not connect to ISPyB, please verify that "
     + "the server is running and that your "
@@ -104,6 +117,82 @@ def in_greenlet(fun):
     return _in_greenlet
 
 
+class KeepAliveTransport(HttpAuthenticated):
+    """
+    suds transport sending the SOAP requests on persistent HTTP
+    connections, with basic authentication. Idle connections are kept per
+    host and reused by the next requests. Requests going through a proxy
+    use the default urllib transport.
+    """
+
+    def __init__(self, **kwargs):
+        HttpAuthenticated.__init__(self, **kwargs)
+        self._idle_connections = {}
+
+    def send(self, request):
+        if self.options.proxy:
+            return HttpAuthenticated.send(self, request)
+
+        self.addcredentials(request)
+        url = urlparse(request.url)
+        path = url.path
+        if url.query:
+            path += "?" + url.query
+        headers = dict(request.headers)
+        headers["Connection"] = "keep-alive"
+
+        while True:
+            connection, reused = self._get_connection(url.scheme, url.netloc)
+            try:
+                connection.request("POST", path, request.message, headers)
+                response = connection.getresponse()
+                message = response.read()
+            except (http_client.HTTPException, socket.error):
+                connection.close()
+                if reused:
+                    # the server closed the idle connection, try a new one
+                    continue
+                raise
+            break
+
+        if response.will_close:
+            connection.close()
+        else:
+            self._idle_connections.setdefault((url.scheme, url.netloc), []).append(
+                connection
+            )
+
+        if response.status in (202, 204):
+            return None
+        if response.status >= 300:
+            raise TransportError(response.reason, response.status, io.BytesIO(message))
+        return Reply(200, dict(response.getheaders()), message)
+
+    def _get_connection(self, scheme, netloc):
+        """
+        Returns an idle connection to <netloc>, or a new one, and whether it
+        is reused.
+        """
+        idle_connections = self._idle_connections.get((scheme, netloc))
+        if idle_connections:
+            return idle_connections.pop(), True
+
+        if scheme == "https":
+            connection_class = http_client.HTTPSConnection
+        else:
+            connection_class = http_client.HTTPConnection
+        return connection_class(netloc, timeout=self.options.timeout), False
+
+    def close(self):
+        """
+        Closes the idle connections.
+        """
+        for connections in self._idle_connections.values():
+            for connection in connections:
+                connection.close()
+        self._idle_connections = {}
+
+
 def utf_encode(res_d):
     for key in res_d.iterkeys():
         if isinstance(res_d[key], dict):
@@ -155,6 +244,9 @@ class ISPyBClient(HardwareObject):
         self.ws_root = None
         self.ws_username = None
         self.ws_password = None
+        self.proxy = {}
+        self.wsdl_cache = None
+        self._ws_clients = {}
 
         self.base_result_url = None
 
@@ -210,72 +302,11 @@ class ISPyBClient(HardwareObject):
                 _WS_COLLECTION_URL = _WSDL_ROOT + "ToolsForCollectionWebService?wsdl"
                 _WS_AUTOPROC_URL = _WSDL_ROOT + "ToolsForAutoprocessingWebService?wsdl"
 
-                if self.ws_root.strip().startswith("https://"):
-                    from suds.transport.https import HttpAuthenticated
-                else:
-                    from suds.transport.http import HttpAuthenticated
-
-                t1 = HttpAuthenticated(
-                    username=self.ws_username,
-                    password=self.ws_password,
-                    proxy=self.proxy,
-                )
-
-                t2 = HttpAuthenticated(
-                    username=self.ws_username,
-                    password=self.ws_password,
-                    proxy=self.proxy,
-                )
-
-                t3 = HttpAuthenticated(
-                    username=self.ws_username,
-                    password=self.ws_password,
-                    proxy=self.proxy,
-                )
-
-                t4 = HttpAuthenticated(
-                    username=self.ws_username,
-                    password=self.ws_password,
-                    proxy=self.proxy,
-                )
-
                 try:
-                    self._shipping = Client(
-                        _WS_SHIPPING_URL,
-                        timeout=3,
-                        transport=t1,
-                        cache=None,
-                        proxy=self.proxy,
-                    )
-                    self._collection = Client(
-                        _WS_COLLECTION_URL,
-                        timeout=3,
-                        transport=t2,
-                        cache=None,
-                        proxy=self.proxy,
-                    )
-                    self._tools_ws = Client(
-                        _WS_BL_SAMPLE_URL,
-                        timeout=3,
-                        transport=t3,
-                        cache=None,
-                        proxy=self.proxy,
-                    )
-                    self._autoproc_ws = Client(
-                        _WS_AUTOPROC_URL,
-                        timeout=3,
-                        transport=t4,
-                        cache=None,
-                        proxy=self.proxy,
-                    )
-
-                    # ensure that suds do not create those files in tmp
-                    self._shipping.set_options(cache=None, location=_WS_SHIPPING_URL)
-                    self._collection.set_options(
-                        cache=None, location=_WS_COLLECTION_URL
-                    )
-                    self._tools_ws.set_options(cache=None, location=_WS_BL_SAMPLE_URL)
-                    self._autoproc_ws.set_options(cache=None, location=_WS_AUTOPROC_URL)
+                    self._shipping = self.get_ws_client(_WS_SHIPPING_URL)
+                    self._collection = self.get_ws_client(_WS_COLLECTION_URL)
+                    self._tools_ws = self.get_ws_client(_WS_BL_SAMPLE_URL)
+                    self._autoproc_ws = self.get_ws_client(_WS_AUTOPROC_URL)
                 except URLError:
                     logging.getLogger("ispyb_client").exception(_CONNECTION_ERROR_MSG)
                     return
@@ -302,6 +333,63 @@ class ISPyBClient(HardwareObject):
                 except AttributeError:
                     pass
 
+    def get_wsdl_cache(self):
+        """
+        Returns the cache of the parsed WSDL documents, in the directory
+        given by the wsdl_cache_directory property. The cache is disabled
+        if the directory can not be created.
+
+        :rtype: suds.cache.ObjectCache
+        """
+        if self.wsdl_cache is None:
+            cache_directory = self.getProperty(
+                "wsdl_cache_directory", _WSDL_CACHE_DIRECTORY
+            )
+            cache_days = self.getProperty("wsdl_cache_days", _WSDL_CACHE_DAYS)
+            try:
+                if not os.path.isdir(cache_directory):
+                    os.makedirs(cache_directory)
+                self.wsdl_cache = ObjectCache(
+                    location=cache_directory, days=int(cache_days)
+                )
+            except (OSError, IOError):
+                logging.getLogger("HWR").warning(
+                    "ISPyBClient: cannot cache WSDL documents in %s", cache_directory
+                )
+                self.wsdl_cache = False
+
+        return self.wsdl_cache or None
+
+    def get_ws_client(self, url):
+        """
+        Returns the web service client for the WSDL <url>. Clients are
+        created once, with a persistent connection to the server.
+
+        :param url: The WSDL url of the web service.
+        :type url: str
+
+        :rtype: suds.client.Client
+        """
+        client = self._ws_clients.get(url)
+
+        if client is None:
+            transport = KeepAliveTransport(
+                username=self.ws_username, password=self.ws_password, proxy=self.proxy
+            )
+            # cachingpolicy 1 caches the parsed WSDL instead of the XML
+            client = Client(
+                url,
+                timeout=3,
+                transport=transport,
+                cache=self.get_wsdl_cache(),
+                cachingpolicy=1,
+                proxy=self.proxy,
+            )
+            client.set_options(location=url)
+            self._ws_clients[url] = client
+
+        return client
+
     def get_login_type(self):
         return self.loginType
 
@@ -1872,11 +1960,13 @@ class ISPyBClient(HardwareObject):
         grid_info_id = None
 
         if self._collection:
-            workflow_vo = ISPyBValueFactory().workflow_from_workflow_info(info_dict)
+            workflow_vo = ISPyBValueFactory().workflow_from_workflow_info(
+                self._collection, info_dict
+            )
             workflow_id = self._collection.service.storeOrUpdateWorkflow(workflow_vo)
 
             workflow_mesh_vo = ISPyBValueFactory().workflow_mesh_from_workflow_info(
-                info_dict
+                self._collection, info_dict
             )
             workflow_mesh_vo.workflowId = workflow_id
 
@@ -1884,7 +1974,9 @@ class ISPyBClient(HardwareObject):
                 workflow_mesh_vo
             )
 
-            grid_info_vo = ISPyBValueFactory().grid_info_from_workflow_info(info_dict)
+            grid_info_vo = ISPyBValueFactory().grid_info_from_workflow_info(
+                self._collection, info_dict
+            )
             grid_info_vo.workflowMeshId = workflow_mesh_id
 
             grid_info_id = self._collection.service.storeOrUpdateGridInfo(grid_info_vo)
@@ -2452,16 +2544,14 @@ class ISPyBValueFactory:
 
         return data_collection
 
-    def workflow_from_workflow_info(self, workflow_info_dict):
+    def workflow_from_workflow_info(self, ws_client, workflow_info_dict):
         """
         Ceates workflow3VO from worflow_info_dict.
         :rtype: workflow3VO
         """
-        ws_client = None
         workflow_vo = None
 
         try:
-            ws_client = Client(_WS_COLLECTION_URL, cache=None)
             workflow_vo = ws_client.factory.create("workflow3VO")
         except BaseException:
             raise
@@ -2483,16 +2573,14 @@ class ISPyBValueFactory:
 
         return workflow_vo
 
-    def workflow_mesh_from_workflow_info(self, workflow_info_dict):
+    def workflow_mesh_from_workflow_info(self, ws_client, workflow_info_dict):
         """
         Ceates workflowMesh3VO from worflow_info_dict.
         :rtype: workflowMesh3VO
         """
-        ws_client = None
         workflow_mesh_vo = None
 
         try:
-            ws_client = Client(_WS_COLLECTION_URL, cache=None)
             workflow_mesh_vo = ws_client.factory.create("workflowMeshWS3VO")
         except BaseException:
             raise
@@ -2517,16 +2605,14 @@ class ISPyBValueFactory:
 
         return workflow_mesh_vo
 
-    def grid_info_from_workflow_info(self, workflow_info_dict):
+    def grid_info_from_workflow_info(self, ws_client, workflow_info_dict):
         """
         Ceates grid3VO from worflow_info_dict.
         :rtype: grid3VO
         """
-        ws_client = None
         grid_info_vo = None
 
         try:
-            ws_client = Client(_WS_COLLECTION_URL, cache=None)
             grid_info_vo = ws_client.factory.create("gridInfoWS3VO")
         except BaseException:
             raise
@@ -2547,16 +2633,14 @@ class ISPyBValueFactory:
 
         return grid_info_vo
 
-    def workflow_step_from_workflow_info(self, workflow_info_dict):
+    def workflow_step_from_workflow_info(self, ws_client, workflow_info_dict):
         """
         Ceates workflow3VO from worflow_info_dict.
         :rtype: workflow3VO
         """
-        ws_client = None
         workflow_vo = None
 
         try:
-            ws_client = Client(_WS_COLLECTION_URL, cache=None)
             workflow_step_vo = ws_client.factory.create("workflowStep3VO")
         except BaseException:
             raise
@@ -2585,16 +2669,14 @@ class ISPyBValueFactory:
 
         return workflow_step_vo
 
-    def grid_info_from_workflow_info(self, workflow_info_dict):
+    def grid_info_from_workflow_info(self, ws_client, workflow_info_dict):
         """
         Ceates grid3VO from worflow_info_dict.
         :rtype: grid3VO
         """
-        ws_client = None
         grid_info_vo = None
 
         try:
-            ws_client = Client(_WS_COLLECTION_URL, cache=None)
             grid_info_vo = ws_client.factory.create("gridInfoWS3VO")
         except BaseException:
             raise
@@ -0,0 +1,269 @@
+#
+#  Project: MXCuBE
+#  https://github.com/mxcube.
+#
+#  This file is part of MXCuBE software.
+#
+#  MXCuBE is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU Lesser General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  MXCuBE is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU Lesser General Public License for more details.
+#
+#  You should have received a copy of the GNU Lesser General Public License
+#  along with MXCuBE.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+JobRunner runs external processing commands (EDNA characterisation,
+autoprocessing scripts...) in gevent friendly subprocesses, so that the
+queue stays responsive while they run.
+
+Jobs are submitted to a lane, each lane having its own slots: at most
+<slots> jobs of a lane run at the same time, the other ones wait for a free
+slot of their lane in submission order. The exit status and the wall time
+of each job are recorded and the jobStarted, jobFinished and jobFailed
+signals are emitted with the Job object.
+
+Long autoprocessing runs use the "autoprocessing" lane and characterisations
+the "characterisation" lane, so that the queue waiting for a
+characterisation never waits for autoprocessing slots, even when the
+collect and data_analysis objects use the same runner. <lanes> sets the
+slots of some lanes, the other lanes have <slots> slots.
+
+Example xml:
+<object class="JobRunner">
+  <slots>2</slots>
+  <lanes>autoprocessing:4 characterisation:2</lanes>
+</object>
+
+Hardware objects get it with the job_runner role:
+
+    job = self.job_runner_hwobj.submit(
+        "edna.sh input.xml", name="EDNA", lane="characterisation"
+    )
+    ...
+    job.wait()
+"""
+
+import logging
+import time
+
+import gevent
+import gevent.event
+import gevent.lock
+import gevent.subprocess
+
+from HardwareRepository.BaseHardwareObjects import HardwareObject
+
+
+__credits__ = ["MXCuBE collaboration"]
+__license__ = "LGPLv3+"
+__category__ = "General"
+
+
+DEFAULT_SLOTS = 2
+DEFAULT_LANE = "default"
+
+
+class Job(object):
+    """State of an external command submitted to the JobRunner"""
+
+    def __init__(
+        self, command, name=None, cwd=None, env=None, log_file=None, lane=DEFAULT_LANE
+    ):
+        """
+        :param command: command line, run with the shell if it is a string
+        :type command: str or list
+        :param name: name used in the log messages
+        :param cwd: working directory of the command
+        :param env: environment of the command
+        :param log_file: file receiving the command stdout and stderr
+        :param lane: lane whose slots the command uses
+        """
+        self.command = command
+        self.name = name or str(command)
+        self.lane = lane
+        self.cwd = cwd
+        self.env = env
+        self.log_file = log_file
+
+        self.process = None
+        self.returncode = None
+        self.error = None
+        self.submit_time = time.time()
+        self.start_time = None
+        self.end_time = None
+        self.result = gevent.event.AsyncResult()
+
+    def __repr__(self):
+        return "<Job %s>" % self.name
+
+    def is_running(self):
+        return self.start_time is not None and not self.result.ready()
+
+    def is_done(self):
+        return self.result.ready()
+
+    def is_successful(self):
+        return self.returncode == 0
+
+    def get_wall_time(self):
+        """
+        :returns: Run time of the command in seconds, None if not started
+        :rtype: float
+        """
+        if self.start_time is None:
+            return None
+        return (self.end_time or time.time()) - self.start_time
+
+    def wait(self, timeout=None):
+        """
+        Waits until the command exits. Blocks only the calling greenlet.
+
+        :param timeout: maximum time to wait in seconds
+        :returns: exit status of the command
+        :rtype: int
+        """
+        return self.result.get(timeout=timeout)
+
+
+class JobRunner(HardwareObject):
+    """Runs external commands without blocking, in lanes of limited slots"""
+
+    def __init__(self, name):
+        HardwareObject.__init__(self, name)
+
+        self.slots = DEFAULT_SLOTS
+        self.lane_slots = {}
+        self.lane_semaphores = None
+        self.jobs = []
+
+    def init(self):
+        self.slots = int(self.getProperty("slots", DEFAULT_SLOTS))
+        self.lane_slots = {}
+        for lane in str(self.getProperty("lanes") or "").split():
+            lane_name, slots = lane.split(":")
+            self.lane_slots[lane_name] = int(slots)
+        self.lane_semaphores = {}
+
+    def get_lane_slots(self, lane=DEFAULT_LANE):
+        return self.lane_slots.get(lane, self.slots)
+
+    def submit(
+        self, command, name=None, cwd=None, env=None, log_file=None, lane=DEFAULT_LANE
+    ):
+        """
+        Queues the command and returns immediately
+
+        :param command: command line, run with the shell if it is a string
+        :type command: str or list
+        :param lane: lane whose slots the command uses
+        :returns: job, use job.wait() to wait for the command
+        :rtype: Job
+        """
+        if self.lane_semaphores is None:
+            self.init()
+        if lane not in self.lane_semaphores:
+            self.lane_semaphores[lane] = gevent.lock.Semaphore(
+                self.get_lane_slots(lane)
+            )
+
+        job = Job(command, name, cwd, env, log_file, lane)
+        self.jobs.append(job)
+        gevent.spawn(self.run_job, job)
+        return job
+
+    def run(
+        self, command, name=None, cwd=None, env=None, log_file=None, lane=DEFAULT_LANE
+    ):
+        """
+        Submits the command and waits until it exits. Only the calling
+        greenlet waits.
+
+        :returns: finished job
+        :rtype: Job
+        """
+        job = self.submit(command, name, cwd, env, log_file, lane)
+        job.wait()
+        return job
+
+    def run_job(self, job):
+        with self.lane_semaphores[job.lane]:
+            job.start_time = time.time()
+            logging.getLogger("HWR").debug(
+                "JobRunner: starting %s (%s)" % (job.name, job.command)
+            )
+            self.emit("jobStarted", (job,))
+
+            output = None
+            try:
+                if job.log_file:
+                    output = open(job.log_file, "a")
+                job.process = gevent.subprocess.Popen(
+                    job.command,
+                    shell=isinstance(job.command, str),
+                    cwd=job.cwd,
+                    env=job.env,
+                    stdout=output,
+                    stderr=output,
+                    close_fds=True,
+                )
+                job.returncode = job.process.wait()
+            except BaseException as ex:
+                job.error = ex
+                if job.process is not None and job.process.poll() is None:
+                    job.process.kill()
+            finally:
+                if output is not None:
+                    output.close()
+                job.end_time = time.time()
+                self.jobs.remove(job)
+
+        if job.error is not None:
+            logging.getLogger("HWR").error(
+                "JobRunner: %s failed: %s" % (job.name, job.error)
+            )
+            job.result.set_exception(job.error)
+        else:
+            logging.getLogger("HWR").debug(
+                "JobRunner: %s exited with %d after %.1f s"
+                % (job.name, job.returncode, job.get_wall_time())
+            )
+            job.result.set(job.returncode)
+
+        self.emit("jobFinished", (job,))
+        if not job.is_successful():
+            self.emit("jobFailed", (job,))
+
+    def get_jobs(self):
+        """
+        :returns: Jobs waiting for a slot or running
+        :rtype: list
+        """
+        return list(self.jobs)
+
+    def get_running_jobs(self, lane=None):
+        """
+        :param lane: lane of the jobs, None for all lanes
+        :returns: Running jobs
+        :rtype: list
+        """
+        return [
+            job for job in self.jobs if job.is_running() and lane in (None, job.lane)
+        ]
+
+    def get_free_slots(self, lane=DEFAULT_LANE):
+        return self.get_lane_slots(lane) - len(self.get_running_jobs(lane))
+
+    def kill(self, job):
+        """Kills the command of the job if it is running"""
+        if job.process is not None and job.process.poll() is None:
+            job.process.kill()
+
+    def kill_all(self):
+        for job in self.get_jobs():
+            self.kill(job)
@@ -47,6 +47,8 @@ import math
 import logging
 from datetime import datetime
 
+import numpy
+
 from gui.utils import QtImport
 
 from HardwareRepository.HardwareObjects import queue_model_objects
@@ -750,6 +752,10 @@ class GraphicsItemGrid(GraphicsItem):
         self.__grid_range_pix = {"fast": 0, "slow": 0}
         self.__reversing_rotation = True
         self.__score = None
+        self.__score_image = None
+        self.__score_image_key = None
+        self.__col_row_table = None
+        self.__col_row_table_key = None
         self.__automatic = False
         self.__fill_alpha = 120
         self.__display_overlay = True
@@ -1192,11 +1198,121 @@ class GraphicsItemGrid(GraphicsItem):
 
     def set_score(self, score):
         """
-        Sets score
-        :param score: np two dimensional array
+        Sets score. The heat map image is computed again on the next paint
+        :param score: np array with one score per image
         :return:
         """
         self.__score = score
+        self.__score_image = None
+        self.__score_image_key = None
+
+    def get_score_image(self):
+        """
+        Returns the score as a heat map image with one pixel per cell,
+        from black (score 0) to yellow (best score), or None if there is
+        no positive score
+        :return: QImage
+        """
+        col_row_key = self.get_col_row_table_key()
+        if self.__score_image_key == col_row_key:
+            return self.__score_image
+
+        self.__score_image = None
+        self.__score_image_key = col_row_key
+
+        if self.__score is None or not self.__num_cols or not self.__num_rows:
+            return None
+        score = numpy.asarray(self.__score, dtype=float).ravel()
+        if not score.size or score.max() <= 0:
+            return None
+
+        cols, rows = self.get_col_row_table()
+        count = min(score.size, cols.size)
+        cols, rows, score = cols[:count], rows[:count], score[:count]
+        in_grid = (cols >= 0) & (cols < self.__num_cols)
+        in_grid &= (rows >= 0) & (rows < self.__num_rows)
+
+        cell_score = numpy.zeros((self.__num_rows, self.__num_cols))
+        cell_score[rows[in_grid], cols[in_grid]] = numpy.clip(
+            score[in_grid] / score.max(), 0, 1
+        )
+
+        # same colors as QColor.setHsv(60 * score, 255, 255 * score)
+        red = (255 * cell_score).astype(numpy.uint32)
+        green = (255 * cell_score * cell_score).astype(numpy.uint32)
+        argb = numpy.ascontiguousarray(
+            numpy.uint32(0xFF000000) | (red << 16) | (green << 8)
+        )
+        self.__score_image = QtImport.QImage(
+            argb.tobytes(),
+            self.__num_cols,
+            self.__num_rows,
+            self.__num_cols * 4,
+            QtImport.QImage.Format_ARGB32,
+        ).copy()
+        return self.__score_image
+
+    def get_col_row_table_key(self):
+        """
+        Returns the grid parameters the col, row table depends on
+        :return: tuple
+        """
+        return (
+            self.__num_cols,
+            self.__num_rows,
+            self.__num_lines,
+            self.__num_images_per_line,
+            self.__reversing_rotation,
+            tuple(self.grid_direction["fast"]),
+            tuple(self.grid_direction["slow"]),
+        )
+
+    def get_col_row_table(self):
+        """
+        Returns col and row of all images, by image index (serial image
+        number - first image number). Same as get_col_row_from_image_serial,
+        computed with numpy and kept until the grid geometry changes
+        :return: (np array, np array)
+        """
+        key = self.get_col_row_table_key()
+        if self.__col_row_table_key == key:
+            return self.__col_row_table
+
+        image_index = numpy.arange(self.__num_cols * self.__num_rows)
+        if image_index.size:
+            line = image_index // self.__num_images_per_line
+            image = image_index - line * self.__num_images_per_line
+        else:
+            line = image = image_index
+
+        fast_ref = numpy.full(image_index.shape, 0.5)
+        if self.__num_images_per_line > 1:
+            fast_ref = 0.5 - image / float(self.__num_images_per_line - 1)
+        if self.__reversing_rotation:
+            fast_ref = numpy.where(line % 2, -fast_ref, fast_ref)
+
+        slow_ref = numpy.full(image_index.shape, 0.5)
+        if self.__num_lines > 1:
+            slow_ref = 0.5 - line / float(self.__num_lines - 1)
+
+        col = (
+            self.__num_cols / 2.0
+            + (self.__num_images_per_line - 1)
+            * self.grid_direction["fast"][0]
+            * fast_ref
+            + (self.__num_lines - 1) * self.grid_direction["slow"][0] * slow_ref
+        )
+        row = (
+            self.__num_rows / 2.0
+            + (self.__num_images_per_line - 1)
+            * self.grid_direction["fast"][1]
+            * fast_ref
+            + (self.__num_lines - 1) * self.grid_direction["slow"][1] * slow_ref
+        )
+
+        self.__col_row_table = (col.astype(int), row.astype(int))
+        self.__col_row_table_key = key
+        return self.__col_row_table
 
     def get_snapshot(self):
         """
@@ -1271,8 +1387,20 @@ class GraphicsItemGrid(GraphicsItem):
             # In projection mode, just the frame is displayed
             painter.drawPolygon(self.__frame_polygon, QtImport.Qt.OddEvenFill)
         else:
-            # Draws beam shape and displays number of image if
-            # less than 1000 cells and size is greater than 20px
+            # If score exists, the heat map image is scaled to the grid
+            # and the cells are drawn without fill
+            if not self.__display_overlay:
+                painter.setBrush(QtImport.Qt.transparent)
+            elif self.__score is not None:
+                score_image = self.get_score_image()
+                if score_image is not None:
+                    painter.setOpacity(self.__fill_alpha / 255.0)
+                    painter.drawImage(self.__frame_polygon.boundingRect(), score_image)
+                    painter.setOpacity(1.0)
+                painter.setBrush(QtImport.Qt.transparent)
+
+            # Draws beam shape and displays number of image only if
+            # cell size is greater than 20px
             if min(self.__spacing_pix) < 20:
                 painter.drawPolygon(self.__frame_polygon, QtImport.Qt.OddEvenFill)
             else:
@@ -1287,29 +1415,6 @@ class GraphicsItemGrid(GraphicsItem):
                         self.__spacing_pix[0],
                         self.__spacing_pix[1],
                     )
-
-                    # If score exists overlay color may change
-                    cell_score = None
-                    if self.__display_overlay:
-                        cell_score = 1.0
-                        if self.__score is not None:
-                            cell_score = self.__score[image_index]
-
-                            if self.__score.max() > 0:
-                                cell_score = float(cell_score) / self.__score.max()
-                                brush_color.setHsv(
-                                    0 + 60 * cell_score,
-                                    255,
-                                    255 * cell_score,
-                                    self.__fill_alpha,
-                                )
-                                self.custom_brush.setColor(brush_color)
-                                painter.setBrush(self.custom_brush)
-                            else:
-                                painter.setBrush(QtImport.Qt.transparent)
-                    else:
-                        painter.setBrush(QtImport.Qt.transparent)
-
                     painter.drawText(
                         paint_rect,
                         QtImport.Qt.AlignCenter,
@@ -543,47 +543,50 @@ class QtGraphicsManager(HardwareObject):
            If diffractometer not ready then hides all shapes.
         """
         if self.diffractometer_hwobj.is_ready() and not self.in_centring_state:
+            # all shapes are projected to the screen with one call
+            points = []
+            grids = []
+            positions_list = []
             for shape in self.get_shapes():
                 if isinstance(shape, GraphicsLib.GraphicsItemPoint):
-                    cpos = shape.get_centred_position()
-                    new_x, new_y = self.diffractometer_hwobj.motor_positions_to_screen(
-                        cpos.as_dict()
-                    )
-                    shape.set_start_position(new_x, new_y)
+                    points.append(shape)
+                    positions_list.append(shape.get_centred_position().as_dict())
                 elif isinstance(shape, GraphicsLib.GraphicsItemGrid):
                     grid_cpos = shape.get_centred_position()
                     if grid_cpos is not None:
-                        current_cpos = queue_model_objects.CentredPosition(
-                            self.diffractometer_hwobj.get_positions()
-                        )
+                        corners = shape.get_motor_pos_corner()
+                        grids.append((shape, grid_cpos, len(corners)))
+                        positions_list.append(grid_cpos.as_dict())
+                        positions_list.extend(corners)
 
-                        current_cpos.set_motor_pos_delta(0.1)
-                        grid_cpos.set_motor_pos_delta(0.1)
+            screen_coords = iter(self.motor_positions_to_screen(positions_list))
 
-                        if hasattr(grid_cpos, "zoom"):
-                            current_cpos.zoom = grid_cpos.zoom
+            for point in points:
+                new_x, new_y = next(screen_coords)
+                point.set_start_position(new_x, new_y)
 
-                        center_coord = self.diffractometer_hwobj.motor_positions_to_screen(
-                            grid_cpos.as_dict()
-                        )
-                        if center_coord:
-                            shape.set_center_coord(center_coord)
-
-                            corner_coord = []
-                            for motor_pos in shape.get_motor_pos_corner():
-                                corner_coord.append(
-                                    (
-                                        self.diffractometer_hwobj.motor_positions_to_screen(
-                                            motor_pos
-                                        )
-                                    )
-                                )
-                            shape.set_corner_coord(corner_coord)
-
-                            if current_cpos == grid_cpos:
-                                shape.set_projection_mode(False)
-                            else:
-                                shape.set_projection_mode(True)
+            current_positions = None
+            for shape, grid_cpos, corner_count in grids:
+                if current_positions is None:
+                    current_positions = self.diffractometer_hwobj.get_positions()
+                current_cpos = queue_model_objects.CentredPosition(current_positions)
+
+                current_cpos.set_motor_pos_delta(0.1)
+                grid_cpos.set_motor_pos_delta(0.1)
+
+                if hasattr(grid_cpos, "zoom"):
+                    current_cpos.zoom = grid_cpos.zoom
+
+                center_coord = next(screen_coords)
+                corner_coord = [next(screen_coords) for _ in range(corner_count)]
+                if center_coord:
+                    shape.set_center_coord(center_coord)
+                    shape.set_corner_coord(corner_coord)
+
+                    if current_cpos == grid_cpos:
+                        shape.set_projection_mode(False)
+                    else:
+                        shape.set_projection_mode(True)
 
             self.show_all_items()
             self.graphics_view.graphics_scene.update()
@@ -593,6 +596,26 @@ class QtGraphicsManager(HardwareObject):
             self.hide_all_items()
             self.emit("diffractometerReady", False)
 
+    def motor_positions_to_screen(self, positions_list):
+        """Projects motor positions to screen coordinates
+
+        :param positions_list: motor positions, by motor role
+        :type positions_list: list of dict
+        :returns: (x, y) screen coordinates
+        :rtype: list of tuple
+        """
+        if not positions_list:
+            return []
+        if hasattr(self.diffractometer_hwobj, "motor_positions_to_screen_batch"):
+            screen_coords = self.diffractometer_hwobj.motor_positions_to_screen_batch(
+                positions_list
+            )
+            return [None if coord is None else tuple(coord) for coord in screen_coords]
+        return [
+            self.diffractometer_hwobj.motor_positions_to_screen(motor_positions)
+            for motor_positions in positions_list
+        ]
+
     def diffractometer_phase_changed(self, phase):
         """Phase changed event.
            If PHASE_BEAM then displays a grid on the screen
@@ -27,12 +27,17 @@ handle several models by using register_model and select_model.
 """
 
 import os
+import ast
 import json
 import logging
 import jsonpickle
 
 from HardwareRepository.BaseHardwareObjects import HardwareObject
-from HardwareRepository.HardwareObjects import queue_entry, queue_model_objects
+from HardwareRepository.HardwareObjects import (
+    queue_entry,
+    queue_model_objects,
+    queue_model_serializer,
+)
 
 
 class Serializer(object):
@@ -41,6 +46,173 @@ class Serializer(object):
         return json.dumps(object, default=lambda o: o.__dict__.values()[0])
 
 
+class _ModelIndex(object):
+    """
+    Lookup tables of one model, kept up to date by QueueModel: the nodes
+    by node id and the path templates of the nodes by (directory, prefix,
+    run number). Path templates changed after they have been added are
+    re-indexed through path_template_changed. Nodes moved to another
+    parent or given another path template, reported by
+    path_template_replaced, are checked again before the next lookup.
+    """
+
+    def __init__(self, root=None):
+        self.root = root
+        self.nodes = {}
+        # key -> {id(path_template): (node, path_template)}
+        self.path_templates = {}
+        # (directory, prefix) -> {run_number: number of path templates}
+        self.run_numbers = {}
+        # id(path_template) -> key it is indexed with
+        self.keys = {}
+        # id(node) -> path template it is indexed with
+        self.node_path_templates = {}
+        # id(node) -> node to check again, all the nodes if None
+        self.replaced_nodes = {}
+        queue_model_objects.add_path_template_observer(self)
+
+    def __getstate__(self):
+        return dict(self.__dict__)
+
+    def __setstate__(self, d):
+        self.__dict__.update(d)
+        queue_model_objects.add_path_template_observer(self)
+
+    def add_node(self, node):
+        """
+        Adds <node> and all its descendants.
+        """
+        if node._node_id is not None:
+            self.nodes[node._node_id] = node
+
+        path_template = node.get_path_template()
+        if path_template is not None and id(path_template) not in self.keys:
+            self._add_path_template(node, path_template)
+            self.node_path_templates[id(node)] = path_template
+
+        for child in node.get_children():
+            self.add_node(child)
+
+    def remove_node(self, node):
+        """
+        Removes <node> and all its descendants.
+        """
+        if self.nodes.get(node._node_id) is node:
+            del self.nodes[node._node_id]
+
+        path_template = self.node_path_templates.pop(id(node), None)
+        if path_template is not None:
+            self._remove_path_template(path_template)
+
+        for child in node.get_children():
+            self.remove_node(child)
+
+    def path_template_changed(self, path_template):
+        key = self.keys.get(id(path_template))
+
+        if key is not None and key != path_template.get_key():
+            node, path_template = self._remove_path_template(path_template)
+            self._add_path_template(node, path_template)
+
+    def path_template_replaced(self, node):
+        if node is None:
+            self.replaced_nodes = None
+        elif self.replaced_nodes is not None:
+            self.replaced_nodes[id(node)] = node
+
+    def update(self):
+        """
+        Checks again the nodes reported by path_template_replaced: nodes
+        that are no longer under the root are removed, and the current
+        path template of the others is indexed.
+        """
+        if self.replaced_nodes == {}:
+            return
+        if self.replaced_nodes is None:
+            replaced_nodes = list(self.nodes.values())
+        else:
+            replaced_nodes = list(self.replaced_nodes.values())
+        self.replaced_nodes = {}
+
+        for node in replaced_nodes:
+            if self.nodes.get(node._node_id) is not node:
+                continue
+            if not self.is_under_root(node):
+                self.remove_node(node)
+                continue
+
+            path_template = node.get_path_template()
+            indexed_path_template = self.node_path_templates.get(id(node))
+            if path_template is not indexed_path_template:
+                if indexed_path_template is not None:
+                    self._remove_path_template(indexed_path_template)
+                    del self.node_path_templates[id(node)]
+                if path_template is not None and id(path_template) not in self.keys:
+                    self._add_path_template(node, path_template)
+                    self.node_path_templates[id(node)] = path_template
+
+    def is_under_root(self, node):
+        if self.root is None:
+            return True
+        while node._parent is not None:
+            node = node._parent
+        return node is self.root
+
+    def get_node(self, node_id):
+        self.update()
+        return self.nodes.get(node_id)
+
+    def get_path_templates(self, path_template):
+        """
+        :returns: The (node, path template) pairs with the same key as
+                  <path_template>.
+        :rtype: list
+        """
+        self.update()
+        return list(self.path_templates.get(path_template.get_key(), {}).values())
+
+    def get_run_numbers(self, path_template):
+        """
+        :returns: Number of path templates per run number, for the path
+                  templates equal to <path_template>.
+        :rtype: dict
+        """
+        self.update()
+        return self.run_numbers.get(path_template.get_key()[:2], {})
+
+    def is_indexed(self, path_template):
+        self.update()
+        return id(path_template) in self.keys
+
+    def _add_path_template(self, node, path_template):
+        key = path_template.get_key()
+        self.keys[id(path_template)] = key
+        self.path_templates.setdefault(key, {})[id(path_template)] = (
+            node,
+            path_template,
+        )
+
+        run_numbers = self.run_numbers.setdefault(key[:2], {})
+        run_numbers[key[2]] = run_numbers.get(key[2], 0) + 1
+
+    def _remove_path_template(self, path_template):
+        key = self.keys.pop(id(path_template))
+
+        entries = self.path_templates[key]
+        entry = entries.pop(id(path_template))
+        if not entries:
+            del self.path_templates[key]
+
+        run_numbers = self.run_numbers[key[:2]]
+        run_numbers[key[2]] -= 1
+        if not run_numbers[key[2]]:
+            del run_numbers[key[2]]
+            if not run_numbers:
+                del self.run_numbers[key[:2]]
+
+        return entry
+
+
 class QueueModel(HardwareObject):
     def __init__(self, name):
         HardwareObject.__init__(self, name)
@@ -57,8 +229,12 @@ class QueueModel(HardwareObject):
             "free-pin": self._free_pin_model,
             "plate": self._plate_model,
         }
+        self._indexes = dict(
+            (name, _ModelIndex(root)) for name, root in self._models.items()
+        )
 
         self._selected_model = self._ispyb_model
+        self._selected_index = self._indexes["ispyb"]
 
     def __getstate__(self):
         d = dict(self.__dict__)
@@ -91,6 +267,7 @@ class QueueModel(HardwareObject):
         :rtype: NoneType
         """
         self._selected_model = self._models[name]
+        self._selected_index = self._indexes[name]
         self.queue_hwobj.clear()
         self._re_emit(self._selected_model)
 
@@ -112,6 +289,7 @@ class QueueModel(HardwareObject):
         :rtype: NoneType
         """
         self._models[name] = queue_model_objects.RootNode()
+        self._indexes[name] = _ModelIndex(self._models[name])
         self.queue_hwobj.clear()
 
     def register_model(self, name, root_node):
@@ -130,7 +308,9 @@ class QueueModel(HardwareObject):
         if name in self._models:
             raise KeyError("The key %s is already registered" % name)
         else:
-            self._models[name]
+            self._models[name] = root_node
+            self._indexes[name] = _ModelIndex(root_node)
+            self._indexes[name].add_node(root_node)
 
     def _re_emit(self, parent_node):
         """
@@ -160,6 +340,7 @@ class QueueModel(HardwareObject):
             child._node_id = self._selected_model._total_node_count
             parent._children.append(child)
             child._set_name(child._name)
+            self._selected_index.add_node(child)
             self.emit("child_added", (parent, child))
         else:
             raise TypeError("Expected type TaskNode, got %s " % str(type(child)))
@@ -195,7 +376,7 @@ class QueueModel(HardwareObject):
         :rtype: TaskNode
         """
         if parent is None:
-            parent = self._selected_model
+            return self._selected_index.get_node(_id)
 
         for node in parent._children:
             if node._node_id == _id:
@@ -218,6 +399,7 @@ class QueueModel(HardwareObject):
         """
         if child in parent._children:
             parent._children.remove(child)
+            self._selected_index.remove_node(child)
             self.emit("child_removed", (parent, child))
 
     def _detach_child(self, parent, child):
@@ -230,12 +412,14 @@ class QueueModel(HardwareObject):
         :returns: None
         :rtype: None
         """
-        child = parent._children.pop(child)
+        parent._children.remove(child)
         return child
 
     def set_parent(self, parent, child):
         """
-        Sets the parent of the child <child> to <parent>
+        Sets the parent of the child <child> to <parent>. A child that
+        already has a parent is moved to the children of <parent>, and
+        indexed in the model of its new parent.
 
         :param parent: The parent.
         :type parent: TaskNode Object
@@ -244,8 +428,15 @@ class QueueModel(HardwareObject):
         :type child: TaskNode Object
         """
         if child._parent:
-            self._detach_child(parent, child)
-            child.set_parent(parent)
+            if child in child._parent._children:
+                self._detach_child(child._parent, child)
+            child._parent = parent
+            parent._children.append(child)
+
+            # the index of the previous model removes it at its next lookup
+            for index in self._indexes.values():
+                if index.is_under_root(parent):
+                    index.add_node(child)
         else:
             child._parent = parent
 
@@ -298,19 +489,18 @@ class QueueModel(HardwareObject):
         :returns: The next available run number for the given path_template.
         :rtype: int
         """
-        all_path_templates = self.get_path_templates()
-        conflicting_path_templates = [0]
+        run_numbers = self._selected_index.get_run_numbers(new_path_template)
+        excluded_run_number = None
 
-        for pt in all_path_templates:
-            if exclude_current:
-                if pt[1] is not new_path_template:
-                    if pt[1] == new_path_template:
-                        conflicting_path_templates.append(pt[1].run_number)
-            else:
-                if pt[1] == new_path_template:
-                    conflicting_path_templates.append(pt[1].run_number)
+        if exclude_current and self._selected_index.is_indexed(new_path_template):
+            excluded_run_number = new_path_template.run_number
+
+        conflicting_run_numbers = [0]
+        for run_number, count in run_numbers.items():
+            if run_number != excluded_run_number or count > 1:
+                conflicting_run_numbers.append(run_number)
 
-        return max(conflicting_path_templates) + 1
+        return max(conflicting_run_numbers) + 1
 
     def get_path_templates(self):
         """
@@ -344,15 +534,18 @@ class QueueModel(HardwareObject):
 
         :returns: True if there is a potential path collision.
         """
-        result = False
-        path_template_list = self.get_path_templates()
+        # Only path templates with the same directory, prefix and
+        # run number can intersect
+        path_template_list = self._selected_index.get_path_templates(
+            new_path_template
+        )
 
         for pt in path_template_list:
             if pt[1] is not new_path_template:
                 if new_path_template.intersection(pt[1]):
-                    result = True
+                    return True
 
-        return result
+        return False
 
     def copy_node(self, node):
         """
@@ -415,69 +608,47 @@ class QueueModel(HardwareObject):
 
         return result
 
-    def save_queue(self, filename=None):
-        """Saves queue in the file. Current selected model is saved as a list
-           of dictionaries. Information about samples and baskets is not saved
+    def get_selected_model_name(self):
+        """
+        :returns: The name of the selected model.
+        :rtype: str
         """
-        if not filename:
-            filename = os.path.join(self.user_file_directory, "queue_active.dat")
-
-        items_to_save = []
-
-        selected_model = ""
         for key in self._models:
             if self._selected_model == self._models[key]:
-                selected_model = key
-
-        queue_entry_list = self.queue_hwobj.get_queue_entry_list()
-        for item in queue_entry_list:
-            # On the top level is Sample or Basket
-            if isinstance(item, queue_entry.SampleQueueEntry):
-                for task_item in item.get_queue_entry_list():
-                    task_item_dict = {
-                        "sample_location": item.get_data_model().location,
-                        "task_group_entry": jsonpickle.encode(
-                            task_item.get_data_model()
-                        ),
-                    }
-                    items_to_save.append(task_item_dict)
-
-        save_file = None
-        try:
-            save_file = open(filename, "w")
-            save_file.write(repr((selected_model, items_to_save)))
-        except BaseException:
-            logging.getLogger().exception(
-                "Unable to save queue " + "in file %s", filename
-            )
-            if save_file:
-                save_file.close()
+                return key
+        return ""
 
-    def get_queue_as_json_list(self):
-        items_to_save = []
+    def get_task_groups(self):
+        """
+        Retrieves the task groups of the queue, the content that is saved.
+        Information about samples and baskets is not saved.
 
-        selected_model = ""
-        for key in self._models:
-            if self._selected_model == self._models[key]:
-                selected_model = key
+        :returns: The name of the selected model and a list of
+                  (sample location, TaskGroup) pairs.
+        :rtype: tuple
+        """
+        task_groups = []
 
         queue_entry_list = self.queue_hwobj.get_queue_entry_list()
         for item in queue_entry_list:
             # On the top level is Sample or Basket
             if isinstance(item, queue_entry.SampleQueueEntry):
                 for task_item in item.get_queue_entry_list():
-                    task_item_dict = {
-                        "sample_location": item.get_data_model().location,
-                        # "task_group_entry": Serializer.serialize(task_item.get_data_model())}
-                        # "task_group_entry" : jsonpickle.encode(task_item.get_data_model())}
-                        "task_group_entry": json.dumps(task_item.get_data_model()),
-                    }
-                    items_to_save.append(task_item_dict)
+                    task_groups.append(
+                        (item.get_data_model().location, task_item.get_data_model())
+                    )
 
-        return selected_model, items_to_save
+        return self.get_selected_model_name(), task_groups
 
-    def load_queue_from_json_list(self, queue_list, snapshot):
-        # Prepare list of samplesL
+    def add_task_groups(self, task_groups, snapshot=None):
+        """
+        Adds task groups to the samples of the selected model, by sample
+        location. The snapshots are not saved with the queue, so
+        <snapshot> is set to all the tasks.
+
+        :param task_groups: (sample location, TaskGroup) pairs.
+        :type task_groups: list
+        """
         sample_dict = {}
         for item in self.queue_hwobj.get_queue_entry_list():
             if isinstance(item, queue_entry.SampleQueueEntry):
@@ -487,16 +658,55 @@ class QueueModel(HardwareObject):
                 for sample_item in item.get_queue_entry_list():
                     sample_data_model = sample_item.get_data_model()
                     sample_dict[sample_data_model.location] = sample_data_model
+
+        for sample_location, task_group_entry in task_groups:
+            self.add_child(sample_dict[tuple(sample_location)], task_group_entry)
+            for child in task_group_entry.get_children():
+                child.set_snapshot(snapshot)
+
+    def save_queue(self, filename=None):
+        """Saves queue in the file, see queue_model_serializer. Current
+           selected model is saved with its task groups. Information about
+           samples and baskets is not saved
+        """
+        if not filename:
+            filename = os.path.join(self.user_file_directory, "queue_active.dat")
+
+        try:
+            data = queue_model_serializer.dumps(*self.get_task_groups())
+            with open(filename, "w") as save_file:
+                save_file.write(data)
+        except BaseException:
+            logging.getLogger().exception(
+                "Unable to save queue " + "in file %s", filename
+            )
+
+    def get_queue_as_json_list(self):
+        selected_model, task_groups = self.get_task_groups()
+
+        items_to_save = []
+        for sample_location, task_group_entry in task_groups:
+            task_item_dict = {
+                "sample_location": sample_location,
+                "task_group_entry": queue_model_serializer.dumps(
+                    selected_model, [(sample_location, task_group_entry)]
+                ),
+            }
+            items_to_save.append(task_item_dict)
+
+        return selected_model, items_to_save
+
+    def load_queue_from_json_list(self, queue_list, snapshot):
         if len(queue_list) > 0:
             try:
+                task_groups = []
                 for task_group_item in queue_list:
-                    task_group_entry = json.load(task_group_item["task_group_entry"])
-                    self.add_child(
-                        sample_dict[task_group_item["sample_location"]],
-                        task_group_entry,
+                    task_groups.extend(
+                        queue_model_serializer.loads(
+                            task_group_item["task_group_entry"]
+                        )[1]
                     )
-                    for child in task_group_entry.get_children():
-                        child.set_snapshot(snapshot)
+                self.add_task_groups(task_groups, snapshot)
                 logging.getLogger("HWR").info("Queue loading done")
             except BaseException:
                 logging.getLogger("HWR").exception("Unable to load queue")
@@ -510,42 +720,49 @@ class QueueModel(HardwareObject):
         """
 
         logging.getLogger("HWR").info("Loading queue from file %s" % filename)
-        load_file = None
         try:
-            # Read file and clear the model
-            load_file = open(filename, "r")
-            decoded_file = eval(load_file.read())
-            self.select_model(decoded_file[0])
-
-            # Prepare list of samples
-            sample_dict = {}
-            for item in self.queue_hwobj.get_queue_entry_list():
-                if isinstance(item, queue_entry.SampleQueueEntry):
-                    sample_data_model = item.get_data_model()
-                    sample_dict[sample_data_model.location] = sample_data_model
-                elif isinstance(item, queue_entry.BasketQueueEntry):
-                    for sample_item in item.get_queue_entry_list():
-                        sample_data_model = sample_item.get_data_model()
-                        sample_dict[sample_data_model.location] = sample_data_model
-
-            if len(decoded_file[1]) > 0:
-                for task_group_item in decoded_file[1]:
-                    task_group_entry = jsonpickle.decode(
-                        task_group_item["task_group_entry"]
-                    )
-                    self.add_child(
-                        sample_dict[task_group_item["sample_location"]],
-                        task_group_entry,
-                    )
-                    for child in task_group_entry.get_children():
-                        child.set_snapshot(snapshot)
+            with open(filename, "r") as load_file:
+                data = load_file.read()
+
+            if data.lstrip().startswith("{"):
+                model_name, task_groups = queue_model_serializer.loads(data)
+            else:
+                model_name, task_groups = self._decode_legacy_queue(data)
+
+            self.select_model(model_name)
+
+            if len(task_groups) > 0:
+                self.add_task_groups(task_groups, snapshot)
                 logging.getLogger("HWR").info("Queue loading done")
             else:
                 logging.getLogger("HWR").info("No queue content available in file")
-            return decoded_file[0]
+            return model_name
         except BaseException:
             logging.getLogger("HWR").exception(
                 "Unable to load queue " + "from file %s", filename
             )
-            if load_file:
-                load_file.close()
+
+    def _decode_legacy_queue(self, data):
+        """
+        Decodes a queue saved by previous versions, as the repr of
+        the model name and a list of jsonpickled task groups.
+        """
+        model_name, queue_list = ast.literal_eval(data)
+        return model_name, self.decode_legacy_task_groups(queue_list)
+
+    def decode_legacy_task_groups(self, queue_list):
+        """
+        Decodes the task groups saved by previous versions, as a list of
+        dictionaries with the sample location and the jsonpickled task
+        group, also used by RedisClient.
+
+        :returns: The (sample location, TaskGroup) pairs.
+        :rtype: list
+        """
+        return [
+            (
+                task_group_item["sample_location"],
+                jsonpickle.decode(task_group_item["task_group_entry"]),
+            )
+            for task_group_item in queue_list
+        ]
@@ -24,20 +24,30 @@ Install redis: sudo pip install redis
 Start server on local pc: redis-server &
 It is recommended to start redis with mxcube
 
+The writes of one save are sent in a single transaction and only the
+values that changed since the last save are written. With the
+autosave_interval property (in seconds), the queue and the graphics are
+saved periodically in the background.
+
 example xml:
 
 <object class="RedisClient">
    <object href="/beamline-setup" role="beamline_setup"/>
    <object href="/queue-model" role="queue_model"/>
+   <autosave_interval>60</autosave_interval>
 </object>
 """
 
+import ast
+import hashlib
 import redis
 import gevent
+import gevent.lock
 import logging
 import jsonpickle
 
 from HardwareRepository.BaseHardwareObjects import HardwareObject
+from HardwareRepository.HardwareObjects import queue_model_serializer
 
 
 __version__ = "2.3."
@@ -54,9 +64,15 @@ class RedisClient(HardwareObject):
         self.proposal_id = None
         self.beamline_name = None
         self.redis_client = None
+        self.autosave_interval = None
+        self.autosave_task = None
+        self.save_lock = gevent.lock.Semaphore()
+        # digests of the values written by the last saves, by key
+        self.saved_digests = {}
 
         self.bl_setup_hwobj = None
         self.queue_model_hwobj = None
+        self.queue_serializer = queue_model_serializer.QueueSerializer()
 
     def init(self):
         self.host = self.getProperty("host")
@@ -102,23 +118,107 @@ class RedisClient(HardwareObject):
         if self.active:
             self.init_beamline_setup()
 
+        self.autosave_interval = self.getProperty("autosave_interval")
+        if self.active and self.autosave_interval:
+            self.autosave_task = gevent.spawn(self.autosave)
+
+    def get_db_key(self, name):
+        return "mxcube:%s:%s:%s" % (self.proposal_id, self.beamline_name, name)
+
+    def autosave(self):
+        """Saves the queue and the graphics every autosave_interval seconds"""
+        while True:
+            gevent.sleep(float(self.autosave_interval))
+            if self.active:
+                self.save_task(queue=True, graphics=True)
+
+    def save_task(self, queue=False, graphics=False, values=None):
+        """Writes in one transaction the queue, the graphics and the
+           values that changed since the last save
+
+        :param queue: save the queue
+        :param graphics: save the graphics objects
+        :param values: values to save, by key name
+        :type values: dict
+        :returns: number of commands sent
+        """
+        with self.save_lock:
+            pipeline = self.redis_client.pipeline(transaction=True)
+            digests = {}
+            try:
+                if queue:
+                    self.add_queue_commands(pipeline, digests)
+                if graphics:
+                    self.add_graphics_commands(pipeline, digests)
+                for name, value in (values or {}).items():
+                    self.add_set_command(pipeline, digests, name, value)
+
+                commands_num = len(pipeline)
+                if commands_num:
+                    pipeline.execute()
+            except BaseException:
+                # the database may not hold the last saves: write all next time
+                self.queue_serializer.reset()
+                self.saved_digests = {}
+                logging.getLogger("HWR").exception("RedisClient: Unable to save")
+                return 0
+            finally:
+                pipeline.reset()
+
+            self.saved_digests.update(digests)
+            return commands_num
+
+    def add_set_command(self, pipeline, digests, name, value):
+        """Adds to the pipeline the set command of the value, if it is not
+           the value written by the last save
+        """
+        key = self.get_db_key(name)
+        digest = self.get_digest(value)
+        if self.saved_digests.get(key) == digest:
+            return False
+        pipeline.set(key, value)
+        digests[key] = digest
+        return True
+
+    @staticmethod
+    def get_digest(value):
+        if not isinstance(value, bytes):
+            value = str(value).encode("utf-8")
+        return hashlib.md5(value).hexdigest()
+
     def save_queue(self):
         """Saves queue in RedisDB"""
         if self.active:
-            gevent.spawn(self.save_queue_task)
+            gevent.spawn(self.save_task, queue=True)
 
     def save_queue_task(self):
-        """Queue saving tasks"""
-        selected_model, queue_list = self.queue_model_hwobj.get_queue_as_json_list()
-        self.redis_client.set(
-            "mxcube:%s:%s:queue_model" % (self.proposal_id, self.beamline_name),
-            selected_model,
-        )
-        self.redis_client.set(
-            "mxcube:%s:%s:queue_current" % (self.proposal_id, self.beamline_name),
-            queue_list,
+        """Queue saving task"""
+        self.save_task(queue=True)
+
+    def add_queue_commands(self, pipeline, digests):
+        """Only the nodes that changed since the last save are written,
+           in the hash queue_nodes
+        """
+        selected_model, task_groups = self.queue_model_hwobj.get_task_groups()
+        header, changed_records, removed_keys = self.queue_serializer.serialize(
+            selected_model, task_groups
         )
-        logging.getLogger("HWR").debug("RedisClient: Current queue saved")
+        nodes_key = self.get_db_key("queue_nodes")
+
+        if changed_records:
+            pipeline.hset(nodes_key, mapping=changed_records)
+        if removed_keys:
+            pipeline.hdel(nodes_key, *removed_keys)
+        self.add_set_command(pipeline, digests, "queue_model", selected_model)
+        if (
+            self.add_set_command(pipeline, digests, "queue_current", header)
+            or changed_records
+            or removed_keys
+        ):
+            logging.getLogger("HWR").debug(
+                "RedisClient: Current queue saved (%d nodes changed)"
+                % len(changed_records)
+            )
 
     def load_queue(self):
         """Loads queue from redis DB"""
@@ -126,46 +226,83 @@ class RedisClient(HardwareObject):
             self.active = False
             selected_model = None
 
-            selected_model = self.redis_client.get(
-                "mxcube:%s:%s:queue_model" % (self.proposal_id, self.beamline_name)
-            )
-            serialized_queue = self.redis_client.get(
-                "mxcube:%s:%s:queue_current" % (self.proposal_id, self.beamline_name)
-            )
-            if selected_model is not None:
-                self.queue_model_hwobj.select_model(selected_model)
-                self.queue_model_hwobj.load_queue_from_json_list(
-                    eval(serialized_queue),
-                    snapshot=self.bl_setup_hwobj.shape_history_hwobj.get_scene_snapshot(),
-                )
+            header = self.redis_client.get(self.get_db_key("queue_current"))
+            if header is not None:
+                try:
+                    if header.lstrip().startswith(b"{"):
+                        selected_model, task_groups = self.get_saved_queue(header)
+                    else:
+                        selected_model, task_groups = self.get_legacy_queue(header)
+                    self.queue_model_hwobj.select_model(selected_model)
+                    shape_history_hwobj = self.bl_setup_hwobj.shape_history_hwobj
+                    self.queue_model_hwobj.add_task_groups(
+                        task_groups, snapshot=shape_history_hwobj.get_scene_snapshot()
+                    )
+                except BaseException:
+                    logging.getLogger("HWR").exception(
+                        "RedisClient: Unable to load queue"
+                    )
 
             self.active = True
             logging.getLogger("HWR").debug("RedisClient: Queue loaded")
             return selected_model
 
+    def get_saved_queue(self, header):
+        """
+        :returns: The model name and the task groups of the queue saved
+                  by add_queue_commands, that becomes the last save.
+        :rtype: tuple(str, list)
+        """
+        records = self.redis_client.hgetall(self.get_db_key("queue_nodes"))
+        selected_model, task_groups = self.queue_serializer.deserialize(
+            header, records
+        )
+        self.saved_digests[self.get_db_key("queue_current")] = self.get_digest(
+            header
+        )
+        return selected_model, task_groups
+
+    def get_legacy_queue(self, queue_list):
+        """
+        :returns: The model name and the task groups of a queue saved by
+                  previous versions, as the repr of a list of jsonpickled
+                  task groups. The next save writes it in the new format.
+        :rtype: tuple(str, list)
+        """
+        selected_model = self.redis_client.get(self.get_db_key("queue_model"))
+        if isinstance(selected_model, bytes):
+            selected_model = selected_model.decode("utf-8")
+        task_groups = self.queue_model_hwobj.decode_legacy_task_groups(
+            ast.literal_eval(queue_list.decode("utf-8"))
+        )
+        self.queue_serializer.reset()
+        return selected_model, task_groups
+
     def save_graphics(self):
         """Saves graphics objects in RedisDB"""
         if self.active:
+            self.save_task(graphics=True)
+
+    def add_graphics_commands(self, pipeline, digests):
+        graphic_objects = self.bl_setup_hwobj.shape_history_hwobj.dump_shapes()
+        if self.add_set_command(
+            pipeline, digests, "graphics", jsonpickle.encode(graphic_objects)
+        ):
             logging.getLogger("HWR").debug(
-                "RedisClient: Graphics saved at "
-                + "mxcube:%s:%s:graphics" % (self.proposal_id, self.beamline_name)
-            )
-            graphic_objects = self.bl_setup_hwobj.shape_history_hwobj.dump_shapes()
-            self.redis_client.set(
-                "mxcube:%s:%s:graphics" % (self.proposal_id, self.beamline_name),
-                jsonpickle.encode(graphic_objects),
+                "RedisClient: Graphics saved at " + self.get_db_key("graphics")
             )
 
     def load_graphics(self):
         """Loads graphics from RedisDB"""
         if self.active:
             try:
-                graphics_objects = self.redis_client.get(
-                    "mxcube:%s:%s:graphics" % (self.proposal_id, self.beamline_name)
-                )
+                graphics_objects = self.redis_client.get(self.get_db_key("graphics"))
                 self.bl_setup_hwobj.shape_history_hwobj.load_shapes(
                     jsonpickle.decode(graphics_objects)
                 )
+                self.saved_digests[self.get_db_key("graphics")] = self.get_digest(
+                    graphics_objects
+                )
                 logging.getLogger("HWR").debug("RedisClient: Graphics loaded")
             except BaseException:
                 pass
@@ -175,7 +312,7 @@ class RedisClient(HardwareObject):
         if self.active:
             self.redis_client.lpush(
                 "mxcube:%s:%s:queue_history" % (self.proposal_id, self.beamline_name),
-                str(item),
+                queue_model_serializer.dumps_value(item),
             )
             logging.getLogger("HWR").debug("RedisClient: History queue saved")
 
@@ -191,7 +328,13 @@ class RedisClient(HardwareObject):
                     -1,
                 )
                 for item in items:
-                    result.append(eval(item))
+                    try:
+                        result.append(queue_model_serializer.loads_value(item))
+                    except ValueError:
+                        # saved by previous versions with str(item)
+                        if isinstance(item, bytes):
+                            item = item.decode("utf-8")
+                        result.append(ast.literal_eval(item))
             except BaseException:
                 pass
         return result
@@ -199,7 +342,11 @@ class RedisClient(HardwareObject):
     def clear_db(self):
         """Cleans redisDB"""
         if self.active:
-            self.redis_client.flushdb()
+            with self.save_lock:
+                self.redis_client.flushdb()
+                # nothing is saved any more: write all next time
+                self.queue_serializer.reset()
+                self.saved_digests = {}
 
     def flux_changed(self, value, beam_info, transmission):
         self.save_beamline_setup_item("flux", (value, beam_info, transmission))
@@ -220,8 +367,5 @@ class RedisClient(HardwareObject):
     def save_beamline_setup_item(self, key, value):
         if self.active:
             if key == "flux":
-                logging.getLogger("HWR").debug("RedisClient: Flux value saved")
-                self.redis_client.set(
-                    "mxcube:%s:%s:flux" % (self.proposal_id, self.beamline_name),
-                    value[0],
-                )
+                if self.save_task(values={"flux": value[0]}):
+                    logging.getLogger("HWR").debug("RedisClient: Flux value saved")
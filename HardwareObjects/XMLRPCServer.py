@@ -3,6 +3,11 @@ XMLRPC-Server that makes it possbile to access core features of MXCuBE like
 the queue from external applications. The Server is implemented as a
 hardware object and is configured with an XML-file. See the example
 configuration XML for more information.
+
+Each client connection is served in its own greenlet, so that a slow method
+does not block the other clients, and connections are kept alive between
+requests. Clients sending many calls, like the Dozor results of EDNA, can
+also batch them with system.multicall.
 """
 
 import logging
@@ -11,6 +16,8 @@ import inspect
 import pkgutil
 import types
 import gevent
+import gevent.pool
+import gevent.socket
 import socket
 import time
 import json
@@ -38,6 +45,76 @@ __email__ = "marcus.oscarsson@esrf.fr"
 __status__ = "Draft"
 
 
+# greenlets serving client connections at the same time
+DEFAULT_MAX_CONNECTIONS = 64
+# idle time in seconds after which a kept alive connection is closed
+KEEP_ALIVE_TIMEOUT = 60
+
+
+class GeventXMLRPCServer(SimpleXMLRPCServer):
+    """
+    XML-RPC server serving each connection in a greenlet of a pool.
+
+    The sockets are gevent sockets, so that waiting for a request or for a
+    client only blocks its greenlet, and a method waiting for the hardware
+    (with gevent) lets the other requests go on.
+    """
+
+    def __init__(self, addr, max_connections=DEFAULT_MAX_CONNECTIONS, **kwargs):
+        SimpleXMLRPCServer.__init__(self, addr, bind_and_activate=False, **kwargs)
+        self.socket.close()
+        self.socket = gevent.socket.socket(self.address_family, self.socket_type)
+        try:
+            self.server_bind()
+            self.server_activate()
+        except BaseException:
+            self.server_close()
+            raise
+        self.connection_pool = gevent.pool.Pool(max_connections)
+
+    def serve_forever(self, poll_interval=None):
+        while True:
+            # waits for a free greenlet before accepting the next connection
+            self.connection_pool.wait_available()
+            try:
+                request, client_address = self.get_request()
+            except socket.error:
+                if self.socket.fileno() < 0:
+                    break
+                continue
+            self.connection_pool.spawn(self.process_connection, request, client_address)
+
+    def process_connection(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def handle_error(self, request, client_address):
+        logging.getLogger("HWR").exception(
+            "XML-RPC server: error serving %s:%s" % client_address[:2]
+        )
+
+    def server_close(self):
+        SimpleXMLRPCServer.server_close(self)
+        if hasattr(self, "connection_pool"):
+            self.connection_pool.kill(block=False)
+
+
+class KeepAliveXMLRPCRequestHandler(SimpleXMLRPCRequestHandler):
+    """
+    Request handler keeping HTTP/1.1 connections open between requests,
+    until the client closes them or they stay idle for KEEP_ALIVE_TIMEOUT.
+    """
+
+    protocol_version = "HTTP/1.1"
+    timeout = KEEP_ALIVE_TIMEOUT
+    # the headers and the body are sent separately
+    disable_nagle_algorithm = True
+
+
 class SecureXMLRpcRequestHandler(SimpleXMLRPCRequestHandler):
     """
     Secure XML-RPC request handler class.
@@ -141,6 +218,9 @@ class XMLRPCServer(HardwareObject):
         self.queue_model_hwobj = None
         self.queue_hwobj = None
         self.beamline_setup_hwobj = None
+        self.shape_history_hwobj = None
+        self.diffractometer_hwobj = None
+        self.max_connections = DEFAULT_MAX_CONNECTIONS
         self.wokflow_in_progress = True
         self.xmlrpc_prefixes = set()
         self.current_entry_task = None
@@ -164,6 +244,9 @@ class XMLRPCServer(HardwareObject):
 
         self.host = host
         self.port = self.getProperty("port")
+        self.max_connections = int(
+            self.getProperty("max_connections", DEFAULT_MAX_CONNECTIONS)
+        )
 
         self.doEnforceUseOfToken = self.getProperty("enforceUseOfToken", False)
 
@@ -189,21 +272,22 @@ class XMLRPCServer(HardwareObject):
         self.xmlrpc_prefixes = set()
 
         if self.doEnforceUseOfToken:
-            self._server = SimpleXMLRPCServer(
-                (self.host, int(self.port)),
-                requestHandler=SecureXMLRpcRequestHandler,
-                logRequests=False,
-                allow_none=True,
-            )
+            request_handler = SecureXMLRpcRequestHandler
         else:
-            self._server = SimpleXMLRPCServer(
-                (self.host, int(self.port)), logRequests=False, allow_none=True
-            )
+            request_handler = KeepAliveXMLRPCRequestHandler
+        self._server = GeventXMLRPCServer(
+            (self.host, int(self.port)),
+            max_connections=self.max_connections,
+            requestHandler=request_handler,
+            logRequests=False,
+            allow_none=True,
+        )
 
         msg = "XML-RPC server listening on: %s:%s" % (self.host, self.port)
         logging.getLogger("HWR").info(msg)
 
         self._server.register_introspection_functions()
+        self._server.register_multicall_functions()
         self._server.register_function(self.start_queue)
         self._server.register_function(self.log_message)
         self._server.register_function(self.is_queue_executing)
@@ -254,13 +338,18 @@ class XMLRPCServer(HardwareObject):
         self.queue_hwobj = self.getObjectByRole("queue")
         self.queue_model_hwobj = self.getObjectByRole("queue_model")
         self.beamline_setup_hwobj = self.getObjectByRole("beamline_setup")
-        self.shape_history_hwobj = self.beamline_setup_hwobj.shape_history_hwobj
-        self.diffractometer_hwobj = self.beamline_setup_hwobj.diffractometer_hwobj
-
-        self.xmlrpc_server_task = gevent.spawn(self._server.serve_forever)
+        # roles of the beamline setup that failed to load are missing
+        self.shape_history_hwobj = getattr(
+            self.beamline_setup_hwobj, "shape_history_hwobj", None
+        )
+        self.diffractometer_hwobj = getattr(
+            self.beamline_setup_hwobj, "diffractometer_hwobj", None
+        )
         self.workflow_hwobj = self.getObjectByRole("workflow")
         self.beamcmds_hwobj = self.getObjectByRole("beamcmds")
 
+        self.xmlrpc_server_task = gevent.spawn(self._server.serve_forever)
+
     def anneal(self, time):
         cryoshutter_hwobj = self.getObjectByRole("cryoshutter")
         try:
@@ -696,7 +785,7 @@ class XMLRPCServer(HardwareObject):
 
                     # Bind method to this XMLRPCServer instance but don't set attribute
                     # This is sufficient to register it as an xmlrpc function.
-                    bound_method = types.MethodType(f[1], self, self.__class__)
+                    bound_method = types.MethodType(f[1], self)
                     self._server.register_function(bound_method, xmlrpc_name)
 
             # TODO: Still need to test with deeply-nested modules, in particular that
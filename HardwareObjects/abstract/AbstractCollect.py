@@ -33,6 +33,10 @@ import gevent
 import gevent.event
 from HardwareRepository.TaskUtils import task
 from HardwareRepository.BaseHardwareObjects import HardwareObject
+from HardwareRepository.HardwareObjects.lims_image_writer import (
+    FLUSH_TIMEOUT,
+    LimsImageWriter,
+)
 
 
 __credits__ = ["MXCuBE collaboration"]
@@ -80,6 +84,9 @@ class AbstractCollect(HardwareObject, object):
         self.current_lims_sample = {}
         self.run_processing_after = None
         self.run_processing_parallel = None
+        self.prepare_durations = {}
+        self.lims_image_writer = None
+        self.lims_image_values = None
 
         self.autoprocessing_hwobj = None
         self.beam_info_hwobj = None
@@ -179,18 +186,12 @@ class AbstractCollect(HardwareObject, object):
         )
         self.emit("progressInit", ("Collection", 100, False))
         self.collection_id = None
+        self.lims_image_values = None
 
         try:
             # ----------------------------------------------------------------
             # Prepare data collection
 
-            self.open_detector_cover()
-            self.open_safety_shutter()
-            self.open_fast_shutter()
-
-            # ----------------------------------------------------------------
-            # Store information in LIMS
-
             self.current_dc_parameters["status"] = "Running"
             self.current_dc_parameters["collection_start_time"] = time.strftime(
                 "%Y-%m-%d %H:%M:%S"
@@ -200,77 +201,7 @@ class AbstractCollect(HardwareObject, object):
                 "Collection parameters: %s" % str(self.current_dc_parameters)
             )
 
-            log.info("Collection: Storing data collection in LIMS")
-            self.store_data_collection_in_lims()
-
-            log.info(
-                "Collection: Creating directories for raw images and processing files"
-            )
-            self.create_file_directories()
-
-            log.info("Collection: Getting sample info from parameters")
-            self.get_sample_info()
-
-            log.info("Collect: Storing sample info in LIMS")
-            self.store_sample_info_in_lims()
-
-            if all(
-                item is None for item in self.current_dc_parameters["motors"].values()
-            ):
-                # No centring point defined
-                # create point based on the current position
-                current_diffractometer_position = (
-                    self.diffractometer_hwobj.getPositions()
-                )
-                for motor in self.current_dc_parameters["motors"].keys():
-                    self.current_dc_parameters["motors"][
-                        motor
-                    ] = current_diffractometer_position.get(motor)
-
-            # ----------------------------------------------------------------
-            # Move to the centered position and take crystal snapshots
-
-            log.info("Collection: Moving to centred position")
-            self.move_to_centered_position()
-            self.take_crystal_snapshots()
-            self.move_to_centered_position()
-
-            # ----------------------------------------------------------------
-            # Set data collection parameters
-
-            if "transmission" in self.current_dc_parameters:
-                log.info(
-                    "Collection: Setting transmission to %.2f",
-                    self.current_dc_parameters["transmission"],
-                )
-                self.set_transmission(self.current_dc_parameters["transmission"])
-
-            if "wavelength" in self.current_dc_parameters:
-                log.info(
-                    "Collection: Setting wavelength to %.4f",
-                    self.current_dc_parameters["wavelength"],
-                )
-                self.set_wavelength(self.current_dc_parameters["wavelength"])
-
-            elif "energy" in self.current_dc_parameters:
-                log.info(
-                    "Collection: Setting energy to %.4f",
-                    self.current_dc_parameters["energy"],
-                )
-                self.set_energy(self.current_dc_parameters["energy"])
-
-            dd = self.current_dc_parameters.get("resolution")
-            if dd and dd.get('upper'):
-                resolution = dd["upper"]
-                log.info("Collection: Setting resolution to %.3f", resolution)
-                self.set_resolution(resolution)
-
-            elif "detector_distance" in self.current_dc_parameters:
-                log.info(
-                    "Collection: Moving detector to %.2f",
-                    self.current_dc_parameters["detector_distance"],
-                )
-                self.move_detector(self.current_dc_parameters["detector_distance"])
+            self.prepare_collection()
 
             # ----------------------------------------------------------------
             # Site specific implementation of a data collection
@@ -303,6 +234,173 @@ class AbstractCollect(HardwareObject, object):
         finally:
             self.data_collection_cleanup()
 
+    def get_sequential_prepare_steps(self):
+        """
+        Returns the steps preparing a data collection that run one after
+        the other, before the steps of get_prepare_steps, as a list of
+        (name, function) pairs. The snapshots need the shutters open and
+        the sample centred.
+        """
+        return [
+            ("shutters", self.prepare_shutters),
+            ("centring", self.prepare_centred_position),
+        ]
+
+    def get_prepare_steps(self, motor_positions):
+        """
+        Returns the steps preparing a data collection that run concurrently,
+        as a list of (name, function) pairs. The steps are independent of
+        each other, each step runs its own actions in sequence. Subclasses
+        can add their own steps, for example to arm the detector.
+
+        :param motor_positions: centred position, stored in LIMS
+        :type motor_positions: dict
+        """
+        return [
+            ("energy and resolution", self.prepare_energy_and_resolution),
+            ("transmission", self.prepare_transmission),
+            ("directories", self.prepare_directories),
+            ("LIMS", lambda: self.prepare_lims(motor_positions)),
+        ]
+
+    def prepare_collection(self):
+        """
+        Runs the steps of get_sequential_prepare_steps, then the steps of
+        get_prepare_steps concurrently and waits for all of them. The
+        duration of each step is logged and kept in prepare_durations.
+        If a concurrent step fails the other ones are killed and the
+        exception is raised.
+        """
+        log = logging.getLogger("user_level_log")
+        log.info("Collection: Preparing beamline")
+        self.prepare_durations = {}
+        start_time = time.time()
+
+        def run_step(name, step_function):
+            step_start_time = time.time()
+            result = step_function()
+            self.prepare_durations[name] = time.time() - step_start_time
+            log.info(
+                "Collection: %s prepared in %.2f s", name, self.prepare_durations[name]
+            )
+            return result
+
+        motor_positions = None
+        for name, step_function in self.get_sequential_prepare_steps():
+            result = run_step(name, step_function)
+            if name == "centring":
+                motor_positions = result
+
+        steps = [
+            gevent.spawn(run_step, name, step_function)
+            for name, step_function in self.get_prepare_steps(motor_positions)
+        ]
+        try:
+            gevent.joinall(steps, raise_error=True)
+        finally:
+            gevent.killall(steps)
+
+        log.info("Collection: Beamline prepared in %.2f s", time.time() - start_time)
+
+    def prepare_shutters(self):
+        """
+        Opens the detector cover and the shutters
+        """
+        self.open_detector_cover()
+        self.open_safety_shutter()
+        self.open_fast_shutter()
+
+    def prepare_lims(self, motor_positions=None):
+        """
+        Stores the data collection and the sample information in LIMS
+
+        :param motor_positions: centred position of the collection
+        :type motor_positions: dict
+        """
+        if motor_positions is not None:
+            self.current_dc_parameters["motors"] = dict(motor_positions)
+
+        log = logging.getLogger("user_level_log")
+        log.info("Collection: Storing data collection in LIMS")
+        self.store_data_collection_in_lims()
+
+        log.info("Collection: Getting sample info from parameters")
+        self.get_sample_info()
+
+        log.info("Collect: Storing sample info in LIMS")
+        self.store_sample_info_in_lims()
+
+    def prepare_directories(self):
+        logging.getLogger("user_level_log").info(
+            "Collection: Creating directories for raw images and processing files"
+        )
+        self.create_file_directories()
+
+    def prepare_centred_position(self):
+        """
+        Moves to the centred position and takes crystal snapshots
+
+        :returns: motor positions of the centred position
+        :rtype: dict
+        """
+        if all(item is None for item in self.current_dc_parameters["motors"].values()):
+            # No centring point defined
+            # create point based on the current position
+            current_diffractometer_position = self.diffractometer_hwobj.getPositions()
+            for motor in self.current_dc_parameters["motors"].keys():
+                self.current_dc_parameters["motors"][
+                    motor
+                ] = current_diffractometer_position.get(motor)
+
+        logging.getLogger("user_level_log").info(
+            "Collection: Moving to centred position"
+        )
+        self.move_to_centered_position()
+        self.take_crystal_snapshots()
+        self.move_to_centered_position()
+        return dict(self.current_dc_parameters["motors"])
+
+    def prepare_transmission(self):
+        if "transmission" in self.current_dc_parameters:
+            logging.getLogger("user_level_log").info(
+                "Collection: Setting transmission to %.2f",
+                self.current_dc_parameters["transmission"],
+            )
+            self.set_transmission(self.current_dc_parameters["transmission"])
+
+    def prepare_energy_and_resolution(self):
+        """
+        Sets the energy, then the resolution which depends on it
+        """
+        log = logging.getLogger("user_level_log")
+
+        if "wavelength" in self.current_dc_parameters:
+            log.info(
+                "Collection: Setting wavelength to %.4f",
+                self.current_dc_parameters["wavelength"],
+            )
+            self.set_wavelength(self.current_dc_parameters["wavelength"])
+
+        elif "energy" in self.current_dc_parameters:
+            log.info(
+                "Collection: Setting energy to %.4f",
+                self.current_dc_parameters["energy"],
+            )
+            self.set_energy(self.current_dc_parameters["energy"])
+
+        dd = self.current_dc_parameters.get("resolution")
+        if dd and dd.get("upper"):
+            resolution = dd["upper"]
+            log.info("Collection: Setting resolution to %.3f", resolution)
+            self.set_resolution(resolution)
+
+        elif "detector_distance" in self.current_dc_parameters:
+            log.info(
+                "Collection: Moving detector to %.2f",
+                self.current_dc_parameters["detector_distance"],
+            )
+            self.move_detector(self.current_dc_parameters["detector_distance"])
+
     def data_collection_cleanup(self):
         """
         Method called when at end of data collection, successful or not.
@@ -333,6 +431,7 @@ class AbstractCollect(HardwareObject, object):
         )
         self.emit("progressStop", ())
         self._collecting = False
+        self.flush_lims_images()
         self.update_data_collection_in_lims()
         self.ready_event.set()
 
@@ -362,6 +461,8 @@ class AbstractCollect(HardwareObject, object):
             ):
                 self.trigger_auto_processing("after", 0)
 
+        self.flush_lims_images()
+
         self.emit(
             "collectOscillationFinished",
             (
@@ -678,47 +779,95 @@ class AbstractCollect(HardwareObject, object):
         if self.lims_client_hwobj and not self.current_dc_parameters["in_interleave"]:
             self.lims_client_hwobj.update_bl_sample(self.current_lims_sample)
 
-    def store_image_in_lims(self, frame_number, motor_position_id=None):
+    def get_lims_image_values(self):
         """
-        Descript. :
+        Returns the hardware values stored with each image in LIMS.
+        They are read once per data collection.
         """
-        if self.lims_client_hwobj and not self.current_dc_parameters["in_interleave"]:
-            file_location = self.current_dc_parameters["fileinfo"]["directory"]
-            image_file_template = self.current_dc_parameters["fileinfo"]["template"]
-            filename = image_file_template % frame_number
-            lims_image = {
-                "dataCollectionId": self.current_dc_parameters.get("collection_id"),
-                "fileName": filename,
-                "fileLocation": file_location,
-                "imageNumber": frame_number,
+        if self.lims_image_values is None:
+            self.lims_image_values = {
                 "measuredIntensity": self.get_measured_intensity(),
                 "synchrotronCurrent": self.get_machine_current(),
                 "machineMessage": self.get_machine_message(),
                 "temperature": self.get_cryo_temperature(),
             }
-            archive_directory = self.current_dc_parameters["fileinfo"][
-                "archive_directory"
-            ]
-            if archive_directory:
-                jpeg_filename = "%s.jpeg" % os.path.splitext(image_file_template)[0]
-                thumb_filename = (
-                    "%s.thumb.jpeg" % os.path.splitext(image_file_template)[0]
+        return self.lims_image_values
+
+    def store_image_record_in_lims(self, lims_image):
+        """
+        Queues the image record for LIMS, it is written in the background
+        """
+        if (
+            self.lims_image_writer is None
+            or self.lims_image_writer.lims_client is not self.lims_client_hwobj
+        ):
+            self.flush_lims_images()
+            self.lims_image_writer = LimsImageWriter(self.lims_client_hwobj)
+        return self.lims_image_writer.store_image(lims_image)
+
+    def flush_lims_images(self, timeout=FLUSH_TIMEOUT):
+        """
+        Waits until the queued image records are written in LIMS
+        """
+        if self.lims_image_writer is not None:
+            if not self.lims_image_writer.flush(timeout):
+                logging.getLogger("HWR").warning(
+                    "Timeout while storing images in LIMS, %d images pending",
+                    self.lims_image_writer.pending(),
                 )
-                jpeg_file_template = os.path.join(
-                    archive_directory, jpeg_filename
-                ).replace("cbf.thumb", "thumb")
-                jpeg_thumbnail_file_template = os.path.join(
-                    archive_directory, thumb_filename
-                ).replace("cbf.thumb", "thumb")
-                jpeg_full_path = jpeg_file_template % frame_number
-                jpeg_thumbnail_full_path = jpeg_thumbnail_file_template % frame_number
-                lims_image["jpegFileFullPath"] = jpeg_full_path
-                lims_image["jpegThumbnailFileFullPath"] = jpeg_thumbnail_full_path
-            if motor_position_id:
-                lims_image["motorPositionId"] = motor_position_id
+
+    def get_lims_image(self, frame_number, motor_position_id=None):
+        """
+        Returns the LIMS image record of the image <frame_number>
+        """
+        file_location = self.current_dc_parameters["fileinfo"]["directory"]
+        image_file_template = self.current_dc_parameters["fileinfo"]["template"]
+        filename = image_file_template % frame_number
+        lims_image = {
+            "dataCollectionId": self.current_dc_parameters.get("collection_id"),
+            "fileName": filename,
+            "fileLocation": file_location,
+            "imageNumber": frame_number,
+        }
+        lims_image.update(self.get_lims_image_values())
+        archive_directory = self.current_dc_parameters["fileinfo"]["archive_directory"]
+        if archive_directory:
+            jpeg_filename = "%s.jpeg" % os.path.splitext(image_file_template)[0]
+            thumb_filename = "%s.thumb.jpeg" % os.path.splitext(image_file_template)[0]
+            jpeg_file_template = os.path.join(archive_directory, jpeg_filename).replace(
+                "cbf.thumb", "thumb"
+            )
+            jpeg_thumbnail_file_template = os.path.join(
+                archive_directory, thumb_filename
+            ).replace("cbf.thumb", "thumb")
+            jpeg_full_path = jpeg_file_template % frame_number
+            jpeg_thumbnail_full_path = jpeg_thumbnail_file_template % frame_number
+            lims_image["jpegFileFullPath"] = jpeg_full_path
+            lims_image["jpegThumbnailFileFullPath"] = jpeg_thumbnail_full_path
+        if motor_position_id:
+            lims_image["motorPositionId"] = motor_position_id
+        return lims_image
+
+    def store_image_in_lims(self, frame_number, motor_position_id=None):
+        """
+        Stores the image <frame_number> in LIMS and returns its id
+        """
+        if self.lims_client_hwobj and not self.current_dc_parameters["in_interleave"]:
+            lims_image = self.get_lims_image(frame_number, motor_position_id)
             image_id = self.lims_client_hwobj.store_image(lims_image)
             return image_id
 
+    def queue_image_in_lims(self, frame_number, motor_position_id=None):
+        """
+        Queues the image <frame_number> for LIMS, without waiting for the
+        LIMS round trip. flush_lims_images waits for the queued images.
+
+        :returns: gevent.event.AsyncResult set to the image id, or None
+        """
+        if self.lims_client_hwobj and not self.current_dc_parameters["in_interleave"]:
+            lims_image = self.get_lims_image(frame_number, motor_position_id)
+            return self.store_image_record_in_lims(lims_image)
+
     def update_lims_with_workflow(self, workflow_id, grid_snapshot_filename):
         """Updates collection with information about workflow
 
@@ -9,6 +9,10 @@ import collections
 import autoprocessing
 import gevent
 from HardwareRepository.TaskUtils import task, cleanup, error_cleanup
+from HardwareRepository.HardwareObjects.lims_image_writer import (
+    FLUSH_TIMEOUT,
+    LimsImageWriter,
+)
 
 BeamlineControl = collections.namedtuple(
     "BeamlineControl",
@@ -68,6 +72,7 @@ class AbstractMultiCollect(object):
         self.__safety_shutter_close_task = None
         self.run_without_loop = None
         self.run_autoprocessing = None
+        self.lims_image_writer = None
         # wait for the 1st image from detector for 30 seconds by default
         self.first_image_timeout = 30
 
@@ -285,6 +290,35 @@ class AbstractMultiCollect(object):
     def generate_image_jpeg(self, filename, jpeg_path, jpeg_thumbnail_path):
         pass
 
+    def get_lims_image_values(self):
+        """Returns the hardware values stored with each image in LIMS.
+        Read once per sweep"""
+        return {
+            "measuredIntensity": self.get_measured_intensity(),
+            "synchrotronCurrent": self.get_machine_current(),
+            "machineMessage": self.get_machine_message(),
+            "temperature": self.get_cryo_temperature(),
+        }
+
+    def store_image_record_in_lims(self, lims_image):
+        """Queues the image record for LIMS, it is written in the background"""
+        if (
+            self.lims_image_writer is None
+            or self.lims_image_writer.lims_client is not self.bl_control.lims
+        ):
+            self.flush_lims_images()
+            self.lims_image_writer = LimsImageWriter(self.bl_control.lims)
+        return self.lims_image_writer.store_image(lims_image)
+
+    def flush_lims_images(self, timeout=FLUSH_TIMEOUT):
+        """Waits until the queued image records are written in LIMS"""
+        if self.lims_image_writer is not None:
+            if not self.lims_image_writer.flush(timeout):
+                logging.getLogger("HWR").warning(
+                    "Timeout while storing images in LIMS, %d images pending",
+                    self.lims_image_writer.pending(),
+                )
+
     def get_sample_info_from_parameters(self, parameters):
         """Returns sample_id, sample_location and sample_code from data collection parameters"""
         sample_info = parameters.get("sample_reference")
@@ -812,6 +846,7 @@ class AbstractMultiCollect(object):
             if self.run_without_loop:
                 self.execute_collect_without_loop(data_collect_parameters)
             else:
+                lims_image_values = None
                 for start, wedge_size in wedges_to_collect:
                     logging.getLogger("user_level_log").info(
                         "Preparing acquisition, start=%f, wedge size=%d",
@@ -867,16 +902,15 @@ class AbstractMultiCollect(object):
                         # Store image in lims
                         if self.bl_control.lims:
                             if self.store_image_in_lims(frame, j == wedge_size, j == 1):
+                                if lims_image_values is None:
+                                    lims_image_values = self.get_lims_image_values()
                                 lims_image = {
                                     "dataCollectionId": self.collection_id,
                                     "fileName": filename,
                                     "fileLocation": file_location,
                                     "imageNumber": frame,
-                                    "measuredIntensity": self.get_measured_intensity(),
-                                    "synchrotronCurrent": self.get_machine_current(),
-                                    "machineMessage": self.get_machine_message(),
-                                    "temperature": self.get_cryo_temperature(),
                                 }
+                                lims_image.update(lims_image_values)
 
                                 if archive_directory:
                                     lims_image["jpegFileFullPath"] = jpeg_full_path
@@ -884,12 +918,7 @@ class AbstractMultiCollect(object):
                                         "jpegThumbnailFileFullPath"
                                     ] = jpeg_thumbnail_full_path
 
-                                try:
-                                    self.bl_control.lims.store_image(lims_image)
-                                except BaseException:
-                                    logging.getLogger("HWR").exception(
-                                        "Could not store store image in LIMS"
-                                    )
+                                self.store_image_record_in_lims(lims_image)
 
                                 self.generate_image_jpeg(
                                     str(file_path),
@@ -946,6 +975,8 @@ class AbstractMultiCollect(object):
             # the last frame is counted
             self.diffractometer().wait_ready(10)
 
+        self.flush_lims_images()
+
         # data collection done
         self.data_collection_end_hook(data_collect_parameters)
 
@@ -1029,6 +1060,7 @@ class AbstractMultiCollect(object):
                     )
 
                 if self.bl_control.lims:
+                    self.flush_lims_images()
                     data_collect_parameters["flux_end"] = self.get_flux()
                     try:
                         self.bl_control.lims.update_data_collection(
@@ -1190,7 +1222,10 @@ class AbstractMultiCollect(object):
 
             try:
                 autoprocessing.start(
-                    self["auto_processing"], process_event, processAnalyseParams
+                    self["auto_processing"],
+                    process_event,
+                    processAnalyseParams,
+                    self.getObjectByRole("job_runner"),
                 )
             except BaseException:
                 logging.getLogger().exception("Error starting processing")
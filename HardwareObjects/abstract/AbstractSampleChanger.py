@@ -116,6 +116,10 @@ Tools for SC Classes
    Include a line like `<useUpdateTimer>True</useUpdateTimer`
    in the xml file
 
+- _bulkUpdate (context manager):
+   Info, contents, loaded sample and selection events triggered while
+   updating the contents inside a `with self._bulkUpdate():` block are
+   emitted once, when the block exits, instead of once per sample.
 
 
 --------------------------------------------
@@ -129,6 +133,8 @@ import logging
 import time
 import gevent
 import types
+from collections import OrderedDict
+from contextlib import contextmanager
 
 
 from HardwareRepository.TaskUtils import task
@@ -226,6 +232,8 @@ class SampleChanger(Container.Container, Equipment):
         self._token = None
         self._timer_update_inverval = 5  # interval in periods of 100 ms
         self._timer_update_counter = 0
+        self._bulk_update_level = 0
+        self._pending_events = OrderedDict()
 
     def init(self):
         use_update_timer = self.getProperty("useUpdateTimer")
@@ -429,21 +437,22 @@ class SampleChanger(Container.Container, Equipment):
     def updateInfo(self):
         """
         """
-        former_loaded = self.getLoadedSample()
-        self._doUpdateInfo()
-        if self._isDirty():
-            self._triggerInfoChangedEvent()
+        with self._bulkUpdate():
+            former_loaded = self.getLoadedSample()
+            self._doUpdateInfo()
+            if self._isDirty():
+                self._triggerInfoChangedEvent()
 
-        loaded = self.getLoadedSample()
-        if loaded != former_loaded:
-            if (
-                (loaded is None)
-                or (former_loaded is None)
-                or (loaded.getAddress() != former_loaded.getAddress())
-            ):
-                self._triggerLoadedSampleChangedEvent(loaded)
+            loaded = self.getLoadedSample()
+            if loaded != former_loaded:
+                if (
+                    (loaded is None)
+                    or (former_loaded is None)
+                    or (loaded.getAddress() != former_loaded.getAddress())
+                ):
+                    self._triggerLoadedSampleChangedEvent(loaded)
 
-        self._resetDirty()
+            self._resetDirty()
 
     def isTransient(self):
         return self._transient
@@ -702,8 +711,32 @@ class SampleChanger(Container.Container, Equipment):
             Container.Container._setSelectedComponent(self, component)
             self._triggerSelectionChangedEvent()
 
+    @contextmanager
+    def _bulkUpdate(self):
+        """
+        Coalesces the contents events triggered inside the block: each event
+        is emitted once, with its last arguments, when the outermost block
+        exits
+        """
+        self._bulk_update_level += 1
+        try:
+            yield
+        finally:
+            self._bulk_update_level -= 1
+            if self._bulk_update_level == 0:
+                pending_events = self._pending_events
+                self._pending_events = OrderedDict()
+                for signal, args in pending_events.items():
+                    self.emit(signal, args)
+
     # ########################    PRIVATE    #########################
 
+    def _emitContentsEvent(self, signal, args=()):
+        if self._bulk_update_level:
+            self._pending_events[signal] = args
+        else:
+            self.emit(signal, args)
+
     def _triggerStateChangedEvent(self, former):
         self.emit(self.STATE_CHANGED_EVENT, (self.state, former))
 
@@ -711,16 +744,16 @@ class SampleChanger(Container.Container, Equipment):
         self.emit(self.STATUS_CHANGED_EVENT, (str(self.status),))
 
     def _triggerLoadedSampleChangedEvent(self, sample):
-        self.emit(self.LOADED_SAMPLE_CHANGED_EVENT, (sample,))
+        self._emitContentsEvent(self.LOADED_SAMPLE_CHANGED_EVENT, (sample,))
 
     def _triggerSelectionChangedEvent(self):
-        self.emit(self.SELECTION_CHANGED_EVENT, ())
+        self._emitContentsEvent(self.SELECTION_CHANGED_EVENT)
 
     def _triggerInfoChangedEvent(self):
-        self.emit(self.INFO_CHANGED_EVENT, ())
+        self._emitContentsEvent(self.INFO_CHANGED_EVENT)
 
     def _triggerTaskFinishedEvent(self, task, ret, exception):
         self.emit(self.TASK_FINISHED_EVENT, (task, ret, exception))
 
     def _triggerContentsUpdatedEvent(self):
-        self.emit(self.CONTENTS_UPDATED_EVENT)
+        self._emitContentsEvent(self.CONTENTS_UPDATED_EVENT)
@@ -27,11 +27,27 @@ This module declares class GenericVideo.
 This class is not meant to be instanced directly but as
 the base class for classes providing access to Video in MXCuBE
 
+Frames are polled only while there are frame consumers: the receivers of
+the imageReceived signal, or callbacks added with add_frame_consumer.
+Raw frames are kept in a ring buffer of frame_buffer_size frames and
+converted (qimage, qpixmap, jpeg, rgb, grey) when a consumer asks for it,
+each conversion being done at most once per frame. Consumers can limit
+their frame rate with max_fps.
 
+Example:
+
+    def frame_received(jpeg_image, width, height):
+        ...
+
+    consumer = camera_hwobj.add_frame_consumer(frame_received, "jpeg", 5)
+    ...
+    camera_hwobj.remove_frame_consumer(consumer)
 """
 
 from __future__ import print_function
 import abc
+import collections
+import io
 import os
 import sys
 import time
@@ -52,12 +68,44 @@ modulenames = ["qt", "PyQt5", "PyQt4"]
 if any(mod in sys.modules for mod in modulenames):
     USEQT = True
     try:
+        from PyQt5.QtCore import QSize
         from PyQt5.QtGui import QImage, QPixmap
     except ImportError:
+        from PyQt4.QtCore import QSize
         from PyQt4.QtGui import QImage, QPixmap
 else:
     USEQT = False
+
+try:
     from PIL import Image
+except ImportError:
+    if not USEQT:
+        raise
+
+# number of raw frames kept in the ring buffer
+DEFAULT_FRAME_BUFFER_SIZE = 4
+
+
+class VideoFrame(object):
+    """Raw camera frame, with its conversions done so far"""
+
+    def __init__(self, raw_buffer, width, height, number):
+        self.raw_buffer = raw_buffer
+        self.width = width
+        self.height = height
+        self.number = number
+        self.timestamp = time.time()
+        self.conversions = {}
+
+
+class FrameConsumer(object):
+    """Callback receiving frames in one encoding, at most max_fps per second"""
+
+    def __init__(self, callback, encoding, max_fps=None):
+        self.callback = callback
+        self.encoding = encoding
+        self.min_interval = 1.0 / max_fps if max_fps else 0
+        self.last_frame_time = None
 
 
 class AbstractVideoDevice(Device):
@@ -86,6 +134,20 @@ class AbstractVideoDevice(Device):
         self.default_cam_encoding = None
         self.default_poll_interval = None
 
+        self.frame_buffer = collections.deque(maxlen=DEFAULT_FRAME_BUFFER_SIZE)
+        self.frame_count = 0
+        self.frame_consumers = []
+        self.image_received_consumer = None
+        self.image_received_count = 0
+        self.image_received_max_fps = None
+        self.frame_converters = {
+            "rgb": self.frame_to_rgb,
+            "grey": self.frame_to_grey,
+            "jpeg": self.frame_to_jpeg,
+            "qimage": self.frame_to_qimage,
+            "qpixmap": self.frame_to_qpixmap,
+        }
+
     def init(self):
         self.cam_name = self.getProperty("name", "camera")
 
@@ -129,6 +191,16 @@ class AbstractVideoDevice(Device):
 
         self.scale = self.getProperty("scale", 1.0)
 
+        self.frame_buffer = collections.deque(
+            self.frame_buffer,
+            maxlen=self.getProperty("frame_buffer_size", DEFAULT_FRAME_BUFFER_SIZE),
+        )
+        self.image_received_max_fps = self.getProperty("max_fps")
+        if self.image_received_consumer is not None:
+            self.image_received_consumer.min_interval = (
+                1.0 / self.image_received_max_fps if self.image_received_max_fps else 0
+            )
+
         try:
             self.cam_type = self.getProperty("type").lower()
         except BaseException:
@@ -184,30 +256,155 @@ class AbstractVideoDevice(Device):
 
     """ Generic methods """
 
-    def get_new_image(self):
+    def grab_frame(self):
         """
-        Descript. :
+        Reads the latest image of the camera into the ring buffer, without
+        any conversion.
+
+        :returns: The frame, None if there is no image.
+        :rtype: VideoFrame
         """
         raw_buffer, width, height = self.get_image()
 
         if raw_buffer is not None and raw_buffer.any():
-            if self.cam_type == "basler":
-                raw_buffer = self.decoder(raw_buffer)
-                qimage = QImage(
-                    raw_buffer, width, height, width * 3, QImage.Format_RGB888
+            self.frame_count += 1
+            frame = VideoFrame(raw_buffer, width, height, self.frame_count)
+            self.frame_buffer.append(frame)
+            return frame
+
+    def get_frame(self, index=-1):
+        """
+        :param index: Index in the ring buffer, -1 for the latest frame.
+        :type index: int
+
+        :returns: A frame of the ring buffer, None if it is empty.
+        :rtype: VideoFrame
+        """
+        try:
+            return self.frame_buffer[index]
+        except IndexError:
+            return None
+
+    def get_frame_image(self, frame, encoding):
+        """
+        Converts <frame> to <encoding>, the conversion is done once per
+        frame and must not be modified by the caller.
+
+        :param frame: Frame of the ring buffer.
+        :type frame: VideoFrame
+
+        :param encoding: One of rgb, grey, jpeg, qimage and qpixmap.
+        :type encoding: str
+        """
+        try:
+            return frame.conversions[encoding]
+        except KeyError:
+            image = self.frame_converters[encoding](frame)
+            frame.conversions[encoding] = image
+            return image
+
+    def frame_to_rgb(self, frame):
+        if self.cam_type == "basler":
+            return self.decoder(frame.raw_buffer)
+        return np.frombuffer(frame.raw_buffer, dtype=np.uint8)[
+            : frame.height * frame.width * 3
+        ].reshape(frame.height, frame.width, 3)
+
+    def frame_to_grey(self, frame):
+        rgb_image = self.get_frame_image(frame, "rgb")
+        return np.dot(rgb_image, [0.299, 0.587, 0.114]).astype(np.uint8)
+
+    def frame_to_jpeg(self, frame):
+        # for now only RGB encoded video data (prosilica...)
+        image = Image.frombytes("RGB", (frame.width, frame.height), frame.raw_buffer)
+        strbuf = io.BytesIO()
+        image.save(strbuf, "JPEG")
+        return strbuf.getvalue()
+
+    def frame_to_qimage(self, frame):
+        width, height = frame.width, frame.height
+
+        if self.cam_type == "basler":
+            raw_buffer = self.get_frame_image(frame, "rgb")
+            qimage = QImage(raw_buffer, width, height, width * 3, QImage.Format_RGB888)
+        else:
+            qimage = QImage(frame.raw_buffer, width, height, QImage.Format_RGB888)
+
+        if self.cam_mirror is not None:
+            qimage = qimage.mirrored(self.cam_mirror[0], self.cam_mirror[1])
+
+        if self.scale != 1:
+            dims = self.get_image_dimensions()  # should be already scaled
+            qimage = qimage.scaled(QSize(dims[0], dims[1]))
+
+        # the image must not refer to the raw buffer any more
+        return qimage.copy()
+
+    def frame_to_qpixmap(self, frame):
+        return QPixmap(self.get_frame_image(frame, "qimage"))
+
+    def add_frame_consumer(self, callback, encoding, max_fps=None):
+        """
+        Polls frames for <callback> until remove_frame_consumer is called.
+        The callback is called with the image in <encoding>, its width and
+        height. The image is shared by all the consumers.
+
+        :param encoding: One of rgb, grey, jpeg, qimage and qpixmap.
+        :type encoding: str
+
+        :param max_fps: Maximum number of frames per second, None for every
+                        polled frame.
+        :type max_fps: float
+
+        :returns: The consumer, to remove it.
+        :rtype: FrameConsumer
+        """
+        if encoding not in self.frame_converters:
+            raise ValueError("Unknown frame encoding %s" % encoding)
+
+        consumer = FrameConsumer(callback, encoding, max_fps)
+        self.frame_consumers.append(consumer)
+        return consumer
+
+    def remove_frame_consumer(self, consumer):
+        if consumer in self.frame_consumers:
+            self.frame_consumers.remove(consumer)
+
+    def send_frame(self, frame):
+        """
+        Sends <frame> to the consumers whose frame rate limit allows it.
+        """
+        for consumer in list(self.frame_consumers):
+            if (
+                consumer.last_frame_time is not None
+                and frame.timestamp - consumer.last_frame_time < consumer.min_interval
+            ):
+                continue
+            consumer.last_frame_time = frame.timestamp
+
+            try:
+                image = self.get_frame_image(frame, consumer.encoding)
+                consumer.callback(image, frame.width, frame.height)
+            except BaseException:
+                logging.getLogger("HWR").exception(
+                    "%s: could not send frame %d", self.name(), frame.number
                 )
-            else:
-                qimage = QImage(raw_buffer, width, height, QImage.Format_RGB888)
 
-            if self.cam_mirror is not None:
-                qimage = qimage.mirrored(self.cam_mirror[0], self.cam_mirror[1])
+    def emit_image_received(self, image, width, height):
+        if USEQT:
+            self.emit("imageReceived", image)
+        else:
+            self.emit("imageReceived", image, width, height)
 
-            if self.scale != 1:
-                dims = self.get_image_dimensions()  # should be already scaled
-                qimage = qimage.scaled(QSize(dims[0], dims[1]))
+    def get_new_image(self):
+        """
+        Descript. :
+        """
+        frame = self.grab_frame()
 
-            qpixmap = QPixmap(qimage)
-            self.emit("imageReceived", qpixmap)
+        if frame is not None:
+            qimage = self.get_frame_image(frame, "qimage")
+            self.emit("imageReceived", self.get_frame_image(frame, "qpixmap"))
             return qimage.copy()
 
     def get_jpg_image(self):
@@ -215,17 +412,11 @@ class AbstractVideoDevice(Device):
         """
            the signal imageReceived is as expected by mxcube3
         """
-        raw_buffer, width, height = self.get_image()
+        frame = self.grab_frame()
 
-        if raw_buffer is not None and raw_buffer.any():
-            image = Image.frombytes("RGB", (width, height), raw_buffer)
-            from cStringIO import StringIO
-
-            strbuf = StringIO()
-            image.save(strbuf, "JPEG")
-            jpgimg_str = strbuf.getvalue()
-            if jpgimg_str is not None:
-                self.emit("imageReceived", jpgimg_str, width, height)
+        if frame is not None:
+            jpgimg_str = self.get_frame_image(frame, "jpeg")
+            self.emit("imageReceived", jpgimg_str, frame.width, frame.height)
             return jpgimg_str
         else:
             return None
@@ -331,24 +522,38 @@ class AbstractVideoDevice(Device):
 
     def do_image_polling(self, sleep_time):
         """
-        Descript. :
+        Descript. : Polls frames while there are frame consumers
         """
         while self.get_video_live() is True:
-            if USEQT:
-                self.get_new_image()
-            else:
-                self.get_jpg_image()
+            if self.frame_consumers:
+                frame = self.grab_frame()
+                if frame is not None:
+                    self.send_frame(frame)
             time.sleep(sleep_time)
 
     def connectNotify(self, signal):
         """
-        Descript. :
+        Descript. : Frames are polled for imageReceived while it has
+                    receivers
         """
-        return
+        if signal == "imageReceived":
+            self.image_received_count += 1
+            if self.image_received_consumer is None:
+                self.image_received_consumer = self.add_frame_consumer(
+                    self.emit_image_received,
+                    "qpixmap" if USEQT else "jpeg",
+                    self.image_received_max_fps,
+                )
 
-        """if signal == "imageReceived" and self.image_polling is None:
-            self.image_polling = gevent.spawn(self.do_image_polling,
-                 self.poll_interval/1000.0)"""
+    def disconnectNotify(self, signal):
+        """
+        Descript. :
+        """
+        if signal == "imageReceived" and self.image_received_count > 0:
+            self.image_received_count -= 1
+            if self.image_received_count == 0:
+                self.remove_frame_consumer(self.image_received_consumer)
+                self.image_received_consumer = None
 
     def refresh_video(self):
         """
@@ -125,6 +125,7 @@ class Component(object):
         changed = False
         if self.id is not None:
             self.id = None
+            self._resetContainerIdIndex()
             changed = True
         if self.present:
             self.present = False
@@ -140,6 +141,7 @@ class Component(object):
         changed = False
         if self.id != id:
             self.id = id
+            self._resetContainerIdIndex()
             changed = True
         if self.id:
             present = True
@@ -161,6 +163,13 @@ class Component(object):
             if self.getContainer() is not None:
                 self.getContainer()._setSelected(True)
         self.selected = selected
+        if selected and self.isLeaf() and self.getContainer() is not None:
+            self.getContainer()._setSelectedSamplePointer(self)
+
+    def _resetContainerIdIndex(self):
+        container = self.getContainer()
+        if container is not None:
+            container._resetIdIndex()
 
     def _isDirty(self):
         return self.dirty
@@ -11,6 +11,11 @@ class Container(Component):
         super(Container, self).__init__(container, address, scannable)
         self.type = type
         self.components = []
+        # indexes of the components under this container, built on first use
+        self._sample_list = None
+        self._address_index = None
+        self._id_index = None
+        self._selected_sample = None
 
     #########################           PUBLIC           #########################
 
@@ -44,13 +49,15 @@ class Container(Component):
         Returns the list of all Sample objects under of this container (recursivelly)
         :rtype: list
         """
-        samples = []
-        for c in self.getComponents():
-            if isinstance(c, Sample):
-                samples.append(c)
-            else:
-                samples.extend(c.getSampleList())
-        return samples
+        if self._sample_list is None:
+            samples = []
+            for c in self.getComponents():
+                if isinstance(c, Sample):
+                    samples.append(c)
+                else:
+                    samples.extend(c.getSampleList())
+            self._sample_list = samples
+        return list(self._sample_list)
 
     def getBasketList(self):
         basket_list = []
@@ -84,14 +91,9 @@ class Container(Component):
         Returns a component through its slot address or None if address is invalid
         :rtype: Component
         """
-        for c in self.getComponents():
-            if c.getAddress() == address:
-                return c
-            if isinstance(c, Container):
-                aux = c.getComponentByAddress(address)
-                if aux is not None:
-                    return aux
-        return None
+        if self._address_index is None:
+            self._address_index = self._buildIndex(Component.getAddress)
+        return self._address_index.get(address)
 
     def hasComponentAddress(self, address):
         """
@@ -105,14 +107,9 @@ class Container(Component):
         Returns a component through its id or None if id is invalid
         :rtype: Component
         """
-        for c in self.getComponents():
-            if c.getID() == id:
-                return c
-            if isinstance(c, Container):
-                aux = c.getComponentById(id)
-                if aux is not None:
-                    return aux
-        return None
+        if self._id_index is None:
+            self._id_index = self._buildIndex(Component.getID)
+        return self._id_index.get(id)
 
     def hasComponentId(self, id):
         """
@@ -122,9 +119,9 @@ class Container(Component):
         return self.getComponentById(id) is not None
 
     def getSelectedSample(self):
-        for s in self.getSampleList():
-            if s.isSelected():
-                return s
+        sample = self._selected_sample
+        if sample is not None and sample.isSelected():
+            return sample
         return None
 
     def getSelectedComponent(self):
@@ -142,12 +139,52 @@ class Container(Component):
 
     def _addComponent(self, c):
         self.components.append(c)
+        self._resetIndexes()
 
     def _removeComponent(self, c):
         self.components.remove(c)
+        self._resetIndexes()
 
     def _clearComponents(self):
         self.components = []
+        self._resetIndexes()
+
+    def _buildIndex(self, key, index=None):
+        """
+        Maps key(component) to the components under this container. As for
+        a depth first search, the first component found is kept for a key
+        """
+        if index is None:
+            index = {}
+        for c in self.getComponents():
+            index.setdefault(key(c), c)
+            if isinstance(c, Container):
+                c._buildIndex(key, index)
+        return index
+
+    def _resetIndexes(self):
+        """
+        Called on structural change: resets the indexes of this container
+        and of its parents
+        """
+        self._sample_list = None
+        self._address_index = None
+        self._id_index = None
+        container = self.getContainer()
+        if container is not None:
+            container._resetIndexes()
+
+    def _resetIdIndex(self):
+        self._id_index = None
+        container = self.getContainer()
+        if container is not None:
+            container._resetIdIndex()
+
+    def _setSelectedSamplePointer(self, sample):
+        self._selected_sample = sample
+        container = self.getContainer()
+        if container is not None:
+            container._setSelectedSamplePointer(sample)
 
     def _resetDirty(self):
         Component._resetDirty(self)
@@ -155,11 +192,11 @@ class Container(Component):
             c._resetDirty()
 
     def _setSelectedSample(self, sample):
-        for s in self.getSampleList():
-            if s == sample:
-                s._setSelected(True)
-            else:
-                s._setSelected(False)
+        selected = self.getSelectedSample()
+        if selected is not None and selected != sample:
+            selected._setSelected(False)
+        if sample is not None:
+            sample._setSelected(True)
 
     def _setSelectedComponent(self, component):
         if component is None:
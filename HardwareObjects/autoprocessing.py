@@ -40,7 +40,7 @@ def grouped_processing(processEvent, params):
     return endOfLineToExecute
 
 
-def start(programs, processEvent, paramsDict):
+def start(programs, processEvent, paramsDict, job_runner=None):
     for program in programs["program"]:
         try:
             allowed_events = program.getProperty("event").split(" ")
@@ -83,22 +83,33 @@ def start(programs, processEvent, paramsDict):
                             + cell_opt
                         )  # +\
                         # (paramsDict["inverse_beam"] and ' -inverse' or '')
-                    lineToExecute = (
-                        executable + endOfLineToExecute + " 2>&1 > /dev/null &"
-                    )
+                    if job_runner is not None:
+                        lineToExecute = executable + endOfLineToExecute
+                    else:
+                        lineToExecute = (
+                            executable + endOfLineToExecute + " 2>&1 > /dev/null &"
+                        )
                     logging.info(
                         "Process event %s, executing %s"
                         % (processEvent, str(lineToExecute))
                     )
 
-                    subprocess.Popen(
-                        str(lineToExecute),
-                        shell=True,
-                        stdin=None,
-                        stdout=None,
-                        stderr=None,
-                        close_fds=True,
-                    )
+                    if job_runner is not None:
+                        job_runner.submit(
+                            str(lineToExecute),
+                            name="%s %s" % (os.path.basename(executable), processEvent),
+                            log_file=os.devnull,
+                            lane="autoprocessing",
+                        )
+                    else:
+                        subprocess.Popen(
+                            str(lineToExecute),
+                            shell=True,
+                            stdin=None,
+                            stdout=None,
+                            stderr=None,
+                            close_fds=True,
+                        )
                 else:
                     logging.getLogger().error(
                         "No program to execute found (%s)", executable
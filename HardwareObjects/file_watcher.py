@@ -0,0 +1,333 @@
+"""
+Notifies hardware objects when files appear or are closed after writing.
+
+Objects subscribe to the paths they wait for instead of polling them one by
+one. On Linux the watched directories are registered with inotify, so that
+files written from this host are reported as soon as they are created or
+closed. A single polling greenlet lists each watched directory once for
+all the files expected in it, at an interval that starts short and grows
+while nothing appears. It is the only source of events when inotify is not
+available, and otherwise catches the files written from other hosts on
+network file systems, that inotify does not report.
+
+A file reported by inotify is written when inotify reports IN_CLOSE_WRITE.
+The other files, that existed before the subscription or that inotify does
+not report, are considered written once their size and modification time
+have not changed for <stable_time> seconds.
+
+Example:
+
+    watcher = get_file_watcher()
+    if not watcher.wait_for_file(xds_input_file, timeout=20, closed=True):
+        logging.error("XDS.INP did not appear")
+
+    subscription = watcher.subscribe(image_path, image_written, closed=True)
+    ...
+    subscription.cancel()
+"""
+
+import ctypes
+import ctypes.util
+import errno
+import logging
+import os
+import struct
+import sys
+import time
+
+import gevent
+import gevent.event
+import gevent.socket
+
+
+__credits__ = ["MXCuBE collaboration"]
+
+# polling interval after a subscription or a file appeared, in seconds
+MIN_POLLING_INTERVAL = 0.05
+# polling interval reached when nothing appears, in seconds
+MAX_POLLING_INTERVAL = 1.0
+# time without change after which a polled file is written, in seconds
+STABLE_TIME = 5.0
+
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = 0o2000000
+IN_APPEARED = IN_CREATE | IN_MOVED_TO | IN_CLOSE_WRITE
+IN_CLOSED = IN_MOVED_TO | IN_CLOSE_WRITE
+
+INOTIFY_EVENT = struct.Struct("iIII")
+
+try:
+    _libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+    _libc.inotify_init1
+except (OSError, AttributeError, TypeError):
+    _libc = None
+
+_file_watcher = None
+
+
+def encode_path(path):
+    """Returns the path as bytes, as passed to inotify"""
+    if isinstance(path, bytes):
+        return path
+    return path.encode(sys.getfilesystemencoding())
+
+
+def decode_path(path):
+    """Returns the path received from inotify as a str"""
+    if isinstance(path, str):
+        return path
+    return path.decode(sys.getfilesystemencoding())
+
+
+def get_file_watcher():
+    """
+    :returns: File watcher shared by the hardware objects
+    :rtype: FileWatcher
+    """
+    global _file_watcher
+
+    if _file_watcher is None:
+        _file_watcher = FileWatcher()
+    return _file_watcher
+
+
+class Subscription(object):
+    """Subscription of a callback to a file path"""
+
+    def __init__(self, watcher, path, callback, closed):
+        self.watcher = watcher
+        self.path = path
+        self.directory, self.name = os.path.split(path)
+        self.callback = callback
+        self.closed = closed
+        # (size, modification time) of the file and time it was first seen
+        self.last_stat = None
+        self.stable_since = None
+        # True once inotify reported the file, that then waits for its close
+        self.inotify_reported = False
+
+    def cancel(self):
+        self.watcher.unsubscribe(self)
+
+
+class FileWatcher(object):
+    """Calls the subscribed callbacks once when their file appears or closes"""
+
+    def __init__(
+        self,
+        min_interval=MIN_POLLING_INTERVAL,
+        max_interval=MAX_POLLING_INTERVAL,
+        use_inotify=True,
+        stable_time=STABLE_TIME,
+    ):
+        """
+        :param min_interval: Polling interval after a change, in seconds.
+        :param max_interval: Longest polling interval, in seconds.
+        :param use_inotify: False to only poll the directories.
+        :param stable_time: Time after which a polled file that did not
+            change is written, in seconds.
+        """
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.stable_time = stable_time
+        self.polling_interval = min_interval
+
+        # directory -> file name -> list of subscriptions
+        self.subscriptions = {}
+        self.polling_task = None
+        self.polling_wakeup = gevent.event.Event()
+
+        self.inotify_fd = None
+        self.inotify_task = None
+        self.watched_directories = {}
+        self.watch_descriptors = {}
+        if use_inotify and _libc is not None:
+            fd = _libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+            if fd < 0:
+                logging.getLogger("HWR").warning(
+                    "FileWatcher: inotify not available (%s), polling only"
+                    % os.strerror(ctypes.get_errno())
+                )
+            else:
+                self.inotify_fd = fd
+
+    def subscribe(self, path, callback, closed=False):
+        """
+        Calls callback(path) once, when the file appears or, if <closed>,
+        when it is closed after writing. Files that already exist are
+        reported by the next poll.
+
+        :param path: file path
+        :param callback: function called with the path
+        :param closed: wait until the file is written
+        :returns: subscription, to cancel it
+        :rtype: Subscription
+        """
+        subscription = Subscription(self, os.path.abspath(path), callback, closed)
+        directory = subscription.directory
+        if directory not in self.subscriptions:
+            self.subscriptions[directory] = {}
+            self.add_watch(directory)
+        self.subscriptions[directory].setdefault(subscription.name, []).append(
+            subscription
+        )
+
+        self.polling_interval = self.min_interval
+        if self.polling_task is None or self.polling_task.dead:
+            self.polling_task = gevent.spawn(self.poll_directories)
+        else:
+            self.polling_wakeup.set()
+        return subscription
+
+    def unsubscribe(self, subscription):
+        directory_subscriptions = self.subscriptions.get(subscription.directory, {})
+        name_subscriptions = directory_subscriptions.get(subscription.name, [])
+        if subscription in name_subscriptions:
+            name_subscriptions.remove(subscription)
+        if not name_subscriptions:
+            directory_subscriptions.pop(subscription.name, None)
+        if not directory_subscriptions:
+            self.subscriptions.pop(subscription.directory, None)
+            self.remove_watch(subscription.directory)
+
+    def wait_for_file(self, path, timeout=None, closed=False):
+        """
+        Waits until the file appears or, if <closed>, until it is written.
+        Blocks only the calling greenlet.
+
+        :param path: file path
+        :param timeout: maximum time to wait, in seconds
+        :param closed: wait until the file is written
+        :returns: False if the timeout expired
+        :rtype: bool
+        """
+        file_ready = gevent.event.Event()
+        subscription = self.subscribe(path, lambda path: file_ready.set(), closed)
+        try:
+            return file_ready.wait(timeout)
+        finally:
+            self.unsubscribe(subscription)
+
+    def notify(self, directory, name, closed):
+        """Calls the subscriptions of the file. Closed files also appeared"""
+        for subscription in list(
+            self.subscriptions.get(directory, {}).get(name, ())
+        ):
+            if closed or not subscription.closed:
+                self.unsubscribe(subscription)
+                try:
+                    subscription.callback(subscription.path)
+                except BaseException:
+                    logging.getLogger("HWR").exception(
+                        "FileWatcher: error in callback for %s" % subscription.path
+                    )
+
+    # ########################    POLLING    #########################
+
+    def poll_directories(self):
+        while self.subscriptions:
+            self.polling_wakeup.clear()
+            found = False
+            for directory in list(self.subscriptions):
+                found = self.poll_directory(directory) or found
+
+            if found:
+                self.polling_interval = self.min_interval
+            else:
+                self.polling_interval = min(
+                    2 * self.polling_interval, self.max_interval
+                )
+            self.polling_wakeup.wait(self.polling_interval)
+
+    def poll_directory(self, directory):
+        if directory not in self.watched_directories:
+            self.add_watch(directory)
+        try:
+            names = set(os.listdir(directory))
+        except OSError:
+            return False
+
+        found = False
+        for name, subscriptions in list(self.subscriptions[directory].items()):
+            if name not in names:
+                continue
+            found = True
+            self.notify(directory, name, closed=False)
+            self.poll_closed(directory, name, subscriptions)
+        return found
+
+    def poll_closed(self, directory, name, subscriptions):
+        """
+        Without close events, a file is written once its size and
+        modification time did not change for stable_time
+        """
+        try:
+            stat = os.stat(os.path.join(directory, name))
+        except OSError:
+            return
+        file_stat = (stat.st_size, stat.st_mtime)
+        now = time.time()
+        for subscription in list(subscriptions):
+            if subscription.inotify_reported:
+                continue
+            if file_stat != subscription.last_stat:
+                subscription.last_stat = file_stat
+                subscription.stable_since = now
+            elif now - subscription.stable_since >= self.stable_time:
+                self.notify(directory, name, closed=True)
+                return
+
+    # ########################    INOTIFY    #########################
+
+    def add_watch(self, directory):
+        if self.inotify_fd is None or directory in self.watched_directories:
+            return
+        wd = _libc.inotify_add_watch(
+            self.inotify_fd, encode_path(directory), IN_APPEARED
+        )
+        if wd < 0:
+            if ctypes.get_errno() != errno.ENOENT:
+                logging.getLogger("HWR").warning(
+                    "FileWatcher: cannot watch %s (%s)"
+                    % (directory, os.strerror(ctypes.get_errno()))
+                )
+            return
+        self.watched_directories[directory] = wd
+        self.watch_descriptors[wd] = directory
+        if self.inotify_task is None or self.inotify_task.dead:
+            self.inotify_task = gevent.spawn(self.read_inotify_events)
+
+    def remove_watch(self, directory):
+        wd = self.watched_directories.pop(directory, None)
+        if wd is not None:
+            self.watch_descriptors.pop(wd, None)
+            _libc.inotify_rm_watch(self.inotify_fd, wd)
+
+    def read_inotify_events(self):
+        while True:
+            gevent.socket.wait_read(self.inotify_fd)
+            try:
+                buf = os.read(self.inotify_fd, 64 * 1024)
+            except (IOError, OSError) as ex:
+                if ex.errno == errno.EAGAIN:
+                    continue
+                raise
+
+            offset = 0
+            while offset < len(buf):
+                wd, mask, _, length = INOTIFY_EVENT.unpack_from(buf, offset)
+                offset += INOTIFY_EVENT.size
+                name = buf[offset : offset + length].rstrip(b"\0")
+                offset += length
+
+                directory = self.watch_descriptors.get(wd)
+                if directory is not None and name:
+                    name = decode_path(name)
+                    for subscription in self.subscriptions.get(directory, {}).get(
+                        name, ()
+                    ):
+                        subscription.inotify_reported = True
+                    self.notify(directory, name, closed=bool(mask & IN_CLOSED))
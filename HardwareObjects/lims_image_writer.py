@@ -0,0 +1,95 @@
+"""
+Stores the images of data collections in LIMS from a background greenlet.
+
+Image records are queued by the collection sequence and written one by
+one, with one LIMS request each, by a background greenlet, so that the
+LIMS round trip is not on the acquisition path. The queue is bounded:
+when LIMS cannot keep up, store_image waits for room in the queue instead
+of using more and more memory. flush waits, at most FLUSH_TIMEOUT seconds
+by default, until all the queued records are written, at the end of a
+collection.
+
+Example:
+
+    writer = LimsImageWriter(lims_client_hwobj)
+    for frame in frames:
+        ...
+        writer.store_image({"dataCollectionId": collection_id, ...})
+    writer.flush()
+"""
+
+import logging
+
+import gevent
+import gevent.event
+import gevent.queue
+
+
+__credits__ = ["MXCuBE collaboration"]
+
+# maximum number of image records waiting to be written
+MAX_QUEUE_SIZE = 1000
+# default maximum time (in s) to wait for the queued records to be written
+FLUSH_TIMEOUT = 30
+
+
+class LimsImageWriter(object):
+    """Writes image records to LIMS off the caller greenlet"""
+
+    def __init__(self, lims_client, max_queue_size=MAX_QUEUE_SIZE):
+        """
+        :param lims_client: LIMS client hardware object, with a store_image
+                            method.
+        :param max_queue_size: Maximum number of records in the queue.
+        """
+        self.lims_client = lims_client
+        self.image_queue = gevent.queue.JoinableQueue(max_queue_size)
+        self.writer_task = None
+
+    def store_image(self, lims_image):
+        """
+        Queues the image record <lims_image>. Waits only if the queue is
+        full.
+
+        :param lims_image: Image parameters, as for lims.store_image.
+        :type lims_image: dict
+
+        :returns: Result set to the image id once the record is written.
+        :rtype: gevent.event.AsyncResult
+        """
+        if self.writer_task is None or self.writer_task.dead:
+            self.writer_task = gevent.spawn(self.write_images)
+
+        result = gevent.event.AsyncResult()
+        self.image_queue.put((lims_image, result))
+        return result
+
+    def flush(self, timeout=FLUSH_TIMEOUT):
+        """
+        Waits until all the queued image records are written.
+
+        :param timeout: Maximum time to wait, in seconds (None: no limit).
+        :type timeout: float
+
+        :returns: False if the timeout expired.
+        :rtype: bool
+        """
+        return self.image_queue.join(timeout)
+
+    def pending(self):
+        """
+        :returns: Number of image records waiting to be written.
+        :rtype: int
+        """
+        return self.image_queue.qsize()
+
+    def write_images(self):
+        while True:
+            lims_image, result = self.image_queue.get()
+            try:
+                result.set(self.lims_client.store_image(lims_image))
+            except Exception as ex:
+                logging.getLogger("HWR").exception("Could not store image in LIMS")
+                result.set_exception(ex)
+            finally:
+                self.image_queue.task_done()
@@ -71,6 +71,12 @@ class QtVideoMockup(AbstractVideoDevice):
         )
         self.emit("imageReceived", self.image)
 
+    def do_image_polling(self, sleep_time):
+        # the mockup image is not read with get_image
+        while self.get_video_live() is True:
+            self.get_new_image()
+            time.sleep(sleep_time)
+
     def save_snapshot(self, filename, image_type="PNG"):
         qimage = QImage(self.image)
         qimage.save(filename, image_type)
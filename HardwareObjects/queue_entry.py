@@ -774,7 +774,12 @@ class SampleQueueEntry(BaseQueueEntry):
 
         try:
             programs = self.beamline_setup.collect_hwobj["auto_processing"]
-            autoprocessing.start(programs, "end_multicollect", params)
+            autoprocessing.start(
+                programs,
+                "end_multicollect",
+                params,
+                self.beamline_setup.collect_hwobj.getObjectByRole("job_runner"),
+            )
         except KeyError:
             pass
 
@@ -6,10 +6,37 @@ the QueueModel.
 import copy
 import os
 import logging
+import weakref
 from collections import OrderedDict
 
 from HardwareRepository.HardwareObjects import queue_model_enumerables
 
+# Objects (the QueueModel indexes) notified when a path template changes
+# the (directory, prefix, run number) of the files it refers to
+_path_template_observers = weakref.WeakSet()
+
+
+def add_path_template_observer(observer):
+    """
+    Registers <observer>, its method path_template_changed(path_template)
+    is called whenever the directory, the prefix or the run number of
+    a path template changes. Its method path_template_replaced(obj) is
+    called when a node moves to another parent or when an attribute
+    leading to the path template of a node is reassigned, with the node,
+    or with another object if the node is not known. Only a weak reference
+    is kept.
+    """
+    _path_template_observers.add(observer)
+
+
+def remove_path_template_observer(observer):
+    _path_template_observers.discard(observer)
+
+
+def _notify_path_template_replaced(obj):
+    for observer in list(_path_template_observers):
+        observer.path_template_replaced(obj)
+
 
 class TaskNode(object):
     """
@@ -17,6 +44,14 @@ class TaskNode(object):
     the QueueModel object.
     """
 
+    # Attributes that move the node or lead to its path template
+    INDEXED_ATTRIBUTES = (
+        "_parent",
+        "acquisitions",
+        "reference_image_collection",
+        "path_template",
+    )
+
     def __init__(self):
         object.__init__(self)
 
@@ -32,6 +67,18 @@ class TaskNode(object):
         self._requires_centring = True
         self._origin = None
 
+    def __setattr__(self, name, value):
+        replaced = name in TaskNode.INDEXED_ATTRIBUTES and name in self.__dict__
+        object.__setattr__(self, name, value)
+
+        if replaced and _path_template_observers:
+            if self.__dict__.get("_node_id") is not None:
+                _notify_path_template_replaced(self)
+            elif name != "_parent":
+                # nodes that are not in a model, as the reference collection
+                # of a characterisation, may hold the path template of one
+                _notify_path_template_replaced(None)
+
     def is_enabled(self):
         """
         :returns: True if enabled and False if disabled
@@ -1231,6 +1278,13 @@ class Acquisition(object):
         self.path_template = PathTemplate()
         self.acquisition_parameters = AcquisitionParameters()
 
+    def __setattr__(self, name, value):
+        replaced = name == "path_template" and name in self.__dict__
+        object.__setattr__(self, name, value)
+
+        if replaced and _path_template_observers:
+            _notify_path_template_replaced(None)
+
     def get_preview_image_paths(self):
         """
         Returns the full paths, including the filename, to preview/thumbnail
@@ -1260,6 +1314,18 @@ class Acquisition(object):
 
 
 class PathTemplate(object):
+    # Attributes making up the key returned by get_key
+    KEY_ATTRIBUTES = frozenset(
+        (
+            "directory",
+            "base_prefix",
+            "mad_prefix",
+            "reference_image_prefix",
+            "wedge_prefix",
+            "run_number",
+        )
+    )
+
     @staticmethod
     def set_data_base_path(base_directory):
         # os.path.abspath returns path without trailing slash, if any
@@ -1317,6 +1383,22 @@ class PathTemplate(object):
         if not hasattr(self, "precision"):
             self.precision = str()
 
+    def __setattr__(self, name, value):
+        object.__setattr__(self, name, value)
+
+        if name in PathTemplate.KEY_ATTRIBUTES and _path_template_observers:
+            for observer in list(_path_template_observers):
+                observer.path_template_changed(self)
+
+    def get_key(self):
+        """
+        :returns: The (directory, prefix, run number) of the files
+                  described by this path template. Path templates with
+                  the same key can only collide on their image numbers.
+        :rtype: tuple
+        """
+        return (os.path.normpath(self.directory), self.get_prefix(), self.run_number)
+
     def as_dict(self):
         return {
             "directory": self.directory,
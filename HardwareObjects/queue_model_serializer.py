@@ -0,0 +1,385 @@
+"""
+Versioned serialization of the queue data model (queue_model_objects).
+
+A saved queue is a JSON header listing the task groups of the queue, by
+sample location, and one JSON record per task node. A record holds the
+class name and the attributes of the node, while its children are stored
+as the keys of their own records, so that a changed node can be saved
+without the rest of the queue (see QueueSerializer).
+
+Only the classes of queue_model_objects and the enumerables of
+queue_model_enumerables can be restored, objects are created without
+calling their constructor and nothing is evaluated. Attributes listed in
+TRANSIENT_ATTRIBUTES, or holding values of other types, are restored
+as None.
+
+Example of a saved queue with one task group:
+
+{"version": 1, "model": "ispyb",
+ "queue": [{"sample_location": {"__tuple__": [1, 1]}, "task_group": "3"}],
+ "nodes": {"3": {"class": "TaskGroup", "state": {...}, "children": ["4"]},
+           "4": {"class": "DataCollection", "state": {...}, "children": []}}}
+"""
+
+import enum
+import json
+import numbers
+from collections import OrderedDict
+
+from HardwareRepository.HardwareObjects import queue_model_enumerables
+from HardwareRepository.HardwareObjects import queue_model_objects
+
+FORMAT_VERSION = 1
+
+# Attributes that are not saved, per class name: links to the parent node,
+# graphics items, hardware objects and snapshots
+TRANSIENT_ATTRIBUTES = {
+    "TaskNode": ("_parent", "_children"),
+    "DataCollection": ("grid",),
+    "GphlWorkflow": ("workflow_hwobj",),
+    "CentredPosition": ("snapshot_image",),
+}
+
+try:
+    _STRING_TYPES = (str, unicode)
+except NameError:
+    _STRING_TYPES = (str,)
+
+_SCALAR_TYPES = (bool, float, int) + _STRING_TYPES
+
+_classes = {}
+_transient_attributes = {}
+
+
+def _get_classes():
+    """
+    :returns: The classes that can be restored, by name.
+    :rtype: dict
+    """
+    if not _classes:
+        for module in (queue_model_objects, queue_model_enumerables):
+            for name, value in vars(module).items():
+                if isinstance(value, type) and value.__module__ == module.__name__:
+                    _classes[name] = value
+    return _classes
+
+
+def _get_transient_attributes(cls):
+    result = _transient_attributes.get(cls)
+
+    if result is None:
+        result = set()
+        for base_cls in cls.__mro__:
+            result.update(TRANSIENT_ATTRIBUTES.get(base_cls.__name__, ()))
+        _transient_attributes[cls] = result
+
+    return result
+
+
+def _get_class(name):
+    try:
+        return _get_classes()[name]
+    except KeyError:
+        raise ValueError("Unknown queue model class %s" % name)
+
+
+def encode_value(value):
+    """
+    Converts <value> to an object that can be dumped with json.
+
+    :param value: Value to encode, made of builtin types and queue model
+                  objects.
+
+    :returns: The encoded value.
+    """
+    if value is None or isinstance(value, _SCALAR_TYPES):
+        return value
+    elif isinstance(value, list):
+        return [encode_value(item) for item in value]
+    elif isinstance(value, tuple):
+        items = [encode_value(item) for item in value]
+        if type(value).__name__ in _get_classes() and hasattr(value, "_fields"):
+            return {"__namedtuple__": type(value).__name__, "items": items}
+        return {"__tuple__": items}
+    elif isinstance(value, dict):
+        items = [[encode_value(key), encode_value(item)] for key, item in value.items()]
+        return {"__dict__": items, "ordered": isinstance(value, OrderedDict)}
+    elif isinstance(value, enum.Enum):
+        if type(value).__name__ in _get_classes():
+            return {"__enum__": type(value).__name__, "name": value.name}
+    elif isinstance(value, numbers.Integral):
+        return int(value)
+    elif isinstance(value, numbers.Real):
+        return float(value)
+    elif _get_classes().get(type(value).__name__) is type(value):
+        return {"__class__": type(value).__name__, "state": _encode_state(value)}
+
+    return None
+
+
+def decode_value(data):
+    """
+    Restores a value encoded with encode_value.
+
+    :param data: The encoded value, as loaded by json.
+
+    :returns: The value.
+    """
+    if isinstance(data, list):
+        return [decode_value(item) for item in data]
+    elif not isinstance(data, dict):
+        return data
+    elif "__class__" in data:
+        cls = _get_class(data["__class__"])
+        obj = cls.__new__(cls)
+        _restore_state(obj, data["state"])
+        return obj
+    elif "__tuple__" in data:
+        return tuple(decode_value(item) for item in data["__tuple__"])
+    elif "__dict__" in data:
+        dict_type = OrderedDict if data.get("ordered") else dict
+        return dict_type(
+            (_hashable(decode_value(key)), decode_value(item))
+            for key, item in data["__dict__"]
+        )
+    elif "__namedtuple__" in data:
+        cls = _get_class(data["__namedtuple__"])
+        return cls(*[decode_value(item) for item in data["items"]])
+    elif "__enum__" in data:
+        return _get_class(data["__enum__"])[data["name"]]
+
+    raise ValueError("Unknown encoded value %s" % str(data)[:80])
+
+
+def dumps_value(value):
+    return json.dumps(encode_value(value))
+
+
+def loads_value(data):
+    return decode_value(json.loads(data))
+
+
+def _hashable(key):
+    if isinstance(key, list):
+        return tuple(key)
+    return key
+
+
+def _encode_state(obj):
+    transient_attributes = _get_transient_attributes(type(obj))
+    return dict(
+        (name, encode_value(value))
+        for name, value in obj.__dict__.items()
+        if name not in transient_attributes
+    )
+
+
+def _restore_state(obj, state):
+    for name in _get_transient_attributes(type(obj)):
+        obj.__dict__[name] = None
+
+    if isinstance(obj, queue_model_objects.TaskNode):
+        obj._children = []
+
+    for name, value in state.items():
+        obj.__dict__[str(name)] = decode_value(value)
+
+
+def serialize(model_name, task_groups):
+    """
+    Serializes the task groups of a queue.
+
+    :param model_name: Name of the queue model, 'ispyb', 'free-pin'...
+    :type model_name: str
+
+    :param task_groups: (sample location, TaskGroup) pairs.
+    :type task_groups: list
+
+    :returns: The header and the records of all the nodes, by key.
+    :rtype: tuple(str, dict)
+    """
+    header, records = _encode_queue(model_name, task_groups)
+    return header, dict((key, _dumps_record(record)) for key, record in records.items())
+
+
+def _encode_queue(model_name, task_groups):
+    """
+    :returns: The header, as json, and the records of all the nodes
+              encoded but not yet dumped, by key.
+    :rtype: tuple(str, dict)
+    """
+    records = {}
+    queue = []
+
+    for sample_location, task_group in task_groups:
+        key = _encode_node(task_group, records)
+        queue.append(
+            {"sample_location": encode_value(sample_location), "task_group": key}
+        )
+
+    header = json.dumps(
+        {"version": FORMAT_VERSION, "model": model_name, "queue": queue}
+    )
+    return header, records
+
+
+def _encode_node(node, records):
+    key = None
+    if node._node_id is not None:
+        key = str(node._node_id)
+    if key is None or key in records:
+        key = "_%d" % len(records)
+
+    # reserve the key before the children are encoded
+    records[key] = None
+    children = [_encode_node(child, records) for child in node.get_children()]
+    records[key] = {
+        "class": type(node).__name__,
+        "state": _encode_state(node),
+        "children": children,
+    }
+    return key
+
+
+def _dumps_record(record):
+    return json.dumps(record, sort_keys=True)
+
+
+def deserialize(header, records):
+    """
+    Restores the task groups of a queue saved with serialize.
+
+    :param header: The header.
+    :type header: str
+
+    :param records: The records of the nodes, by key, either as json
+                    strings or already loaded.
+    :type records: dict
+
+    :returns: The model name and the (sample location, TaskGroup) pairs.
+    :rtype: tuple(str, list)
+    """
+    if isinstance(header, bytes):
+        header = header.decode("utf-8")
+    header = json.loads(header) if isinstance(header, _STRING_TYPES) else header
+
+    version = header.get("version")
+    if not isinstance(version, int) or version > FORMAT_VERSION:
+        raise ValueError("Unsupported queue format version %s" % version)
+
+    task_groups = []
+    for item in header["queue"]:
+        task_groups.append(
+            (
+                decode_value(item["sample_location"]),
+                _deserialize_node(item["task_group"], records),
+            )
+        )
+
+    return header["model"], task_groups
+
+
+def _deserialize_node(key, records):
+    try:
+        record = records[key]
+    except KeyError:
+        raise ValueError("Missing queue node %s" % key)
+
+    if isinstance(record, bytes):
+        record = record.decode("utf-8")
+    if isinstance(record, _STRING_TYPES):
+        record = json.loads(record)
+
+    cls = _get_class(record["class"])
+    if not issubclass(cls, queue_model_objects.TaskNode):
+        raise ValueError("%s is not a task node" % record["class"])
+
+    node = cls.__new__(cls)
+    _restore_state(node, record["state"])
+
+    for child_key in record["children"]:
+        child = _deserialize_node(child_key, records)
+        child._parent = node
+        node._children.append(child)
+
+    return node
+
+
+def dumps(model_name, task_groups):
+    """
+    :returns: The queue as a single json document.
+    :rtype: str
+    """
+    header, records = serialize(model_name, task_groups)
+    nodes = ", ".join(
+        "%s: %s" % (json.dumps(key), record) for key, record in records.items()
+    )
+    return '%s, "nodes": {%s}}' % (header[:-1], nodes)
+
+
+def loads(data):
+    """
+    Restores a queue saved with dumps.
+
+    :returns: The model name and the (sample location, TaskGroup) pairs.
+    :rtype: tuple(str, list)
+    """
+    if isinstance(data, bytes):
+        data = data.decode("utf-8")
+    document = json.loads(data)
+    return deserialize(document, document.get("nodes", {}))
+
+
+class QueueSerializer(object):
+    """
+    Serializes a queue incrementally: keeps the records of the last save,
+    encoded but not dumped, and only dumps to json the records that
+    changed since then.
+    """
+
+    def __init__(self):
+        self._saved_records = {}
+
+    def reset(self, records=None):
+        """
+        Forgets the last save, or sets it to <records> after a load.
+        """
+        self._saved_records = {}
+
+        for key, record in (records or {}).items():
+            if isinstance(key, bytes):
+                key = key.decode("utf-8")
+            if isinstance(record, bytes):
+                record = record.decode("utf-8")
+            if isinstance(record, _STRING_TYPES):
+                record = json.loads(record)
+            self._saved_records[key] = record
+
+    def serialize(self, model_name, task_groups):
+        """
+        :returns: The header, the changed records by key and the keys
+                  of the removed records.
+        :rtype: tuple(str, dict, list)
+        """
+        header, records = _encode_queue(model_name, task_groups)
+
+        changed_records = dict(
+            (key, _dumps_record(record))
+            for key, record in records.items()
+            if self._saved_records.get(key) != record
+        )
+        removed_keys = [key for key in self._saved_records if key not in records]
+        self._saved_records = records
+
+        return header, changed_records, removed_keys
+
+    def deserialize(self, header, records):
+        """
+        Restores a queue saved with serialize, <records> become the last
+        save.
+
+        :returns: The model name and the (sample location, TaskGroup) pairs.
+        :rtype: tuple(str, list)
+        """
+        self.reset(records)
+        return deserialize(header, self._saved_records)
@@ -533,13 +533,36 @@ def start_auto(
     return CURRENT_CENTRING
 
 
+def get_loop_image(camera):
+    """Returns a greyscale snapshot of the camera as a numpy array, or None
+       if the camera can only save snapshots to files
+    """
+    try:
+        image = camera.get_snapshot(bw=True, return_as_array=True)
+    except Exception:
+        return None
+    if image is None:
+        return None
+
+    image = numpy.asarray(image)
+    if image.ndim != 2:
+        return None
+    if image.dtype != numpy.uint8:
+        image = numpy.clip(image, 0, 255).astype(numpy.uint8)
+    return image
+
+
 def find_loop(camera, pixelsPerMm_Hor, chi_angle, msg_cb, new_point_cb):
-    snapshot_filename = os.path.join(
-        tempfile.gettempdir(), "mxcube_sample_snapshot.png"
+    image = get_loop_image(camera)
+    if image is None:
+        image = os.path.join(tempfile.gettempdir(), "mxcube_sample_snapshot.png")
+        camera.takeSnapshot(image, bw=True)
+
+    # the image is analysed in a thread, so that the video and the motors
+    # are updated meanwhile
+    info, x, y = gevent.get_hub().threadpool.apply(
+        lucid.find_loop, (image,), {"IterationClosing": 6}
     )
-    camera.takeSnapshot(snapshot_filename, bw=True)
-
-    info, x, y = lucid.find_loop(snapshot_filename, IterationClosing=6)
 
     try:
         x = float(x)
@@ -13,6 +13,8 @@ import weakref
 import sys
 import os
 import time
+import gevent.event
+import gevent.lock
 import gevent.monkey
 from datetime import datetime
 
@@ -49,6 +51,10 @@ def setUserFileDirectory(user_file_directory):
     BaseHardwareObjects.HardwareObjectNode.setUserFileDirectory(user_file_directory)
 
 
+def setXMLCacheDirectory(cache_directory):
+    HardwareObjectFileParser.setCacheDirectory(cache_directory)
+
+
 def setHardwareRepositoryServer(hwrserver):
     global _hwrserver
 
@@ -105,6 +111,11 @@ class __HardwareRepositoryClient:
         self.__connected = False
         self.server = None
         self.hwobj_info_list = []
+        self.loadedHardwareObjects = {}
+        # objects being loaded: name -> (loading greenlet, AsyncResult)
+        self._loading_hwobjs = {}
+        # greenlets waiting for an object being loaded: greenlet -> name
+        self._waiting_greenlets = {}
 
     def connect(self):
         if self.__connected:
@@ -157,32 +168,41 @@ class __HardwareRepositoryClient:
             return
 
     def require(self, mnemonicsList):
-        """Download a list of Hardware Objects in one go"""
-        self.requiredHardwareObjects = {}
+        """Download and load a list of Hardware Objects in one go
 
-        if not self.server:
-            return
+        The objects are loaded with load_hardware_objects, concurrently and
+        in dependency order.
 
-        try:
-            t0 = time.time()
-            mnemonics = ",".join([repr(mne) for mne in mnemonicsList])
-            if len(mnemonics) > 0:
-                self.requiredHardwareObjects = SpecWaitObject.waitReply(
-                    self.server,
-                    "send_msg_cmd_with_return",
-                    ("xml_getall(%s)" % mnemonics,),
-                    timeout=3,
-                )
-                logging.getLogger("HWR").debug(
-                    "Getting %s hardware objects took %s ms."
-                    % (len(self.requiredHardwareObjects), (time.time() - t0) * 1000)
+        :return: dict of loaded Hardware Objects, keyed by name
+        """
+        self.requiredHardwareObjects = {}
+
+        if self.server:
+            try:
+                t0 = time.time()
+                mnemonics = ",".join([repr(mne) for mne in mnemonicsList])
+                if len(mnemonics) > 0:
+                    self.requiredHardwareObjects = SpecWaitObject.waitReply(
+                        self.server,
+                        "send_msg_cmd_with_return",
+                        ("xml_getall(%s)" % mnemonics,),
+                        timeout=3,
+                    )
+                    logging.getLogger("HWR").debug(
+                        "Getting %s hardware objects took %s ms."
+                        % (
+                            len(self.requiredHardwareObjects),
+                            (time.time() - t0) * 1000,
+                        )
+                    )
+            except SpecClientError.SpecClientTimeoutError:
+                logging.getLogger("HWR").error("Timeout loading Hardware Objects")
+            except BaseException:
+                logging.getLogger("HWR").exception(
+                    "Could not execute 'require' on Hardware Repository server"
                 )
-        except SpecClientError.SpecClientTimeoutError:
-            logging.getLogger("HWR").error("Timeout loading Hardware Objects")
-        except BaseException:
-            logging.getLogger("HWR").exception(
-                "Could not execute 'require' on Hardware Repository server"
-            )
+
+        return self.load_hardware_objects(mnemonicsList)
 
     def loadHardwareObject(self, hwobj_name=""):
         """
@@ -230,19 +250,12 @@ class __HardwareRepositoryClient:
                 )
         else:
             xml_data = ""
-            for xml_files_path in self.serverAddress:
-                file_name = (
-                    hwobj_name[1:] if hwobj_name.startswith(os.path.sep) else hwobj_name
-                )
-                file_path = (
-                    os.path.join(xml_files_path, file_name) + os.path.extsep + "xml"
-                )
-                if os.path.exists(file_path):
-                    try:
-                        xml_data = open(file_path, "r").read()
-                    except BaseException:
-                        pass
-                    break
+            file_path = self._find_xml_file(hwobj_name)
+            if file_path is not None:
+                try:
+                    xml_data = open(file_path, "r").read()
+                except BaseException:
+                    pass
 
         start_time = datetime.now()
 
@@ -326,6 +339,162 @@ class __HardwareRepositoryClient:
 
         return hwobj_instance
 
+    def _find_xml_file(self, hwobj_name):
+        """Return the path of the XML file describing a Hardware Object
+
+        :param hwobj_name: name of the Hardware Object, for example '/motors/m0'
+        :return: absolute file path, or None if no file matches
+        """
+        file_name = hwobj_name[1:] if hwobj_name.startswith(os.path.sep) else hwobj_name
+
+        for xml_files_path in self.serverAddress:
+            file_path = os.path.join(xml_files_path, file_name) + os.path.extsep + "xml"
+            if os.path.exists(file_path):
+                return file_path
+
+    def _find_all_hardware_objects(self):
+        """Return the names of all Hardware Objects found in the XML directories"""
+        hwobj_names = []
+
+        for xml_files_path in self.serverAddress:
+            for dir_path, dir_names, file_names in os.walk(xml_files_path):
+                dir_names.sort()
+                for file_name in sorted(file_names):
+                    name, ext = os.path.splitext(file_name)
+                    if ext != os.path.extsep + "xml":
+                        continue
+                    rel_path = os.path.relpath(
+                        os.path.join(dir_path, name), xml_files_path
+                    )
+                    hwobj_name = "/" + rel_path.replace(os.path.sep, "/")
+                    if hwobj_name not in hwobj_names:
+                        hwobj_names.append(hwobj_name)
+
+        return hwobj_names
+
+    def _build_reference_graph(self, hwobj_names):
+        """Build the reference graph of a set of Hardware Objects
+
+        The XML files are only scanned for references, objects are not
+        instantiated. Referenced objects are added to the graph as well.
+
+        :param hwobj_names: list of Hardware Object names
+        :return: dict mapping each Hardware Object name to the list of
+                 Hardware Object names it references
+        """
+        graph = {}
+        to_scan = list(hwobj_names)
+
+        while to_scan:
+            hwobj_name = to_scan.pop()
+            if hwobj_name in graph:
+                continue
+
+            graph[hwobj_name] = []
+            file_path = self._find_xml_file(hwobj_name)
+            if file_path is None:
+                continue
+
+            try:
+                with open(file_path, "r") as xml_file:
+                    references = HardwareObjectFileParser.getReferences(
+                        xml_file.read(), hwobj_name
+                    )
+            except BaseException:
+                # parsing errors are reported when the object is loaded
+                continue
+
+            graph[hwobj_name] = [ref for ref in references if ref != hwobj_name]
+            to_scan.extend(graph[hwobj_name])
+
+        return graph
+
+    def load_hardware_objects(self, hwobj_names=None, pool_size=None):
+        """Load several Hardware Objects concurrently, in dependency order
+
+        The reference graph of all objects is built first from the XML files.
+        Each object is then loaded in its own greenlet, as soon as the
+        objects it references are loaded, so that loading takes the time of
+        the longest chain of references. Objects taking part in a reference
+        cycle are not loaded and are reported in hwobj_info_list.
+
+        :param hwobj_names: list of Hardware Object names to load. If None,
+                            all XML files of the repository are loaded
+        :param pool_size: maximum number of objects initialised concurrently
+                          (None means no limit)
+        :return: dict of loaded Hardware Objects, keyed by name
+        """
+        loaded_hwobjs = {}
+
+        if self.server:
+            # xml files are provided one by one by the server
+            for hwobj_name in hwobj_names or []:
+                loaded_hwobjs[hwobj_name] = self.getHardwareObject(hwobj_name)
+            return loaded_hwobjs
+
+        if hwobj_names is None:
+            hwobj_names = self._find_all_hardware_objects()
+        hwobj_names = [
+            name if name.startswith("/") else "/" + name for name in hwobj_names
+        ]
+
+        graph = self._build_reference_graph(hwobj_names)
+        cyclic_names = self._find_cyclic_references(graph)
+        for hwobj_name in sorted(cyclic_names):
+            logging.getLogger("HWR").error(
+                'Cannot load Hardware Object "%s" : cyclic reference to %s',
+                hwobj_name,
+                ", ".join(sorted(set(graph[hwobj_name]) & cyclic_names)),
+            )
+            self.invalidHardwareObjects.add(hwobj_name)
+            self.hwobj_info_list.append((hwobj_name, "", "0 ms", "Cyclic reference"))
+
+        # objects referencing a cyclic object are loaded without it
+        loaded_events = dict(
+            (name, gevent.event.Event()) for name in graph if name not in cyclic_names
+        )
+        semaphore = gevent.lock.Semaphore(pool_size or len(loaded_events) or 1)
+
+        def load(hwobj_name):
+            try:
+                for ref in graph[hwobj_name]:
+                    if ref in loaded_events:
+                        loaded_events[ref].wait()
+                with semaphore:
+                    hwobj = self.getHardwareObject(hwobj_name)
+                if hwobj is not None:
+                    loaded_hwobjs[hwobj_name] = hwobj
+                    self.loadedHardwareObjects[hwobj_name] = hwobj
+            finally:
+                loaded_events[hwobj_name].set()
+
+        gevent.joinall([gevent.spawn(load, name) for name in sorted(loaded_events)])
+
+        return loaded_hwobjs
+
+    def _find_cyclic_references(self, graph):
+        """Return the names of the Hardware Objects that are part of a cycle
+
+        :param graph: dict mapping names to the set of referenced names
+        :return: set of names belonging to at least one cycle
+        """
+        cyclic_names = set()
+
+        for hwobj_name in graph:
+            visited = set()
+            to_visit = list(graph[hwobj_name])
+            while to_visit:
+                ref = to_visit.pop()
+                if ref == hwobj_name:
+                    cyclic_names.add(hwobj_name)
+                    break
+                if ref in visited or ref not in graph:
+                    continue
+                visited.add(ref)
+                to_visit.extend(graph[ref])
+
+        return cyclic_names
+
     def discardHardwareObject(self, hoName):
         """Remove a Hardware Object from the Hardware Repository
 
@@ -347,6 +516,10 @@ class __HardwareRepositoryClient:
             del self.requiredHardwareObjects[hoName]
         except KeyError:
             pass
+        try:
+            del self.loadedHardwareObjects[hoName]
+        except KeyError:
+            pass
 
         dispatcher.send("hardwareObjectDiscarded", hoName, self)
 
@@ -491,13 +664,58 @@ class __HardwareRepositoryClient:
                 if objectName in self.hardwareObjects:
                     ho = self.hardwareObjects[objectName]
                 else:
-                    ho = self.loadHardwareObject(objectName)
+                    ho = self._load_hardware_object_once(objectName)
                 return ho
         except TypeError as err:
             logging.getLogger("HWR").exception(
                 "could not get Hardware Object %s", objectName
             )
 
+    def _load_hardware_object_once(self, hwobj_name):
+        """Load a Hardware Object, or wait for the greenlet already loading it
+
+        Greenlets requesting an object at the same time get the same
+        instance. When waiting would never end, because the loading greenlet
+        waits in turn for the current one (reference cycle), the object is
+        loaded again as before.
+
+        :param hwobj_name: name of the Hardware Object, for example '/motors/m0'
+        :return: the loaded Hardware Object, or None if it fails
+        """
+        current = gevent.getcurrent()
+        loading = self._loading_hwobjs.get(hwobj_name)
+        if loading is not None:
+            if self._waits_for(loading[0], current):
+                return self.loadHardwareObject(hwobj_name)
+
+            self._waiting_greenlets[current] = hwobj_name
+            try:
+                return loading[1].get()
+            finally:
+                del self._waiting_greenlets[current]
+
+        result = gevent.event.AsyncResult()
+        self._loading_hwobjs[hwobj_name] = (current, result)
+        try:
+            hwobj_instance = self.loadHardwareObject(hwobj_name)
+        except BaseException as ex:
+            result.set_exception(ex)
+            raise
+        else:
+            result.set(hwobj_instance)
+            return hwobj_instance
+        finally:
+            del self._loading_hwobjs[hwobj_name]
+
+    def _waits_for(self, greenlet, other_greenlet):
+        """Return True if greenlet is, or waits for, other_greenlet"""
+        while greenlet is not None:
+            if greenlet is other_greenlet:
+                return True
+            loading = self._loading_hwobjs.get(self._waiting_greenlets.get(greenlet))
+            greenlet = loading[0] if loading is not None else None
+        return False
+
     def getEquipment(self, equipmentName):
         """Return an Equipment given its name (see getHardwareObject())"""
         return self.getHardwareObject(equipmentName)
@@ -695,6 +913,7 @@ class __HardwareRepositoryClient:
         self.endPolling()
 
         self.hardwareObjects = weakref.WeakValueDictionary()
+        self.loadedHardwareObjects = {}
 
     def timerEvent(self, t_ev):
         try:
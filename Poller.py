@@ -1,13 +1,37 @@
-import saferef
+"""Polling of values in the background
+
+All pollers are run by a single scheduler: pollers sharing the same polling
+period are grouped and triggered together from a timer heap, polled calls are
+executed by a small pool of OS threads and value changes are delivered back
+to the gevent loop through one async watcher.
+"""
+
+import collections
+import heapq
+import itertools
+import logging
+import sys
+
 import gevent
 import gevent.monkey
-from gevent import _threading
-from gevent.queue import Queue, Empty
-from gevent.event import Event
 import numpy
 
+import saferef
+from HardwareRepository.TaskUtils import new_async_watcher
+
 POLLERS = {}
 
+# number of OS threads used to execute polled calls
+MAX_WORKERS = 4
+# upper limit (in ms) of the retry period after polling errors
+MAX_ERROR_PERIOD = 30000
+
+_start_new_thread, _allocate_lock = gevent.monkey.get_original(
+    "_thread" if sys.version_info[0] > 2 else "thread",
+    ["start_new_thread", "allocate_lock"],
+)
+_time, _sleep = gevent.monkey.get_original("time", ["time", "sleep"])
+
 
 class _NotInitializedValue:
     pass
@@ -26,6 +50,12 @@ def get_poller(poller_id):
     return POLLERS.get(poller_id)
 
 
+def _call_key(polled_call):
+    if hasattr(polled_call, "__self__") and hasattr(polled_call, "__func__"):
+        return saferef.BoundMethodWeakref.calculate_key(polled_call)
+    return id(polled_call)
+
+
 def poll(
     polled_call,
     polled_call_args=(),
@@ -36,15 +66,13 @@ def poll(
     start_delay=0,
     start_value=NotInitializedValue,
 ):
-    # logging.info(">>>> %s", POLLERS)
-    for _, poller in POLLERS.items():
-        poller_polled_call = poller.polled_call_ref()
-        # logging.info(">>>>> poller.poll_cmd=%s, poll_cmd=%s, poller.args=%s, args=%s", poller_polled_call, polled_call, poller.args, polled_call_args)
-        if poller_polled_call == polled_call and poller.args == polled_call_args:
+    call_key = _call_key(polled_call)
+
+    for poller in _scheduler.get_pollers(call_key):
+        if poller.polled_call_ref() == polled_call and poller.args == polled_call_args:
             poller.set_polling_period(min(polling_period, poller.get_polling_period()))
             return poller
 
-    # logging.info(">>>>> CREATING NEW POLLER for cmd %r, args=%s, polling time=%d", polled_call, polled_call_args, polling_period)
     poller = _Poller(
         polled_call,
         polled_call_args,
@@ -54,11 +82,226 @@ def poll(
         compare,
     )
     poller.old_res = start_value
+    poller.call_key = call_key
     POLLERS[poller.get_id()] = poller
     poller.start_delayed(start_delay)
     return poller
 
 
+class _Signal:
+    """Wakes up a waiting OS thread, even if the thread module is patched"""
+
+    def __init__(self):
+        self.lock = _allocate_lock()
+        self.lock.acquire()
+
+    def notify(self):
+        try:
+            self.lock.release()
+        except Exception:
+            # already notified
+            pass
+
+    def wait(self, timeout=None):
+        if timeout is None:
+            self.lock.acquire()
+            return
+        try:
+            self.lock.acquire(True, timeout)
+        except TypeError:
+            # python 2: no timeout on locks
+            end_time = _time() + timeout
+            while not self.lock.acquire(False) and _time() < end_time:
+                _sleep(0.005)
+
+
+class _PollingGroup:
+    """Pollers sharing the same polling period, triggered together"""
+
+    def __init__(self, polling_period):
+        self.polling_period = polling_period
+        self.pollers = set()
+
+
+class _PollingScheduler:
+    """Runs all pollers from one timer thread and a small worker pool
+
+    Pollers are kept in a registry hashed by polled call. Healthy pollers
+    belong to the group of their polling period. Pollers which are started
+    with a delay, or which failed, are scheduled individually: after an
+    error the poll is retried with an increasing period, up to
+    MAX_ERROR_PERIOD, and the poller goes back to its group on success.
+    """
+
+    def __init__(self, max_workers=MAX_WORKERS):
+        self.max_workers = max_workers
+        self.lock = _allocate_lock()
+        self.registry = collections.defaultdict(list)
+        self.groups = {}
+        self.heap = []
+        self.counter = itertools.count()
+        self.timer_signal = _Signal()
+        self.timer_started = False
+        self.tasks = collections.deque()
+        self.workers = 0
+        self.idle_workers = []
+        self.events = collections.deque()
+        self.async_watcher = None
+
+    def get_pollers(self, call_key):
+        with self.lock:
+            return list(self.registry.get(call_key, ()))
+
+    def add(self, poller, delay=0):
+        with self.lock:
+            if self.async_watcher is None:
+                self.async_watcher = new_async_watcher()
+                self.async_watcher.start(self.deliver_events)
+            if not self.timer_started:
+                self.timer_started = True
+                _start_new_thread(self.run_timer, ())
+
+            # first poll is scheduled individually, the poller joins
+            # the group of its polling period once it succeeded
+            self.registry[poller.call_key].append(poller)
+            self._schedule(poller, _time() + delay / 1000.0)
+
+    def remove(self, poller):
+        with self.lock:
+            self._leave_group(poller)
+            pollers = self.registry.get(poller.call_key, [])
+            if poller in pollers:
+                pollers.remove(poller)
+                if not pollers:
+                    del self.registry[poller.call_key]
+
+    def change_polling_period(self, poller, polling_period):
+        with self.lock:
+            in_group = poller.group is not None
+            self._leave_group(poller)
+            poller.polling_period = polling_period
+            if in_group:
+                self._join_group(poller)
+
+    def _schedule(self, target, due_time):
+        heapq.heappush(self.heap, (due_time, next(self.counter), target))
+        self.timer_signal.notify()
+
+    def _join_group(self, poller):
+        group = self.groups.get(poller.polling_period)
+        if group is None:
+            group = _PollingGroup(poller.polling_period)
+            self.groups[poller.polling_period] = group
+            self._schedule(group, _time())
+        group.pollers.add(poller)
+        poller.group = group
+
+    def _leave_group(self, poller):
+        group = poller.group
+        if group is not None:
+            group.pollers.discard(poller)
+            if not group.pollers and self.groups.get(group.polling_period) is group:
+                del self.groups[group.polling_period]
+            poller.group = None
+
+    def run_timer(self):
+        while True:
+            with self.lock:
+                timeout = self._run_due_targets()
+            self.timer_signal.wait(timeout)
+
+    def _run_due_targets(self):
+        """Submit the due pollers, return the time to wait for the next one"""
+        now = _time()
+
+        while self.heap:
+            due_time, _, target = self.heap[0]
+            if due_time > now:
+                return due_time - now
+            heapq.heappop(self.heap)
+
+            if isinstance(target, _PollingGroup):
+                if self.groups.get(target.polling_period) is not target:
+                    # group has been emptied in the meantime
+                    continue
+                for poller in target.pollers:
+                    self._submit(poller)
+                due_time += target.polling_period / 1000.0
+                heapq.heappush(
+                    self.heap, (max(due_time, now), next(self.counter), target)
+                )
+            elif not target.is_stopped():
+                self._submit(target)
+
+    def _submit(self, poller):
+        if poller.running:
+            # previous call not finished yet: skip this cycle
+            return
+        poller.running = True
+        self.tasks.append(poller)
+
+        if self.idle_workers:
+            self.idle_workers.pop().notify()
+        elif self.workers < self.max_workers:
+            self.workers += 1
+            _start_new_thread(self.run_worker, ())
+
+    def run_worker(self):
+        signal = _Signal()
+
+        while True:
+            with self.lock:
+                try:
+                    poller = self.tasks.popleft()
+                except IndexError:
+                    poller = None
+                    self.idle_workers.append(signal)
+
+            if poller is None:
+                signal.wait()
+                continue
+
+            try:
+                succeeded = poller.poll_once()
+            except BaseException:
+                logging.getLogger("HWR").exception("Unexpected error in poller")
+                succeeded = False
+
+            with self.lock:
+                poller.running = False
+                if poller.is_stopped():
+                    continue
+                if succeeded:
+                    if poller.group is None:
+                        self._join_group(poller)
+                else:
+                    self._leave_group(poller)
+                    self._schedule(poller, _time() + poller.get_error_period() / 1000.0)
+
+    def send_event(self, poller, res):
+        self.events.append((poller, res))
+        self.async_watcher.send()
+
+    def deliver_events(self):
+        while True:
+            try:
+                poller, res = self.events.popleft()
+            except IndexError:
+                break
+
+            if isinstance(res, PollingException):
+                cb = poller.error_callback_ref()
+                if cb is not None:
+                    gevent.spawn(cb, res.original_exception, res.poller_id)
+            else:
+                cb = poller.value_changed_callback_ref()
+                if cb is not None:
+                    gevent.spawn(cb, res)
+
+
+_scheduler = _PollingScheduler()
+
+
 class _Poller:
     def __init__(
         self,
@@ -70,27 +313,30 @@ class _Poller:
         compare=True,
     ):
         self.polled_call_ref = saferef.safe_ref(polled_call)
+        self.call_key = _call_key(polled_call)
         self.args = polled_call_args
         self.polling_period = polling_period
         self.value_changed_callback_ref = saferef.safe_ref(value_changed_callback)
         self.error_callback_ref = saferef.safe_ref(error_callback)
         self.compare = compare
         self.old_res = NotInitializedValue
-        self.queue = _threading.Queue()  # Queue.Queue()
         self.delay = 0
-        self.stop_event = Event()
-        self.async_watcher = gevent.get_hub().loop.async()
+        self.group = None
+        self.running = False
+        self.error_count = 0
+        self.stopped = False
 
     def start_delayed(self, delay):
         self.delay = delay
-        _threading.start_new_thread(self.run, ())  # self.start()
+        _scheduler.add(self, delay)
 
     def stop(self):
-        self.stop_event.set()
-        del POLLERS[self.get_id()]
+        self.stopped = True
+        _scheduler.remove(self)
+        POLLERS.pop(self.get_id(), None)
 
     def is_stopped(self):
-        return self.stop_event.is_set()
+        return self.stopped
 
     def get_id(self):
         return id(self)
@@ -99,8 +345,14 @@ class _Poller:
         return self.polling_period
 
     def set_polling_period(self, polling_period):
-        # logging.info(">>>>> CHANGIG POLLING PERIOD TO %d", polling_period)
-        self.polling_period = polling_period
+        if polling_period != self.polling_period:
+            _scheduler.change_polling_period(self, polling_period)
+
+    def get_error_period(self):
+        """Return the retry period (in ms) after consecutive polling errors"""
+        return min(
+            self.polling_period * 2 ** min(self.error_count, 16), MAX_ERROR_PERIOD
+        )
 
     def restart(self, delay=0):
         self.stop()
@@ -120,80 +372,50 @@ class _Poller:
                 start_value=self.old_res,
             )
 
-    def new_event(self):
-        while True:
-            try:
-                res = Queue().get_nowait()
-            except Empty:
-                break
-
-            if isinstance(res, PollingException):
-                cb = self.error_callback_ref()
-                if cb is not None:
-                    gevent.spawn(cb, res.original_exception, res.poller_id)
-            else:
-                cb = self.value_changed_callback_ref()
-                if cb is not None:
-                    gevent.spawn(cb, res)
-
-    def run(self):
-        sleep = gevent.monkey._get_original("time", ["sleep"])[0]
-
-        self.async_watcher.start(self.new_event)
-        err_callback_args = None
-        error_cb = None
-        first_run = True
+    def poll_once(self):
+        """Execute the polled call once (from a worker thread)
 
-        while not self.stop_event.is_set():
-            if first_run and self.delay:
-                sleep(self.delay / 1000.0)
-            first_run = False
-
-            if self.stop_event.is_set():
-                break
-
-            polled_call = self.polled_call_ref()
-            if polled_call is None:
-                break
-
-            try:
-                res = polled_call(*self.args)
-            except Exception as e:
-                if self.stop_event.is_set():
-                    break
-                error_cb = self.error_callback_ref()
-                if error_cb is not None:
-                    self.queue.put(PollingException(e, self.get_id()))
-                break
-
-            del polled_call
-
-            if self.stop_event.is_set():
-                break
-
-            if isinstance(res, numpy.ndarray):  # for arrays
-                comparison = res == self.old_res
-                if isinstance(comparison, bool):
-                    is_equal = comparison
-                else:
-                    is_equal = all(comparison)
-            else:
-                is_equal = res == self.old_res
-
-            if self.compare and is_equal:
-                # do nothing: previous value is the same as "new" value
-                pass
+        Returns:
+            bool: False if the polled call raised an exception
+        """
+        polled_call = self.polled_call_ref()
+        if polled_call is None:
+            self.stop()
+            return True
+
+        try:
+            res = polled_call(*self.args)
+        except Exception as e:
+            if self.stopped:
+                return True
+            self.error_count += 1
+            # report only the first error, then retry silently
+            if self.error_count == 1 and self.error_callback_ref() is not None:
+                _scheduler.send_event(self, PollingException(e, self.get_id()))
+            # make sure the value is sent again once polling works again
+            self.old_res = NotInitializedValue
+            return False
+
+        del polled_call
+        self.error_count = 0
+
+        if self.stopped:
+            return True
+
+        if isinstance(res, numpy.ndarray):  # for arrays
+            comparison = res == self.old_res
+            if isinstance(comparison, bool):
+                is_equal = comparison
             else:
-                new_value = True
-                if self.compare:
-                    new_value = not is_equal
-
-                if new_value:
-                    self.old_res = res
-                    self.queue.put(res)
-                    self.async_watcher.send()
-
-            sleep(self.polling_period / 1000.0)
-
-        if error_cb is not None:
-            self.async_watcher.send()
+                is_equal = all(comparison)
+        else:
+            is_equal = res == self.old_res
+
+        if self.compare and is_equal:
+            # do nothing: previous value is the same as "new" value
+            pass
+        else:
+            self.old_res = res
+            _scheduler.send_event(self, res)
+
+        return True
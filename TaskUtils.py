@@ -137,3 +137,16 @@ def task(func):
             raise
 
     return start_task
+
+
+def new_async_watcher():
+    """
+    :returns: A watcher of the gevent loop, to wake up the loop from
+              other OS threads with its send method.
+    """
+    loop = gevent.get_hub().loop
+    try:
+        return loop.async_()
+    except AttributeError:
+        # gevent < 1.3 on python 2
+        return getattr(loop, "async")()
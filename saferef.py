@@ -2,7 +2,6 @@
 
 import weakref
 import traceback
-import collections
 
 
 def safe_ref(target, on_delete=None):
@@ -17,17 +16,13 @@ def safe_ref(target, on_delete=None):
       scope with the reference object, (either a weakref or a
       BoundMethodWeakref) as argument.
     """
-    if hasattr(target, "im_self"):
+    if hasattr(target, "__self__") and hasattr(target, "__func__"):
         if target.__self__ is not None:
             # Turn a bound method into a BoundMethodWeakref instance.
             # Keep track of these instances for lookup by disconnect().
-            assert hasattr(target, "im_func"), (
-                "safe_ref target %r has im_self, but no im_func, "
-                "don't know how to create reference" % target
-            )
             reference = BoundMethodWeakref(target=target, on_delete=on_delete)
             return reference
-    if isinstance(on_delete, collections.Callable):
+    if callable(on_delete):
         return weakref.ref(target, on_delete)
     else:
         return weakref.ref(target)
@@ -118,7 +113,7 @@ class BoundMethodWeakref(object):
                 pass
             for function in methods:
                 try:
-                    if isinstance(function, collections.Callable):
+                    if callable(function):
                         function(self)
                 except Exception:
                     try:
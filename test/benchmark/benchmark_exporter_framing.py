@@ -0,0 +1,101 @@
+"""Benchmark of the Exporter STX/ETX stream framing
+
+Synthetic multi-megabyte messages are sent through a local socket pair,
+standing in for an MD2/MD3 Exporter server, and split into messages with
+StandardClient.FrameParser. The previous byte by byte parser is run on the
+same stream for comparison.
+
+Usage: python benchmark_exporter_framing.py [message size in MB] [messages]
+"""
+import os
+import socket
+import sys
+import threading
+import time
+
+sys.path.insert(
+    0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", ".."))
+)
+
+from HardwareRepository.Command.embl.StandardClient import (
+    FrameParser,
+    MAX_SIZE_STREAM_MSG,
+    RECV_BUFFER_SIZE,
+)
+
+STX = b"\x02"
+ETX = b"\x03"
+
+
+def byte_by_byte_parser(max_size):
+    """Previous parser of StandardClient.recv_thread"""
+    state = {"buffer": "", "stx": False}
+
+    def feed(data):
+        messages = []
+        for b in data.decode("latin-1"):
+            if b == "\x02":
+                state["buffer"] = ""
+                state["stx"] = True
+            elif b == "\x03":
+                if state["stx"]:
+                    messages.append(state["buffer"])
+                    state["stx"] = False
+                    state["buffer"] = ""
+            elif state["stx"]:
+                state["buffer"] = state["buffer"] + b
+        if len(state["buffer"]) > max_size:
+            state["stx"] = False
+            state["buffer"] = ""
+        return messages
+
+    return feed
+
+
+def run(feed, message_size, message_count):
+    server, client = socket.socketpair()
+    values = [b"%.4f" % (i * 0.5) for i in range(message_size // 10)]
+    payload = b"RET:" + b"\x1f".join(values)
+
+    def send():
+        for _ in range(message_count):
+            server.sendall(STX + payload + ETX)
+        server.close()
+
+    sender = threading.Thread(target=send)
+    start_time = time.time()
+    sender.start()
+
+    received = 0
+    while True:
+        data = client.recv(RECV_BUFFER_SIZE)
+        if not data:
+            break
+        for message in feed(data):
+            assert len(message) == len(payload)
+            received += 1
+    sender.join()
+    client.close()
+
+    assert received == message_count
+    return time.time() - start_time, len(payload)
+
+
+if __name__ == "__main__":
+    size = int(float(sys.argv[1]) * 1e6) if len(sys.argv) > 1 else 4000000
+    count = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+
+    # both parsers with the message size limit of StandardClient.recv_thread
+    duration, length = run(FrameParser(MAX_SIZE_STREAM_MSG).feed, size, count)
+    print(
+        "FrameParser:   %d messages of %.1f MB in %.3f s (%.1f MB/s)"
+        % (count, length / 1e6, duration, count * length / 1e6 / duration)
+    )
+
+    # the byte by byte parser is too slow for the full stream
+    small_size = min(size, 200000)
+    duration, length = run(byte_by_byte_parser(MAX_SIZE_STREAM_MSG), small_size, 2)
+    print(
+        "byte by byte:  %d messages of %.1f MB in %.3f s (%.1f MB/s)"
+        % (2, length / 1e6, duration, 2 * length / 1e6 / duration)
+    )
@@ -0,0 +1,185 @@
+"""Benchmark of the ISPyB web service clients
+
+A local stub SOAP server, serving a small WSDL with a storeOrUpdateImage
+operation, stands in for ISPyB. The per call latency is measured for:
+- a new suds client without WSDL cache per call, as previously done by
+  the ISPyBClient *_from_workflow_info methods,
+- a new suds client per call using the WSDL cache of ISPyBClient,
+- the long lived client of ISPyBClient.get_ws_client, with its
+  persistent connection.
+
+Usage: python benchmark_ispyb_client.py [calls]
+"""
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(
+    0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", ".."))
+)
+
+try:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+except ImportError:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+
+from suds.client import Client
+
+from HardwareRepository.HardwareObjects import ISPyBClient
+
+NAMESPACE = "http://ispyb.ejb3.webservices.collection"
+
+WSDL = """<?xml version="1.0" encoding="UTF-8"?>
+<definitions name="ToolsForCollectionWebService" targetNamespace="%(ns)s"
+    xmlns="http://schemas.xmlsoap.org/wsdl/"
+    xmlns:soap="http://schemas.xmlsoap.org/wsdl/soap/"
+    xmlns:tns="%(ns)s" xmlns:xs="http://www.w3.org/2001/XMLSchema">
+  <types>
+    <xs:schema targetNamespace="%(ns)s" elementFormDefault="unqualified">
+      <xs:complexType name="image">
+        <xs:sequence>
+          <xs:element name="dataCollectionId" type="xs:int" minOccurs="0"/>
+          <xs:element name="fileName" type="xs:string" minOccurs="0"/>
+          <xs:element name="imageNumber" type="xs:int" minOccurs="0"/>
+        </xs:sequence>
+      </xs:complexType>
+      <xs:element name="storeOrUpdateImage">
+        <xs:complexType><xs:sequence>
+          <xs:element name="arg0" type="tns:image" minOccurs="0"/>
+        </xs:sequence></xs:complexType>
+      </xs:element>
+      <xs:element name="storeOrUpdateImageResponse">
+        <xs:complexType><xs:sequence>
+          <xs:element name="return" type="xs:int" minOccurs="0"/>
+        </xs:sequence></xs:complexType>
+      </xs:element>
+    </xs:schema>
+  </types>
+  <message name="storeOrUpdateImage">
+    <part name="parameters" element="tns:storeOrUpdateImage"/>
+  </message>
+  <message name="storeOrUpdateImageResponse">
+    <part name="parameters" element="tns:storeOrUpdateImageResponse"/>
+  </message>
+  <portType name="ToolsForCollectionWebService">
+    <operation name="storeOrUpdateImage">
+      <input message="tns:storeOrUpdateImage"/>
+      <output message="tns:storeOrUpdateImageResponse"/>
+    </operation>
+  </portType>
+  <binding name="ToolsForCollectionWebServiceBinding"
+      type="tns:ToolsForCollectionWebService">
+    <soap:binding style="document" transport="http://schemas.xmlsoap.org/soap/http"/>
+    <operation name="storeOrUpdateImage">
+      <soap:operation soapAction=""/>
+      <input><soap:body use="literal"/></input>
+      <output><soap:body use="literal"/></output>
+    </operation>
+  </binding>
+  <service name="ToolsForCollectionWebService">
+    <port name="ToolsForCollectionWebServicePort"
+        binding="tns:ToolsForCollectionWebServiceBinding">
+      <soap:address location="%(url)s"/>
+    </port>
+  </service>
+</definitions>
+"""
+
+RESPONSE = """<?xml version="1.0" encoding="UTF-8"?>
+<soap:Envelope xmlns:soap="http://schemas.xmlsoap.org/soap/envelope/">
+  <soap:Body>
+    <ns2:storeOrUpdateImageResponse xmlns:ns2="%s">
+      <return>42</return>
+    </ns2:storeOrUpdateImageResponse>
+  </soap:Body>
+</soap:Envelope>
+""" % NAMESPACE
+
+
+class StubServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # send headers and body at once, as application servers do
+    wbufsize = -1
+
+    def do_GET(self):
+        self.reply(WSDL % {"ns": NAMESPACE, "url": self.server.url})
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers["Content-Length"]))
+        self.reply(RESPONSE)
+
+    def reply(self, body):
+        body = body.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/xml; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def store_image(client):
+    image = client.factory.create("image")
+    image.dataCollectionId = 1
+    image.fileName = "test_1_0001.cbf"
+    image.imageNumber = 1
+    assert client.service.storeOrUpdateImage(image) == 42
+
+
+def timed_calls(num_calls, get_client):
+    start = time.time()
+    for _ in range(num_calls):
+        store_image(get_client())
+    return (time.time() - start) / num_calls * 1000
+
+
+def main():
+    num_calls = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+
+    server = StubServer(("127.0.0.1", 0), StubHandler)
+    server.url = "http://127.0.0.1:%d/ToolsForCollectionWebService" % (
+        server.server_address[1]
+    )
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    wsdl_url = server.url + "?wsdl"
+
+    cache_directory = tempfile.mkdtemp()
+    lims_client = ISPyBClient.ISPyBClient("lims")
+    lims_client.getProperty = lambda name, default=None: {
+        "wsdl_cache_directory": cache_directory
+    }.get(name, default)
+
+    try:
+        no_cache = timed_calls(num_calls, lambda: Client(wsdl_url, cache=None))
+        cached_wsdl = timed_calls(
+            num_calls,
+            lambda: Client(
+                wsdl_url, cache=lims_client.get_wsdl_cache(), cachingpolicy=1
+            ),
+        )
+        long_lived = timed_calls(num_calls, lambda: lims_client.get_ws_client(wsdl_url))
+    finally:
+        server.shutdown()
+        shutil.rmtree(cache_directory)
+
+    print("ms per call, %d calls" % num_calls)
+    print("new client, no WSDL cache: %.2f" % no_cache)
+    print("new client, WSDL cache:    %.2f" % cached_wsdl)
+    print("long lived client:         %.2f" % long_lived)
+
+
+if __name__ == "__main__":
+    main()
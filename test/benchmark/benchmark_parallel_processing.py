@@ -0,0 +1,155 @@
+"""Benchmark of the ingestion of parallel processing results
+
+Feeds synthetic Dozor batches of a mesh scan, as sent by EDNA, to
+DozorParallelProcessing.batch_processed: the results are stored with
+set_batch_results and scattered to the grid cells with align_mesh_results.
+The same batches are fed to a subclass storing and aligning them one frame
+and one cell at a time, as previously done, for comparison. Both must give
+the same aligned results.
+
+Usage: python benchmark_parallel_processing.py [cols] [rows] [batch size]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(
+    0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", ".."))
+)
+
+import numpy
+
+from HardwareRepository.HardwareObjects.GenericParallelProcessing import (
+    GenericParallelProcessing,
+    DEFAULT_SCORE_NAME_LIST,
+)
+from HardwareRepository.HardwareObjects.DozorParallelProcessing import (
+    DozorParallelProcessing,
+)
+
+
+class SyntheticGrid(object):
+    """Horizontal mesh scanned line by line with reversing rotation"""
+
+    def __init__(self, num_cols, num_rows):
+        self.num_cols = num_cols
+        self.num_rows = num_rows
+
+    def get_properties(self):
+        return {"first_image_num": 1}
+
+    def get_col_row_from_image_serial(self, image_serial):
+        row, col = divmod(image_serial - 1, self.num_cols)
+        if row % 2:
+            col = self.num_cols - 1 - col
+        return col, row
+
+    def get_col_row_table(self):
+        image_index = numpy.arange(self.num_cols * self.num_rows)
+        row, col = numpy.divmod(image_index, self.num_cols)
+        col = numpy.where(row % 2, self.num_cols - 1 - col, col)
+        return col, row
+
+    def set_score(self, score):
+        self.score = score
+
+    def get_motor_pos_from_col_row(self, col, row):
+        return {"phiy": col, "phiz": row}
+
+
+def new_processing(grid, processing_class=GenericParallelProcessing):
+    processing = processing_class("parallel-processing")
+    images_num = grid.num_cols * grid.num_rows
+    processing.grid = grid
+    processing.params_dict = {
+        "first_image_num": 1,
+        "images_num": images_num,
+        "lines_num": grid.num_rows,
+        "steps_y": grid.num_rows,
+        "template": "mesh_%d_%05d.cbf",
+        "run_number": 1,
+    }
+    processing.started = True
+    processing.results_raw = {}
+    processing.results_aligned = {}
+    for result_name in DEFAULT_SCORE_NAME_LIST:
+        processing.results_raw[result_name] = numpy.zeros(images_num)
+        processing.results_aligned[result_name] = numpy.zeros(
+            (grid.num_cols, grid.num_rows)
+        )
+    return processing
+
+
+def synthetic_batches(images_num, batch_size):
+    """Dozor batches: image number, spots, ?, resolution, score"""
+    batches = []
+    for first_image in range(1, images_num + 1, batch_size):
+        last_image = min(first_image + batch_size, images_num + 1)
+        image_num = numpy.arange(first_image, last_image)
+        score = numpy.random.random(image_num.size)
+        batches.append(
+            numpy.column_stack(
+                (
+                    image_num,
+                    numpy.random.randint(0, 200, image_num.size),
+                    numpy.zeros(image_num.size),
+                    1.5 + numpy.random.random(image_num.size),
+                    score,
+                )
+            ).tolist()
+        )
+    return batches
+
+
+class PreviousDozorParallelProcessing(DozorParallelProcessing):
+    """Previous ingestion, one frame and one cell at a time"""
+
+    def set_batch_results(self, image_index, batch_results):
+        for result_name, values in batch_results.items():
+            for index, value in zip(image_index, values):
+                self.results_raw[result_name][index] = value
+
+    def align_mesh_results(self, image_index):
+        for score_key in self.results_raw.keys():
+            for cell_index in image_index:
+                col, row = self.grid.get_col_row_from_image_serial(
+                    cell_index + self.params_dict["first_image_num"]
+                )
+                if (
+                    col < self.results_aligned[score_key].shape[0]
+                    and row < self.results_aligned[score_key].shape[1]
+                ):
+                    self.results_aligned[score_key][col][row] = self.results_raw[
+                        score_key
+                    ][cell_index]
+
+
+def main(num_cols=200, num_rows=200, batch_size=500):
+    grid = SyntheticGrid(num_cols, num_rows)
+    batches = synthetic_batches(num_cols * num_rows, batch_size)
+
+    results = {}
+    for name, processing_class in (
+        ("previous", PreviousDozorParallelProcessing),
+        ("vectorised", DozorParallelProcessing),
+    ):
+        processing = new_processing(grid, processing_class)
+        start_time = time.time()
+        for batch in batches:
+            processing.batch_processed(batch)
+        duration = time.time() - start_time
+        results[name] = processing.results_aligned
+
+        print(
+            "%-10s %d batches of %d frames: %.2f ms per batch"
+            % (name, len(batches), batch_size, 1000 * duration / len(batches))
+        )
+
+    for result_name in DEFAULT_SCORE_NAME_LIST:
+        assert numpy.array_equal(
+            results["previous"][result_name], results["vectorised"][result_name]
+        )
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:]])
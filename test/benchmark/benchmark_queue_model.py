@@ -0,0 +1,112 @@
+"""Benchmark of the QueueModel indexes
+
+Builds a mail-in like queue of samples with a few data collections each
+through queue_model_objects. Every data collection gets its run number
+from QueueModel.get_next_run_number and is checked with
+check_for_path_collisions before being added, as done when the queue is
+filled from the GUI. The previous full tree walks are timed on the
+resulting queue for comparison.
+
+Usage: python benchmark_queue_model.py [samples] [collections per sample]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(
+    0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", ".."))
+)
+
+from HardwareRepository.HardwareObjects import queue_model_objects
+from HardwareRepository.HardwareObjects.QueueModel import QueueModel
+
+
+def tree_walk_next_run_number(queue_model, new_path_template):
+    """Previous QueueModel.get_next_run_number"""
+    run_numbers = [0]
+    for node, path_template in queue_model.get_path_templates():
+        if path_template is not new_path_template:
+            if path_template == new_path_template:
+                run_numbers.append(path_template.run_number)
+    return max(run_numbers) + 1
+
+
+def tree_walk_path_collisions(queue_model, new_path_template):
+    """Previous QueueModel.check_for_path_collisions"""
+    for node, path_template in queue_model.get_path_templates():
+        if path_template is not new_path_template:
+            if new_path_template.intersection(path_template):
+                return True
+    return False
+
+
+def build_queue(num_samples, num_collections):
+    queue_model = QueueModel("queue-model")
+    root = queue_model.get_model_root()
+
+    for sample_index in range(num_samples):
+        sample = queue_model_objects.Sample()
+        sample.set_name("sample-%d" % sample_index)
+        queue_model.add_child(root, sample)
+        group = queue_model_objects.TaskGroup()
+        queue_model.add_child(sample, group)
+
+        for _ in range(num_collections):
+            dc = queue_model_objects.DataCollection()
+            path_template = dc.acquisitions[0].path_template
+            path_template.directory = "/data/mail-in/sample-%d" % (sample_index % 50)
+            path_template.base_prefix = "sample-%d" % sample_index
+            path_template.start_num = 1
+            path_template.num_files = 100
+            path_template.run_number = queue_model.get_next_run_number(path_template)
+            assert not queue_model.check_for_path_collisions(path_template)
+            queue_model.add_child(group, dc)
+
+    return queue_model
+
+
+def main():
+    num_samples = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    num_collections = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+
+    start = time.time()
+    queue_model = build_queue(num_samples, num_collections)
+    build_time = time.time() - start
+    print(
+        "built queue of %d samples, %d data collections in %.3f s"
+        % (num_samples, num_samples * num_collections, build_time)
+    )
+
+    path_templates = [pt for node, pt in queue_model.get_path_templates()]
+    node_ids = [node._node_id for node in queue_model.get_nodes()]
+
+    start = time.time()
+    for path_template in path_templates:
+        queue_model.get_next_run_number(path_template)
+        queue_model.check_for_path_collisions(path_template)
+    indexed_time = time.time() - start
+
+    # the tree walk is quadratic, only time a sample of the lookups
+    sample_templates = path_templates[:: max(1, len(path_templates) // 100)]
+    start = time.time()
+    for path_template in sample_templates:
+        tree_walk_next_run_number(queue_model, path_template)
+        tree_walk_path_collisions(queue_model, path_template)
+    tree_walk_time = (time.time() - start) * len(path_templates) / len(
+        sample_templates
+    )
+
+    start = time.time()
+    for node_id in node_ids:
+        assert queue_model.get_node(node_id) is not None
+    get_node_time = time.time() - start
+
+    print(
+        "%d run number and collision checks: indexed %.3f s, tree walk %.3f s"
+        % (len(path_templates), indexed_time, tree_walk_time)
+    )
+    print("%d get_node lookups: %.3f s" % (len(node_ids), get_node_time))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""Benchmark of the queue persistence format
+
+Builds a queue of task groups with data collections through
+queue_model_objects and times the save and load of it with
+queue_model_serializer, checking that it round trips. The previous
+format, repr of jsonpickled task groups read back with eval, is timed on
+the same queue for comparison, as well as an incremental save after one
+data collection changed.
+
+Usage: python benchmark_queue_serializer.py [samples] [collections per sample]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(
+    0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", ".."))
+)
+
+import jsonpickle
+
+from HardwareRepository.HardwareObjects import queue_model_objects
+from HardwareRepository.HardwareObjects import queue_model_serializer
+
+
+def build_task_groups(num_samples, num_collections):
+    task_groups = []
+    node_id = 0
+
+    for sample_index in range(num_samples):
+        group = queue_model_objects.TaskGroup()
+        node_id += 1
+        group._node_id = node_id
+
+        for run_number in range(1, num_collections + 1):
+            dc = queue_model_objects.DataCollection()
+            node_id += 1
+            dc._node_id = node_id
+            path_template = dc.acquisitions[0].path_template
+            path_template.directory = "/data/mail-in/sample-%d" % sample_index
+            path_template.base_prefix = "sample-%d" % sample_index
+            path_template.run_number = run_number
+            path_template.num_files = 100
+            dc.acquisitions[0].acquisition_parameters.centred_position = (
+                queue_model_objects.CentredPosition({"phi": float(run_number)})
+            )
+            dc._parent = group
+            group._children.append(dc)
+
+        task_groups.append(((sample_index // 10 + 1, sample_index % 10 + 1), group))
+
+    return task_groups
+
+
+def legacy_dumps(model_name, task_groups):
+    items = [
+        {
+            "sample_location": location,
+            "task_group_entry": jsonpickle.encode(task_group),
+        }
+        for location, task_group in task_groups
+    ]
+    return repr((model_name, items))
+
+
+def legacy_loads(data):
+    model_name, items = eval(data)
+    return (
+        model_name,
+        [
+            (item["sample_location"], jsonpickle.decode(item["task_group_entry"]))
+            for item in items
+        ],
+    )
+
+
+def timed(func, *args):
+    start = time.time()
+    result = func(*args)
+    return result, time.time() - start
+
+
+def main():
+    num_samples = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    num_collections = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+
+    task_groups = build_task_groups(num_samples, num_collections)
+    num_nodes = num_samples * (num_collections + 1)
+
+    data, dump_time = timed(queue_model_serializer.dumps, "ispyb", task_groups)
+    (model_name, loaded), load_time = timed(queue_model_serializer.loads, data)
+    assert model_name == "ispyb" and len(loaded) == len(task_groups)
+    for (location, group), (new_location, new_group) in zip(task_groups, loaded):
+        assert location == new_location
+        for dc, new_dc in zip(group.get_children(), new_group.get_children()):
+            path_template = dc.acquisitions[0].path_template
+            new_path_template = new_dc.acquisitions[0].path_template
+            assert path_template == new_path_template
+            assert path_template.run_number == new_path_template.run_number
+
+    legacy_data, legacy_dump_time = timed(legacy_dumps, "ispyb", task_groups)
+    _, legacy_load_time = timed(legacy_loads, legacy_data)
+
+    print("queue of %d nodes" % num_nodes)
+    print(
+        "queue_model_serializer: save %.3f s, load %.3f s, %.1f MB"
+        % (dump_time, load_time, len(data) / 1e6)
+    )
+    print(
+        "repr/jsonpickle/eval:   save %.3f s, load %.3f s, %.1f MB"
+        % (legacy_dump_time, legacy_load_time, len(legacy_data) / 1e6)
+    )
+
+    serializer = queue_model_serializer.QueueSerializer()
+    serializer.serialize("ispyb", task_groups)
+    task_groups[0][1].get_children()[0].acquisitions[0].path_template.num_files = 50
+    (header, changed_records, removed_keys), save_time = timed(
+        serializer.serialize, "ispyb", task_groups
+    )
+    print(
+        "incremental save: %d of %d records written, %.3f s"
+        % (len(changed_records), num_nodes, save_time)
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""Benchmark of the XML-RPC server with the Dozor results sent by EDNA
+
+Starts the xml-rpc-server of the mockup configuration and sends it Dozor
+batches with dozor_batch_processed, as EDNA does during a mesh scan:
+- with a new connection for each call, as with the previous HTTP/1.0 server;
+- on a single kept alive connection;
+- grouped with system.multicall.
+The results must reach the parallel processing hardware object. Fast calls
+are then timed while another client waits in a slow method.
+
+Usage: python benchmark_xmlrpc_server.py [calls] [multicall size]
+"""
+from gevent import monkey
+
+monkey.patch_all(thread=False)
+
+import os
+import sys
+import time
+
+sys.path.insert(
+    0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", ".."))
+)
+
+import gevent
+import numpy
+
+if sys.version_info > (3, 0):
+    from xmlrpc.client import MultiCall, ServerProxy
+else:
+    from xmlrpclib import MultiCall, ServerProxy
+
+from HardwareRepository import HardwareRepository
+from HardwareRepository.HardwareObjects.DozorParallelProcessing import (
+    DozorParallelProcessing,
+)
+from benchmark_parallel_processing import SyntheticGrid, new_processing
+
+HWR_PATH = os.path.abspath(
+    os.path.join(os.path.dirname(__file__), "..", "..", "configuration", "xml-qt")
+)
+BATCH_SIZE = 10
+GRID_SIZE = 250
+
+
+class BeamlineSetup(object):
+    """Replaces the beamline setup when it cannot be loaded here"""
+
+    parallel_processing_hwobj = None
+
+
+def get_server():
+    hwr = HardwareRepository.getHardwareRepository(HWR_PATH)
+    hwr.connect()
+    server = hwr.getHardwareObject("xml-rpc-server")
+    if not hasattr(server, "_server"):
+        raise RuntimeError("XML-RPC server did not start, see the HWR log")
+
+    if server.beamline_setup_hwobj is None:
+        server.beamline_setup_hwobj = BeamlineSetup()
+    # a Dozor processing of a grid large enough for all the batches
+    grid = SyntheticGrid(GRID_SIZE, GRID_SIZE)
+    processing = new_processing(grid, DozorParallelProcessing)
+    server.beamline_setup_hwobj.parallel_processing_hwobj = processing
+    server._server.register_function(gevent.sleep, "benchmark_sleep")
+    return server, processing
+
+
+def dozor_batches(calls):
+    """Dozor batches: image number, spots, ?, resolution, score"""
+    batches = []
+    for first_image in range(1, calls * BATCH_SIZE + 1, BATCH_SIZE):
+        batches.append(
+            [
+                [float(image_num), 10.0, 0.0, 2.0, image_num / 1000.0]
+                for image_num in range(first_image, first_image + BATCH_SIZE)
+            ]
+        )
+    return batches
+
+
+def new_connection_per_call(url, batches):
+    for batch in batches:
+        ServerProxy(url).dozor_batch_processed(batch)
+
+
+def kept_alive_connection(url, batches):
+    proxy = ServerProxy(url)
+    for batch in batches:
+        proxy.dozor_batch_processed(batch)
+
+
+def multicall(url, batches, multicall_size):
+    proxy = ServerProxy(url)
+    for first in range(0, len(batches), multicall_size):
+        calls = MultiCall(proxy)
+        for batch in batches[first : first + multicall_size]:
+            calls.dozor_batch_processed(batch)
+        list(calls())
+
+
+def fast_calls_during_slow_call(url, calls):
+    slow_call = gevent.spawn(ServerProxy(url).benchmark_sleep, 2.0)
+    gevent.sleep(0.1)
+    proxy = ServerProxy(url)
+    start_time = time.time()
+    for _ in range(calls):
+        proxy.system.listMethods()
+    duration = time.time() - start_time
+    slow_call.join()
+    return duration
+
+
+def main(calls=5000, multicall_size=100):
+    server, processing = get_server()
+    url = "http://localhost:%d" % server._server.server_address[1]
+    batches = dozor_batches(calls)
+
+    for name, send in (
+        ("connection per call", new_connection_per_call),
+        ("kept alive", kept_alive_connection),
+        ("multicall", lambda url, batches: multicall(url, batches, multicall_size)),
+    ):
+        processing.results_raw["score"][:] = 0
+        start_time = time.time()
+        send(url, batches)
+        duration = time.time() - start_time
+        print(
+            "%-20s %d calls: %8.0f calls/s"
+            % (name, len(batches), len(batches) / duration)
+        )
+        assert numpy.allclose(
+            processing.results_raw["score"][: calls * BATCH_SIZE],
+            numpy.arange(1, calls * BATCH_SIZE + 1) / 1000.0,
+        )
+
+    duration = fast_calls_during_slow_call(url, 100)
+    print("100 calls during a 2 s call: %.2f s" % duration)
+    assert duration < 2.0
+
+    server.close()
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:]])
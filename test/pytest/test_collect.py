@@ -0,0 +1,71 @@
+import time
+
+import gevent
+import pytest
+
+from HardwareRepository.HardwareObjects.abstract.AbstractCollect import (
+    AbstractCollect,
+)
+
+
+def test_prepare_collection_runs_steps_concurrently():
+    collect = AbstractCollect("collect")
+    steps = [("step%d" % index, lambda: gevent.sleep(0.1)) for index in range(5)]
+    collect.get_sequential_prepare_steps = lambda: []
+    collect.get_prepare_steps = lambda motor_positions: steps
+
+    start_time = time.time()
+    collect.prepare_collection()
+
+    assert time.time() - start_time < 0.3
+    assert sorted(collect.prepare_durations) == [name for name, _ in steps]
+    assert all(duration >= 0.09 for duration in collect.prepare_durations.values())
+
+
+def test_prepare_collection_failure():
+    collect = AbstractCollect("collect")
+    finished = []
+
+    def failing_step():
+        gevent.sleep(0.01)
+        raise RuntimeError("energy change failed")
+
+    def slow_step():
+        gevent.sleep(1)
+        finished.append(True)
+
+    collect.get_sequential_prepare_steps = lambda: []
+    collect.get_prepare_steps = lambda motor_positions: [
+        ("energy", failing_step),
+        ("slow", slow_step),
+    ]
+
+    with pytest.raises(RuntimeError):
+        collect.prepare_collection()
+    gevent.sleep(0)
+    assert not finished
+
+
+def test_prepare_collection_centres_before_concurrent_steps():
+    collect = AbstractCollect("collect")
+    events = []
+
+    def centring():
+        events.append("centring")
+        return {"phi": 10.0}
+
+    def lims(motor_positions):
+        events.append(("LIMS", motor_positions))
+
+    collect.get_sequential_prepare_steps = lambda: [
+        ("shutters", lambda: events.append("shutters")),
+        ("centring", centring),
+    ]
+    collect.get_prepare_steps = lambda motor_positions: [
+        ("LIMS", lambda: lims(motor_positions))
+    ]
+
+    collect.prepare_collection()
+
+    assert events == ["shutters", "centring", ("LIMS", {"phi": 10.0})]
+    assert sorted(collect.prepare_durations) == ["LIMS", "centring", "shutters"]
@@ -0,0 +1,233 @@
+import math
+import time
+
+import gevent
+import numpy
+import pytest
+
+from HardwareRepository.HardwareObjects import sample_centring
+from HardwareRepository.HardwareObjects.GenericDiffractometer import (
+    GenericDiffractometer,
+)
+
+
+class FakeMotor(object):
+    def __init__(self, name, move_time=0.1, fail=False):
+        self._name = name
+        self.move_time = move_time
+        self.fail = fail
+        self.position = 0
+        self.moves = []
+        self.stopped = False
+        self.ready = True
+
+    def name(self):
+        return self._name
+
+    def getPosition(self):
+        return self.position
+
+    def get_position(self):
+        return self.position
+
+    def is_ready(self):
+        return self.ready
+
+    def move(self, position):
+        self.moves.append(position)
+        self.ready = False
+        gevent.spawn(self._move, position)
+
+    def _move(self, position):
+        gevent.sleep(self.move_time)
+        if not self.fail:
+            self.position = position
+        self.ready = True
+
+    def stop(self):
+        self.stopped = True
+        self.ready = True
+
+
+def test_move_motors_group_moves_motors_concurrently():
+    diffractometer = GenericDiffractometer("diffractometer")
+    motors = [FakeMotor("motor%d" % index) for index in range(5)]
+
+    start_time = time.time()
+    diffractometer.move_motors_group(dict((motor, 1.5) for motor in motors))
+
+    assert time.time() - start_time < 0.3
+    assert all(motor.position == 1.5 for motor in motors)
+
+
+def test_move_motors_group_timeout_stops_and_rolls_back():
+    diffractometer = GenericDiffractometer("diffractometer")
+    fast_motor = FakeMotor("fast", move_time=0.01)
+    slow_motor = FakeMotor("slow", move_time=10)
+
+    with pytest.raises(Exception):
+        diffractometer.move_motors_group(
+            {fast_motor: 2, slow_motor: 2}, timeout=0.2, rollback=True
+        )
+
+    assert fast_motor.stopped and slow_motor.stopped
+    assert fast_motor.moves == [2, 0]
+    assert fast_motor.position == 0
+
+
+class SimultaneousMoveCommand(object):
+    """startSimultaneousMoveMotors of a diffractometer with the given motors"""
+
+    def __init__(self, motors, fail=False):
+        self.motors = dict((motor.name(), motor) for motor in motors)
+        self.fail = fail
+        self.arguments = []
+
+    def __call__(self, argin):
+        self.arguments.append(argin)
+        for motor_position in argin.strip(";").split(";"):
+            name, position = motor_position.split("=")
+            if not self.fail:
+                self.motors[name].position = float(position)
+
+
+def test_move_motors_uses_simultaneous_move_command():
+    diffractometer = GenericDiffractometer("diffractometer")
+    diffractometer.current_state = "Ready"
+    phi, phiy, kappa = FakeMotor("phi"), FakeMotor("phiy"), FakeMotor("kappa")
+    diffractometer.motor_hwobj_dict = {"phi": phi, "phiy": phiy, "kappa": kappa}
+    command = SimultaneousMoveCommand((phi, phiy))
+    diffractometer.command_dict["startSimultaneousMoveMotors"] = command
+
+    diffractometer.move_motors({"phi": 90, "phiy": 0.5, "kappa": 10})
+
+    assert sorted(command.arguments[0].strip(";").split(";")) == [
+        "phi=90.0000",
+        "phiy=0.5000",
+    ]
+    assert not phi.moves and not phiy.moves
+    assert (phi.position, phiy.position) == (90, 0.5)
+    # kappa is not moved by startSimultaneousMoveMotors
+    assert kappa.moves == [10]
+
+
+def test_move_motors_simultaneous_checks_positions_and_rolls_back():
+    diffractometer = GenericDiffractometer("diffractometer")
+    diffractometer.current_state = "Ready"
+    phi, phiy = FakeMotor("phi"), FakeMotor("phiy")
+    phi.position = 30
+    diffractometer.motor_hwobj_dict = {"phi": phi, "phiy": phiy}
+    command = SimultaneousMoveCommand((phi, phiy), fail=True)
+    diffractometer.command_dict["startSimultaneousMoveMotors"] = command
+
+    with pytest.raises(RuntimeError):
+        diffractometer.move_motors({"phi": 90, "phiy": 0.5}, rollback=True)
+
+    assert phi.stopped and phiy.stopped
+    assert sorted(command.arguments[1].strip(";").split(";")) == [
+        "phi=30.0000",
+        "phiy=0.0000",
+    ]
+
+
+def get_centring_diffractometer():
+    diffractometer = GenericDiffractometer("diffractometer")
+    diffractometer.use_sample_centring = True
+    diffractometer.pixels_per_mm_x = 500.0
+    diffractometer.pixels_per_mm_y = 400.0
+    diffractometer.beam_position = [320, 256]
+    diffractometer.update_zoom_calibration = lambda: None
+
+    for role, direction, position in (
+        ("phi", -1, 30),
+        ("phiy", -1, 0.1),
+        ("phiz", 1, -0.2),
+        ("sampx", 1, 0.3),
+        ("sampy", 1, 0.05),
+    ):
+        motor = FakeMotor(role)
+        motor.position = position
+        setattr(
+            diffractometer,
+            "centring_" + role,
+            sample_centring.CentringMotor(motor, direction=direction),
+        )
+    return diffractometer
+
+
+def project(diffractometer, positions):
+    # single point projection of motor_positions_to_screen before batching
+    phi_angle = math.radians(
+        diffractometer.centring_phi.direction
+        * diffractometer.centring_phi.getPosition()
+    )
+    offsets = {}
+    for role in ("sampx", "sampy", "phiy", "phiz"):
+        motor = getattr(diffractometer, "centring_" + role)
+        offsets[role] = motor.direction * (positions[role] - motor.getPosition())
+    rot_matrix = numpy.matrix(
+        [
+            math.cos(phi_angle),
+            -math.sin(phi_angle),
+            math.sin(phi_angle),
+            math.cos(phi_angle),
+        ]
+    )
+    rot_matrix.shape = (2, 2)
+    dx, dy = (
+        numpy.dot(
+            numpy.array([offsets["sampx"], offsets["sampy"]]),
+            numpy.array(rot_matrix.I),
+        )
+        * diffractometer.pixels_per_mm_x
+    )
+    x = offsets["phiy"] * diffractometer.pixels_per_mm_x
+    y = dy + offsets["phiz"] * diffractometer.pixels_per_mm_y
+    return x + diffractometer.beam_position[0], y + diffractometer.beam_position[1]
+
+
+def test_motor_positions_to_screen_batch():
+    diffractometer = get_centring_diffractometer()
+    positions_list = [
+        {"sampx": 0.01 * index, "sampy": -0.02 * index, "phiy": 0.2, "phiz": 0.1}
+        for index in range(10)
+    ]
+
+    screen_coords = diffractometer.motor_positions_to_screen_batch(positions_list)
+
+    assert screen_coords.shape == (10, 2)
+    for positions, (x, y) in zip(positions_list, screen_coords):
+        assert numpy.allclose((x, y), project(diffractometer, positions))
+    assert numpy.allclose(
+        diffractometer.motor_positions_to_screen(positions_list[3]), screen_coords[3]
+    )
+
+
+def test_screen_projection_follows_motors_and_zoom():
+    diffractometer = get_centring_diffractometer()
+    calibrations = []
+    diffractometer.update_zoom_calibration = lambda: calibrations.append(True)
+    positions = {"sampx": 0.1, "sampy": 0.2, "phiy": 0.3, "phiz": 0.4}
+    projection = diffractometer.get_screen_projection()
+
+    diffractometer.motor_positions_to_screen(positions)
+    assert diffractometer.get_screen_projection() is projection
+    assert len(calibrations) == 3
+
+    # no motor moved event yet
+    diffractometer.centring_phi.motor.position = 120
+    assert diffractometer.get_screen_projection() is not projection
+    assert numpy.allclose(
+        diffractometer.motor_positions_to_screen(positions),
+        project(diffractometer, positions),
+    )
+
+    diffractometer.centring_sampy.motor.position = 0.5
+    assert numpy.allclose(
+        diffractometer.motor_positions_to_screen(positions),
+        project(diffractometer, positions),
+    )
+
+    projection = diffractometer.get_screen_projection()
+    diffractometer.pixels_per_mm_x = 1000.0
+    assert diffractometer.get_screen_projection() is not projection
@@ -0,0 +1,82 @@
+import os
+import time
+
+import gevent
+import pytest
+
+from HardwareRepository.HardwareObjects.file_watcher import FileWatcher
+
+
+def write_file(path, delay, size=100):
+    gevent.sleep(delay)
+    with open(path, "wb") as f:
+        f.write(b"\0" * size)
+
+
+@pytest.mark.parametrize("use_inotify", (True, False))
+def test_wait_for_file(tmp_path, use_inotify):
+    watcher = FileWatcher(use_inotify=use_inotify, stable_time=0.2)
+    path = str(tmp_path / "XDS.INP")
+
+    assert not watcher.wait_for_file(path, timeout=0.2)
+    assert not watcher.subscriptions
+
+    gevent.spawn(write_file, path, 0.3)
+    start_time = time.time()
+    assert watcher.wait_for_file(path, timeout=5, closed=True)
+    assert os.path.getsize(path) == 100
+    assert time.time() - start_time < 1.0
+
+    # files that already exist are reported by the first poll
+    assert watcher.wait_for_file(path, timeout=1)
+
+
+def test_inotify_reports_files_without_polling(tmp_path):
+    watcher = FileWatcher(min_interval=10, max_interval=10)
+    if watcher.inotify_fd is None:
+        pytest.skip("inotify not available")
+
+    appeared, closed = [], []
+    paths = [str(tmp_path / ("image_%05d.cbf" % index)) for index in range(5)]
+    for path in paths:
+        watcher.subscribe(path, appeared.append)
+        watcher.subscribe(path, closed.append, closed=True)
+    gevent.sleep(0.1)
+
+    for path in paths:
+        write_file(path, 0.01)
+    gevent.sleep(0.1)
+
+    assert appeared == paths
+    assert closed == paths
+    assert not watcher.subscriptions
+    assert not watcher.watched_directories
+
+
+def test_polling_reports_empty_files(tmp_path):
+    watcher = FileWatcher(use_inotify=False, stable_time=0.2)
+    path = str(tmp_path / "empty")
+
+    gevent.spawn(write_file, path, 0.1, size=0)
+    start_time = time.time()
+    assert watcher.wait_for_file(path, timeout=5, closed=True)
+    assert 0.3 <= time.time() - start_time < 1.0
+
+
+def test_inotify_waits_for_close_write(tmp_path):
+    watcher = FileWatcher(stable_time=0.1)
+    if watcher.inotify_fd is None:
+        pytest.skip("inotify not available")
+
+    closed = []
+    path = str(tmp_path / "image_00001.cbf")
+    watcher.subscribe(path, closed.append, closed=True)
+    with open(path, "wb") as f:
+        f.write(b"\0" * 100)
+        f.flush()
+        # the file does not change but is still open
+        gevent.sleep(0.5)
+        assert not closed
+    gevent.sleep(0.1)
+
+    assert closed == [path]
@@ -0,0 +1,75 @@
+import numpy as np
+import pytest
+
+from HardwareRepository.HardwareObjects.EMBL.flat_field import (
+    apply_flat_field,
+    flat_field_worker,
+    new_flat_field_pool,
+    prepare_ff_image,
+)
+
+
+def per_pixel_flat_field(raw_image, ff_image, dark_image=None):
+    """Previous correction, one pixel at a time"""
+    ff_applied = np.ones(raw_image.shape)
+    for (row, col), ff_value in np.ndenumerate(ff_image):
+        raw_value = float(raw_image[row, col])
+        ff_value = float(ff_value)
+        if ff_value == pow(2, 16) - 1:
+            continue
+        if dark_image is not None:
+            raw_value -= dark_image[row, col]
+            ff_value -= dark_image[row, col]
+        if ff_value != 0:
+            ff_applied[row, col] = raw_value / ff_value
+    return ff_applied
+
+
+@pytest.fixture
+def images():
+    random = np.random.RandomState(0)
+    raw_image = random.randint(0, pow(2, 16), (24, 32)).astype(np.uint16)
+    ff_image = random.randint(1000, pow(2, 16), (24, 32)).astype(np.uint16)
+    ff_image[0, :4] = 0
+    ff_image[1, :4] = pow(2, 16) - 1
+    dark_image = random.randint(0, 100, (24, 32)).astype(np.float32)
+    dark_image[2, :4] = ff_image[2, :4]
+    return raw_image, ff_image, dark_image
+
+
+def test_flat_field_matches_per_pixel_correction(images):
+    raw_image, ff_image, _ = images
+
+    ff_applied = apply_flat_field(raw_image, prepare_ff_image(ff_image))
+
+    assert ff_applied.dtype == np.float32
+    assert np.allclose(ff_applied, per_pixel_flat_field(raw_image, ff_image))
+
+
+def test_flat_field_with_dark_matches_per_pixel_correction(images):
+    raw_image, ff_image, dark_image = images
+
+    ff_applied = apply_flat_field(
+        raw_image, prepare_ff_image(ff_image, dark_image), dark_image
+    )
+
+    assert np.allclose(
+        ff_applied, per_pixel_flat_field(raw_image, ff_image, dark_image)
+    )
+
+
+def test_flat_field_pool(images):
+    raw_image, ff_image, dark_image = images
+    tasks = [(raw_image, ff_image, dark_image, index) for index in range(4)]
+    pool = new_flat_field_pool(2)
+    try:
+        results = list(pool.imap(flat_field_worker, tasks))
+    finally:
+        pool.terminate()
+
+    expected = per_pixel_flat_field(raw_image, ff_image, dark_image)
+    for index, (result_index, ff_applied, im_min, im_max) in enumerate(results):
+        assert result_index == index
+        assert np.allclose(ff_applied, expected)
+        assert np.isclose(im_min, expected[8:].min())
+        assert np.isclose(im_max, expected[8:].max())
@@ -0,0 +1,107 @@
+import time
+
+import gevent
+
+from HardwareRepository import HardwareRepository
+from HardwareRepository import HardwareObjectFileParser
+
+
+def new_repository(xml_dir=None):
+    hwr = HardwareRepository.getHardwareRepository()
+    client = type(hwr)([xml_dir] if xml_dir else hwr.serverAddress)
+    client.connect()
+    return client
+
+
+def test_load_hardware_objects():
+    hwr = new_repository()
+    hwobjs = hwr.load_hardware_objects(["energy-mockup", "/shutter-mockup"])
+
+    assert sorted(hwobjs) == ["/energy-mockup", "/shutter-mockup"]
+    for name, hwobj in hwobjs.items():
+        assert hwr.getHardwareObject(name) is hwobj
+
+
+def test_require_loads_hardware_objects(tmpdir):
+    tmpdir.join("a.xml").write("<object><username>test</username></object>")
+    tmpdir.join("b.xml").write('<object><object href="/a" role="a"/></object>')
+    hwr = new_repository(str(tmpdir))
+
+    hwobjs = hwr.require(["b"])
+
+    assert sorted(hwobjs) == ["/a", "/b"]
+    assert sorted(hwr.loadedHardwareObjects) == ["/a", "/b"]
+
+
+def test_concurrent_requests_load_an_object_once():
+    hwr = new_repository()
+    load = hwr.loadHardwareObject
+    loaded_names = []
+
+    def slow_load(hwobj_name):
+        loaded_names.append(hwobj_name)
+        gevent.sleep(0.1)
+        return load(hwobj_name)
+
+    hwr.loadHardwareObject = slow_load
+    greenlets = [gevent.spawn(hwr.getHardwareObject, "energy-mockup") for _ in range(3)]
+    gevent.joinall(greenlets)
+
+    assert loaded_names == ["/energy-mockup"]
+    hwobjs = [greenlet.value for greenlet in greenlets]
+    assert hwobjs[0] is not None
+    assert hwobjs[1] is hwobjs[0] and hwobjs[2] is hwobjs[0]
+
+
+def test_objects_do_not_wait_for_unrelated_objects(tmpdir):
+    tmpdir.join("slow.xml").write('<object><username>test</username></object>')
+    tmpdir.join("a.xml").write('<object><username>test</username></object>')
+    tmpdir.join("b.xml").write(
+        '<object><object href="/a" role="a"/></object>'
+    )
+    hwr = new_repository(str(tmpdir))
+    load = hwr.loadHardwareObject
+    end_times = {}
+
+    def timed_load(hwobj_name):
+        if hwobj_name == "/slow":
+            gevent.sleep(0.3)
+        hwobj = load(hwobj_name)
+        end_times[hwobj_name] = time.time()
+        return hwobj
+
+    hwr.loadHardwareObject = timed_load
+    hwobjs = hwr.load_hardware_objects()
+
+    assert sorted(hwobjs) == ["/a", "/b", "/slow"]
+    assert end_times["/a"] < end_times["/b"] < end_times["/slow"]
+
+
+def test_find_cyclic_references():
+    hwr = HardwareRepository.getHardwareRepository()
+    graph = {
+        "/a": set(["/b"]),
+        "/b": set(["/c"]),
+        "/c": set(["/a"]),
+        "/d": set(["/a"]),
+        "/e": set(["/e"]),
+    }
+
+    assert hwr._find_cyclic_references(graph) == set(["/a", "/b", "/c", "/e"])
+
+
+def test_xml_events_cache(tmpdir):
+    xml_string = '<equipment class="EnergyMockup"><username>Energy</username></equipment>'
+    HardwareObjectFileParser.setCacheDirectory(str(tmpdir))
+    try:
+        events = HardwareObjectFileParser.getXMLEvents(xml_string)
+        assert HardwareObjectFileParser.getXMLEvents(xml_string) is events
+        assert len(tmpdir.listdir()) == 1
+
+        HardwareObjectFileParser.clearCache()
+        assert HardwareObjectFileParser.getXMLEvents(xml_string) == events
+    finally:
+        HardwareObjectFileParser.setCacheDirectory(None)
+
+    hwobj = HardwareObjectFileParser.parseString(xml_string, "/energy-cached")
+    assert hwobj.getProperty("username") == "Energy"
@@ -0,0 +1,51 @@
+from HardwareRepository.HardwareObjects.ISPyBClient import ISPyBClient
+
+
+class ValueObject(object):
+    def __init__(self, type_name):
+        self.type_name = type_name
+
+
+class Factory(object):
+    def create(self, type_name):
+        return ValueObject(type_name)
+
+
+class CollectionService(object):
+    def __init__(self):
+        self.stored = []
+
+    def store(self, value_object):
+        self.stored.append(value_object)
+        return len(self.stored)
+
+    storeOrUpdateWorkflow = store
+    storeOrUpdateWorkflowMesh = store
+    storeOrUpdateGridInfo = store
+
+
+class CollectionClient(object):
+    def __init__(self):
+        self.factory = Factory()
+        self.service = CollectionService()
+
+
+def test_store_workflow_uses_collection_client():
+    ispyb_client = ISPyBClient("ispyb")
+    ispyb_client._collection = CollectionClient()
+
+    ids = ispyb_client.store_workflow(
+        {"workflow_type": "MeshScan", "title": "mesh", "steps_x": 10, "steps_y": 5}
+    )
+
+    assert ids == (1, 2, 3)
+    workflow_vo, workflow_mesh_vo, grid_info_vo = (
+        ispyb_client._collection.service.stored
+    )
+    assert workflow_vo.type_name == "workflow3VO"
+    assert workflow_vo.workflowTitle == "mesh"
+    assert workflow_mesh_vo.type_name == "workflowMeshWS3VO"
+    assert workflow_mesh_vo.workflowId == 1
+    assert grid_info_vo.type_name == "gridInfoWS3VO"
+    assert grid_info_vo.workflowMeshId == 2
+    assert (grid_info_vo.steps_x, grid_info_vo.steps_y) == (10, 5)
@@ -0,0 +1,92 @@
+import sys
+import time
+
+import gevent
+
+from HardwareRepository.dispatcher import dispatcher
+from HardwareRepository.HardwareObjects.JobRunner import JobRunner
+
+
+def dummy_job(duration, exit_status=0):
+    return [
+        sys.executable,
+        "-c",
+        "import sys, time; time.sleep(%f); sys.exit(%d)" % (duration, exit_status),
+    ]
+
+
+def get_job_runner(slots):
+    job_runner = JobRunner("job-runner")
+    job_runner.setProperty("slots", slots)
+    job_runner.init()
+    return job_runner
+
+
+def test_jobs_run_in_slots_without_blocking():
+    job_runner = get_job_runner(2)
+    ticks = []
+
+    def tick():
+        while True:
+            gevent.sleep(0.05)
+            ticks.append(time.time())
+
+    ticker = gevent.spawn(tick)
+
+    start_time = time.time()
+    jobs = [job_runner.submit(dummy_job(0.5), name="job%d" % i) for i in range(4)]
+    gevent.sleep(0.2)
+    assert len(job_runner.get_running_jobs()) == 2
+    assert job_runner.get_free_slots() == 0
+
+    assert [job.wait(10) for job in jobs] == [0, 0, 0, 0]
+    duration = time.time() - start_time
+    ticker.kill()
+
+    assert 1.0 <= duration < 1.9
+    assert len(ticks) > 10
+    assert all(0.4 < job.get_wall_time() < 1.0 for job in jobs)
+    assert not job_runner.get_jobs()
+
+
+def test_job_exit_status_and_signals():
+    job_runner = get_job_runner(1)
+    finished, failed = [], []
+
+    def job_finished(job):
+        finished.append(job)
+
+    def job_failed(job):
+        failed.append(job)
+
+    dispatcher.connect(job_finished, "jobFinished", job_runner)
+    dispatcher.connect(job_failed, "jobFailed", job_runner)
+
+    good_job = job_runner.run(dummy_job(0))
+    bad_job = job_runner.run(dummy_job(0, 3))
+
+    assert good_job.is_successful()
+    assert bad_job.returncode == 3
+    assert finished == [good_job, bad_job]
+    assert failed == [bad_job]
+
+
+def test_lanes_have_their_own_slots():
+    job_runner = JobRunner("job-runner")
+    job_runner.setProperty("slots", 1)
+    job_runner.setProperty("lanes", "autoprocessing:2")
+    job_runner.init()
+
+    autoprocessing_jobs = [
+        job_runner.submit(dummy_job(0.5), lane="autoprocessing") for _ in range(3)
+    ]
+    gevent.sleep(0.2)
+    assert len(job_runner.get_running_jobs("autoprocessing")) == 2
+
+    start_time = time.time()
+    job = job_runner.run(dummy_job(0), lane="characterisation")
+    assert job.is_successful()
+    assert time.time() - start_time < 0.5
+    assert job_runner.get_free_slots("characterisation") == 1
+
+    assert [job.wait(10) for job in autoprocessing_jobs] == [0, 0, 0]
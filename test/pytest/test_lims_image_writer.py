@@ -0,0 +1,47 @@
+import time
+
+import gevent
+
+from HardwareRepository import HardwareRepository
+from HardwareRepository.HardwareObjects.lims_image_writer import LimsImageWriter
+
+
+def test_lims_image_writer(monkeypatch):
+    hwr = HardwareRepository.getHardwareRepository()
+    lims_client = hwr.getHardwareObject("lims-client-mockup")
+    stored = []
+
+    def store_image(image_dict):
+        # ISPyB round trip
+        gevent.sleep(0.001)
+        stored.append(image_dict["imageNumber"])
+        return image_dict["imageNumber"]
+
+    monkeypatch.setattr(lims_client, "store_image", store_image)
+    writer = LimsImageWriter(lims_client, max_queue_size=200)
+
+    start_time = time.time()
+    results = [
+        writer.store_image({"dataCollectionId": 1, "imageNumber": frame})
+        for frame in range(100)
+    ]
+    assert time.time() - start_time < 0.05
+    assert writer.pending() == 100
+
+    assert writer.flush(timeout=5)
+    assert writer.pending() == 0
+    assert stored == list(range(100))
+    assert [result.get() for result in results] == list(range(100))
+
+
+def test_lims_image_writer_flush_timeout(monkeypatch):
+    hwr = HardwareRepository.getHardwareRepository()
+    lims_client = hwr.getHardwareObject("lims-client-mockup")
+    monkeypatch.setattr(lims_client, "store_image", lambda image_dict: gevent.sleep(1))
+    writer = LimsImageWriter(lims_client)
+
+    writer.store_image({"dataCollectionId": 1, "imageNumber": 1})
+    start_time = time.time()
+    assert not writer.flush(timeout=0.1)
+    assert time.time() - start_time < 0.5
+    writer.writer_task.kill()
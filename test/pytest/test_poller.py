@@ -0,0 +1,68 @@
+import gevent
+
+from HardwareRepository import Poller
+
+
+class PolledValue:
+    def __init__(self, failures=0):
+        self.failures = failures
+        self.value = 0
+        self.values = []
+        self.errors = []
+
+    def read(self):
+        if self.failures > 0:
+            self.failures -= 1
+            raise RuntimeError("read failed")
+        return self.value
+
+    def value_changed(self, value):
+        self.values.append(value)
+
+    def polling_error(self, exception, poller_id):
+        self.errors.append(exception)
+
+
+def wait_until(condition, timeout=3):
+    with gevent.Timeout(timeout):
+        while not condition():
+            gevent.sleep(0.01)
+
+
+def test_poll_value_changed():
+    polled = PolledValue()
+    poller = Poller.poll(
+        polled.read,
+        polling_period=20,
+        value_changed_callback=polled.value_changed,
+        error_callback=polled.polling_error,
+    )
+    try:
+        wait_until(lambda: polled.values == [0])
+        polled.value = 1
+        wait_until(lambda: polled.values == [0, 1])
+
+        same_poller = Poller.poll(polled.read, polling_period=10)
+        assert same_poller is poller
+        assert poller.get_polling_period() == 10
+        assert Poller.get_poller(poller.get_id()) is poller
+    finally:
+        poller.stop()
+
+    assert Poller.get_poller(poller.get_id()) is None
+
+
+def test_poll_retries_after_error():
+    polled = PolledValue(failures=2)
+    poller = Poller.poll(
+        polled.read,
+        polling_period=10,
+        value_changed_callback=polled.value_changed,
+        error_callback=polled.polling_error,
+    )
+    try:
+        wait_until(lambda: polled.values == [0])
+        assert len(polled.errors) == 1
+        assert not poller.is_stopped()
+    finally:
+        poller.stop()
@@ -0,0 +1,197 @@
+import pytest
+
+from HardwareRepository.HardwareObjects import queue_model_objects
+from HardwareRepository.HardwareObjects import queue_model_serializer
+from HardwareRepository.HardwareObjects.QueueModel import QueueModel
+
+
+def create_data_collection(directory, prefix, run_number, start_num=1):
+    dc = queue_model_objects.DataCollection()
+    path_template = dc.acquisitions[0].path_template
+    path_template.directory = directory
+    path_template.base_prefix = prefix
+    path_template.run_number = run_number
+    path_template.start_num = start_num
+    path_template.num_files = 10
+    return dc
+
+
+def test_get_node():
+    queue_model = QueueModel("queue-model")
+    sample = queue_model_objects.Sample()
+    group = queue_model_objects.TaskGroup()
+    dc = create_data_collection("/data/test", "test", 1)
+
+    queue_model.add_child(queue_model.get_model_root(), sample)
+    queue_model.add_child(sample, group)
+    node_id = queue_model.add_child_at_id(group._node_id, dc)
+
+    assert queue_model.get_node(node_id) is dc
+    assert queue_model.get_node(node_id, sample) is dc
+
+    queue_model.del_child(sample, group)
+    assert queue_model.get_node(node_id) is None
+    assert queue_model.get_node(sample._node_id) is sample
+
+
+def test_next_run_number_and_path_collisions():
+    queue_model = QueueModel("queue-model")
+    group = queue_model_objects.TaskGroup()
+    queue_model.add_child(queue_model.get_model_root(), group)
+    dc1 = create_data_collection("/data/test", "test", 1)
+    dc2 = create_data_collection("/data/test/", "test", 2)
+    queue_model.add_child(group, dc1)
+    queue_model.add_child(group, dc2)
+
+    new_path_template = dc1.acquisitions[0].path_template.copy()
+    assert queue_model.get_next_run_number(new_path_template) == 3
+    assert queue_model.check_for_path_collisions(new_path_template)
+    assert not queue_model.check_for_path_collisions(
+        dc1.acquisitions[0].path_template
+    )
+
+    new_path_template.start_num = 11
+    assert not queue_model.check_for_path_collisions(new_path_template)
+
+    # Renaming re-indexes the path template
+    dc2.acquisitions[0].path_template.base_prefix = "other"
+    assert queue_model.get_next_run_number(new_path_template) == 2
+    assert queue_model.get_next_run_number(dc1.acquisitions[0].path_template) == 1
+    assert (
+        queue_model.get_next_run_number(
+            dc1.acquisitions[0].path_template, exclude_current=False
+        )
+        == 2
+    )
+
+    queue_model.del_child(queue_model.get_model_root(), group)
+    assert queue_model.get_next_run_number(new_path_template) == 1
+
+
+def test_index_follows_replaced_path_templates_and_moved_nodes():
+    queue_model = QueueModel("queue-model")
+    group = queue_model_objects.TaskGroup()
+    queue_model.add_child(queue_model.get_model_root(), group)
+    dc1 = create_data_collection("/data/test", "test", 1)
+    dc2 = create_data_collection("/data/test", "test", 2)
+    queue_model.add_child(group, dc1)
+    queue_model.add_child(group, dc2)
+    new_path_template = dc1.acquisitions[0].path_template.copy()
+    assert queue_model.get_next_run_number(new_path_template) == 3
+
+    # path template of an acquisition reassigned
+    dc2.acquisitions[0].path_template = new_path_template.copy()
+    dc2.acquisitions[0].path_template.run_number = 4
+    assert queue_model.get_next_run_number(new_path_template) == 5
+
+    # acquisitions of a node reassigned
+    dc2.acquisitions = create_data_collection("/data/test", "test", 6).acquisitions
+    assert queue_model.get_next_run_number(new_path_template) == 7
+    dc2.acquisitions[0].path_template.run_number = 7
+    assert queue_model.get_next_run_number(new_path_template) == 8
+    assert queue_model.check_for_path_collisions(
+        create_data_collection("/data/test", "test", 7).acquisitions[0].path_template
+    )
+
+    # node moved to another model
+    other_group = queue_model_objects.TaskGroup()
+    other_root = queue_model_objects.RootNode()
+    queue_model.register_model("other", other_root)
+    other_group._parent = other_root
+    other_root._children.append(other_group)
+    queue_model.set_parent(other_group, dc2)
+    assert dc2 not in group.get_children()
+    assert queue_model.get_next_run_number(new_path_template) == 2
+    assert queue_model.get_node(dc2._node_id) is None
+
+    # and back
+    queue_model.set_parent(group, dc2)
+    assert queue_model.get_next_run_number(new_path_template) == 8
+    assert queue_model.get_node(dc2._node_id) is dc2
+
+
+def test_serializer_round_trip():
+    group = queue_model_objects.TaskGroup()
+    dc = create_data_collection("/data/test", "test", 3)
+    dc.acquisitions[0].acquisition_parameters.centred_position = (
+        queue_model_objects.CentredPosition({"phi": 10.5})
+    )
+    group._children.append(dc)
+    dc._parent = group
+
+    data = queue_model_serializer.dumps("ispyb", [((1, 2), group)])
+    model_name, task_groups = queue_model_serializer.loads(data)
+
+    assert model_name == "ispyb"
+    assert task_groups[0][0] == (1, 2)
+    new_dc = task_groups[0][1].get_children()[0]
+    assert new_dc.get_parent() is task_groups[0][1]
+    assert new_dc.acquisitions[0].path_template == dc.acquisitions[0].path_template
+    assert new_dc.acquisitions[0].path_template.run_number == 3
+    assert new_dc.experiment_type == dc.experiment_type
+    centred_position = new_dc.acquisitions[0].acquisition_parameters.centred_position
+    assert centred_position.phi == 10.5
+    assert centred_position.snapshot_image is None
+
+
+def test_serializer_rejects_unknown_classes():
+    data = (
+        '{"version": 1, "model": "ispyb", "queue": [{"sample_location": null, '
+        '"task_group": "1"}], "nodes": {"1": {"class": "Popen", "state": {}, '
+        '"children": []}}}'
+    )
+    with pytest.raises(ValueError):
+        queue_model_serializer.loads(data)
+
+
+def test_incremental_serializer():
+    serializer = queue_model_serializer.QueueSerializer()
+    group = queue_model_objects.TaskGroup()
+    dcs = [create_data_collection("/data/test", "test", run) for run in (1, 2)]
+    for dc in dcs:
+        group._children.append(dc)
+        dc._parent = group
+
+    header, changed_records, removed_keys = serializer.serialize(
+        "ispyb", [((1, 1), group)]
+    )
+    assert len(changed_records) == 3 and not removed_keys
+
+    dcs[1].acquisitions[0].path_template.run_number = 5
+    header, changed_records, removed_keys = serializer.serialize(
+        "ispyb", [((1, 1), group)]
+    )
+    assert len(changed_records) == 1 and not removed_keys
+
+    header, changed_records, removed_keys = serializer.serialize("ispyb", [])
+    assert not changed_records and len(removed_keys) == 3
+
+
+def test_incremental_serializer_after_load(monkeypatch):
+    group = queue_model_objects.TaskGroup()
+    dcs = [create_data_collection("/data/test", "test", run) for run in (1, 2)]
+    for dc in dcs:
+        group._children.append(dc)
+        dc._parent = group
+    header, records = queue_model_serializer.serialize("ispyb", [((1, 1), group)])
+
+    serializer = queue_model_serializer.QueueSerializer()
+    model_name, task_groups = serializer.deserialize(header, records)
+    dumped_records = []
+    dumps_record = queue_model_serializer._dumps_record
+    monkeypatch.setattr(
+        queue_model_serializer,
+        "_dumps_record",
+        lambda record: dumped_records.append(record) or dumps_record(record),
+    )
+
+    # unchanged nodes are compared, not dumped
+    assert serializer.serialize(model_name, task_groups)[1:] == ({}, [])
+    assert not dumped_records
+
+    new_dc = task_groups[0][1].get_children()[1]
+    new_dc.acquisitions[0].path_template.run_number = 5
+    header, changed_records, removed_keys = serializer.serialize(
+        model_name, task_groups
+    )
+    assert len(changed_records) == 1 and len(dumped_records) == 1
@@ -0,0 +1,103 @@
+import jsonpickle
+import pytest
+
+redis = pytest.importorskip("redis")
+
+from HardwareRepository.HardwareObjects import queue_model_objects
+from HardwareRepository.HardwareObjects import QueueModel as queue_model
+from HardwareRepository.HardwareObjects.RedisClient import RedisClient
+
+
+class QueueModel(object):
+    decode_legacy_task_groups = queue_model.QueueModel.decode_legacy_task_groups
+
+    def __init__(self):
+        self.selected_model = None
+        self.task_groups = []
+
+    def get_task_groups(self):
+        return "ispyb", []
+
+    def select_model(self, name):
+        self.selected_model = name
+
+    def add_task_groups(self, task_groups, snapshot=None):
+        self.task_groups.extend(task_groups)
+
+
+class ShapeHistory(object):
+    def __init__(self):
+        self.shapes = [{"type": "point", "index": 1}]
+
+    def dump_shapes(self):
+        return list(self.shapes)
+
+    def get_scene_snapshot(self):
+        return None
+
+
+class BeamlineSetup(object):
+    def __init__(self):
+        self.shape_history_hwobj = ShapeHistory()
+
+
+@pytest.fixture
+def redis_client():
+    client = RedisClient("redis")
+    client.redis_client = redis.StrictRedis(db=15)
+    try:
+        client.redis_client.ping()
+    except redis.ConnectionError:
+        pytest.skip("no redis-server on localhost")
+    client.redis_client.flushdb()
+    client.active = True
+    client.proposal_id = 1
+    client.beamline_name = "test"
+    client.queue_model_hwobj = QueueModel()
+    client.bl_setup_hwobj = BeamlineSetup()
+    yield client
+    client.redis_client.flushdb()
+
+
+def test_only_changed_values_are_written(redis_client):
+    assert redis_client.save_task(queue=True, graphics=True) == 3
+    assert redis_client.save_task(queue=True, graphics=True) == 0
+
+    redis_client.bl_setup_hwobj.shape_history_hwobj.shapes.append(
+        {"type": "point", "index": 2}
+    )
+    assert redis_client.save_task(queue=True, graphics=True) == 1
+    assert redis_client.save_task(values={"flux": 1e12}) == 1
+    assert redis_client.save_task(values={"flux": 1e12}) == 0
+
+    assert float(redis_client.redis_client.get("mxcube:1:test:flux")) == 1e12
+    assert redis_client.redis_client.get("mxcube:1:test:queue_model") == b"ispyb"
+
+
+def test_all_values_are_written_after_clear_db(redis_client):
+    assert redis_client.save_task(queue=True, graphics=True) == 3
+    redis_client.clear_db()
+
+    assert redis_client.save_task(queue=True, graphics=True) == 3
+    assert redis_client.redis_client.get("mxcube:1:test:queue_model") == b"ispyb"
+
+
+def test_queue_saved_by_previous_versions_is_loaded(redis_client):
+    group = queue_model_objects.TaskGroup()
+    group.set_name("legacy")
+    queue_list = [
+        {"sample_location": (1, 2), "task_group_entry": jsonpickle.encode(group)}
+    ]
+    redis_client.redis_client.set("mxcube:1:test:queue_model", "ispyb")
+    redis_client.redis_client.set("mxcube:1:test:queue_current", str(queue_list))
+
+    assert redis_client.load_queue() == "ispyb"
+    (sample_location, task_group), = redis_client.queue_model_hwobj.task_groups
+    assert sample_location == (1, 2)
+    assert task_group.get_name() == group.get_name()
+
+    # the next save writes the queue in the new format
+    redis_client.save_task(queue=True)
+    assert redis_client.redis_client.get("mxcube:1:test:queue_current").startswith(
+        b"{"
+    )
@@ -0,0 +1,52 @@
+import os
+
+import numpy
+
+from HardwareRepository.HardwareObjects import sample_centring
+
+
+class FakeLucid(object):
+    def __init__(self):
+        self.images = []
+
+    def find_loop(self, image, IterationClosing=None):
+        self.images.append(image)
+        return "Coord", 320, 240
+
+
+class ArrayCamera(object):
+    def get_snapshot(self, bw=None, return_as_array=True):
+        return numpy.full((480, 640), 300.0)
+
+    def takeSnapshot(self, filename, bw=True):
+        raise AssertionError("snapshot file written")
+
+
+class FileCamera(object):
+    def takeSnapshot(self, filename, bw=True):
+        self.filename = filename
+
+
+def test_find_loop_from_camera_array(monkeypatch):
+    lucid = FakeLucid()
+    monkeypatch.setattr(sample_centring, "lucid", lucid, raising=False)
+    points = []
+
+    x, y = sample_centring.find_loop(ArrayCamera(), 1000, 0, None, points.append)
+
+    assert (x, y) == (320, 240)
+    assert points == [(320, 240)]
+    image = lucid.images[0]
+    assert image.shape == (480, 640)
+    assert image.dtype == numpy.uint8
+    assert image.max() == 255
+
+
+def test_find_loop_from_snapshot_file(monkeypatch):
+    lucid = FakeLucid()
+    monkeypatch.setattr(sample_centring, "lucid", lucid, raising=False)
+    camera = FileCamera()
+
+    assert sample_centring.find_loop(camera, 1000, 0, None, None) == (320, 240)
+    assert lucid.images == [camera.filename]
+    assert os.path.basename(camera.filename) == "mxcube_sample_snapshot.png"
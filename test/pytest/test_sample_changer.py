@@ -0,0 +1,78 @@
+from HardwareRepository.dispatcher import dispatcher
+from HardwareRepository.HardwareObjects.abstract.AbstractSampleChanger import (
+    SampleChanger,
+)
+from HardwareRepository.HardwareObjects.abstract.sample_changer.Container import (
+    Basket,
+    Pin,
+)
+
+
+def get_sample_changer(baskets_num=3):
+    sample_changer = SampleChanger("SC", False, "sample-changer")
+    for index in range(baskets_num):
+        sample_changer._addComponent(Basket(sample_changer, index + 1))
+    return sample_changer
+
+
+def test_component_lookups_follow_structural_changes():
+    sample_changer = get_sample_changer()
+    sample = sample_changer.getComponentByAddress(Pin.getSampleAddress(2, 3))
+
+    assert sample.getAddress() == "2:03"
+    assert len(sample_changer.getSampleList()) == 30
+    assert sample_changer.getComponentByAddress("4:01") is None
+
+    sample._setInfo(True, "DM0001", True)
+    assert sample_changer.getComponentById("DM0001") is sample
+    sample.clearInfo()
+    assert not sample_changer.hasComponentId("DM0001")
+
+    sample_changer._addComponent(Basket(sample_changer, 4))
+    assert len(sample_changer.getSampleList()) == 40
+    assert sample_changer.getComponentByAddress("4:01").getBasketNo() == 4
+
+
+def test_selected_sample():
+    sample_changer = get_sample_changer()
+    first = sample_changer.getComponentByAddress("1:01")
+    second = sample_changer.getComponentByAddress("3:05")
+
+    assert sample_changer.getSelectedSample() is None
+    sample_changer._setSelectedSample(first)
+    assert sample_changer.getSelectedSample() is first
+    sample_changer._setSelectedSample(second)
+    assert sample_changer.getSelectedSample() is second
+    assert not first.isSelected()
+
+    sample_changer._setSelectedComponent(sample_changer.getComponents()[0])
+    assert sample_changer.getSelectedSample() is None
+
+
+def test_bulk_update_emits_events_once():
+    sample_changer = get_sample_changer()
+    events = []
+
+    def info_changed():
+        events.append("info")
+
+    def loaded_sample_changed(sample):
+        events.append(sample)
+
+    dispatcher.connect(info_changed, SampleChanger.INFO_CHANGED_EVENT, sample_changer)
+    dispatcher.connect(
+        loaded_sample_changed,
+        SampleChanger.LOADED_SAMPLE_CHANGED_EVENT,
+        sample_changer,
+    )
+
+    with sample_changer._bulkUpdate():
+        for sample in sample_changer.getSampleList():
+            sample._setInfo(True, None, False)
+            sample_changer._triggerInfoChangedEvent()
+            sample_changer._setLoadedSample(sample)
+        assert not events
+
+    assert events == ["info", sample]
+    sample_changer._triggerInfoChangedEvent()
+    assert events == ["info", sample, "info"]
@@ -0,0 +1,88 @@
+import numpy
+
+from HardwareRepository.HardwareObjects.abstract.AbstractVideoDevice import (
+    AbstractVideoDevice,
+)
+
+
+class FakeVideoDevice(AbstractVideoDevice):
+    def __init__(self, name):
+        AbstractVideoDevice.__init__(self, name)
+        self.cam_type = "prosilica"
+        self.image_count = 0
+
+    def get_image(self):
+        self.image_count += 1
+        raw_buffer = numpy.full((48, 64, 3), self.image_count % 255, numpy.uint8)
+        return raw_buffer, 64, 48
+
+    def get_gain(self):
+        return
+
+    def set_gain(self, gain_value):
+        return
+
+    def get_exposure_time(self):
+        return
+
+    def set_exposure_time(self, exposure_time_value):
+        return
+
+    def get_video_live(self):
+        return True
+
+    def set_video_live(self, flag):
+        return
+
+
+def test_frames_are_converted_once_per_frame():
+    camera = FakeVideoDevice("camera")
+    conversions = []
+    frame_to_grey = camera.frame_converters["grey"]
+
+    def count_grey_conversions(frame):
+        conversions.append(frame.number)
+        return frame_to_grey(frame)
+
+    camera.frame_converters["grey"] = count_grey_conversions
+    received = []
+    for _ in range(3):
+        camera.add_frame_consumer(
+            lambda image, width, height: received.append(image), "grey"
+        )
+
+    for _ in range(5):
+        camera.send_frame(camera.grab_frame())
+
+    assert conversions == [1, 2, 3, 4, 5]
+    assert len(received) == 15
+    assert received[-1].shape == (48, 64)
+    assert len(camera.frame_buffer) == 4
+    assert camera.get_frame().number == 5
+
+
+def test_frame_rate_limit_and_subscriptions():
+    camera = FakeVideoDevice("camera")
+    received = []
+    consumer = camera.add_frame_consumer(
+        lambda image, width, height: received.append(image), "jpeg", max_fps=10
+    )
+
+    for index in range(10):
+        frame = camera.grab_frame()
+        frame.timestamp = index * 0.06
+        camera.send_frame(frame)
+
+    assert len(received) == 5
+    assert received[0][:2] == b"\xff\xd8"
+
+    camera.remove_frame_consumer(consumer)
+    assert not camera.frame_consumers
+
+    camera.connectNotify("imageReceived")
+    camera.connectNotify("imageReceived")
+    assert camera.frame_consumers == [camera.image_received_consumer]
+    camera.disconnectNotify("imageReceived")
+    assert camera.frame_consumers
+    camera.disconnectNotify("imageReceived")
+    assert not camera.frame_consumers
@@ -0,0 +1,86 @@
+import sys
+import time
+
+import gevent
+import pytest
+
+from HardwareRepository.HardwareObjects.XMLRPCServer import (
+    GeventXMLRPCServer,
+    KeepAliveXMLRPCRequestHandler,
+)
+
+if sys.version_info > (3, 0):
+    from http.client import HTTPConnection
+    from xmlrpc.client import MultiCall, ServerProxy, dumps
+else:
+    from httplib import HTTPConnection
+    from xmlrpclib import MultiCall, ServerProxy, dumps
+
+
+def echo(value):
+    return value
+
+
+def wait(duration):
+    gevent.sleep(duration)
+    return duration
+
+
+@pytest.fixture
+def server():
+    server = GeventXMLRPCServer(
+        ("localhost", 0),
+        requestHandler=KeepAliveXMLRPCRequestHandler,
+        logRequests=False,
+        allow_none=True,
+    )
+    server.register_multicall_functions()
+    server.register_function(echo)
+    server.register_function(wait)
+    server_task = gevent.spawn(server.serve_forever)
+    yield server
+    server_task.kill()
+    server.server_close()
+
+
+def in_thread(function, *args):
+    """Runs the blocking client calls out of the hub of the server"""
+    return gevent.get_hub().threadpool.spawn(function, *args).get()
+
+
+def test_multicall(server):
+    proxy = ServerProxy("http://localhost:%d" % server.server_address[1])
+    multicall = MultiCall(proxy)
+    for value in range(100):
+        multicall.echo(value)
+
+    assert in_thread(lambda: list(multicall())) == list(range(100))
+
+
+def test_connection_is_kept_alive(server):
+    def post_twice():
+        connection = HTTPConnection("localhost", server.server_address[1])
+        sockets = []
+        for value in range(2):
+            connection.request("POST", "/RPC2", dumps((value,), "echo"))
+            response = connection.getresponse()
+            response.read()
+            sockets.append(connection.sock)
+        connection.close()
+        return sockets
+
+    first_socket, second_socket = in_thread(post_twice)
+    assert first_socket is not None
+    assert second_socket is first_socket
+
+
+def test_slow_method_does_not_block_other_requests(server):
+    url = "http://localhost:%d" % server.server_address[1]
+    threadpool = gevent.get_hub().threadpool
+    slow_call = threadpool.spawn(ServerProxy(url).wait, 1.0)
+    gevent.sleep(0.1)
+
+    start_time = time.time()
+    assert in_thread(ServerProxy(url).echo, "fast") == "fast"
+    assert time.time() - start_time < 0.5
+    assert slow_call.get() == 1.0